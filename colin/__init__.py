@@ -1,3 +1,26 @@
-from .core.colin import get_checks, run
+# colin.core.colin pulls in heavy dependencies (fmf, yaml, dockerfile_parse, ...),
+# so it is imported on the first call (the CLI does not need it for --help).
 
-__all__ = [run.__name__, get_checks.__name__]
+
+def run(*args, **kwargs):
+    """see colin.core.colin.run"""
+    from .core.colin import run as _run
+
+    return _run(*args, **kwargs)
+
+
+def run_many(*args, **kwargs):
+    """see colin.core.colin.run_many"""
+    from .core.colin import run_many as _run_many
+
+    return _run_many(*args, **kwargs)
+
+
+def get_checks(*args, **kwargs):
+    """see colin.core.colin.get_checks"""
+    from .core.colin import get_checks as _get_checks
+
+    return _get_checks(*args, **kwargs)
+
+
+__all__ = [run.__name__, run_many.__name__, get_checks.__name__]
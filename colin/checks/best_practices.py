@@ -18,6 +18,7 @@ import logging
 from colin.core.checks.filesystem import FileCheck
 from colin.core.checks.fmf_check import FMFAbstractCheck
 from colin.core.checks.abstract_check import ImageAbstractCheck
+from colin.core.constant import FACET_CONFIG
 from colin.core.result import CheckResult
 
 logger = logging.getLogger(__name__)
@@ -25,6 +26,8 @@ logger = logging.getLogger(__name__)
 
 class CmdOrEntrypointCheck(FMFAbstractCheck, ImageAbstractCheck):
     name = "cmd_or_entrypoint"
+    facets = (FACET_CONFIG,)
+    paths = ()
 
     def check(self, target):
         metadata = target.config_metadata["ContainerConfig"]
@@ -55,6 +58,8 @@ class HelpFileOrReadmeCheck(FMFAbstractCheck, FileCheck):
 
 class NoRootCheck(FMFAbstractCheck, ImageAbstractCheck):
     name = "no_root"
+    facets = (FACET_CONFIG,)
+    paths = ()
 
     def check(self, target):
         metadata = target.config_metadata
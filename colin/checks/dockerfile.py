@@ -16,6 +16,7 @@
 from colin.core.checks.abstract_check import DockerfileAbstractCheck
 from colin.core.checks.dockerfile import InstructionCountAbstractCheck
 from colin.core.checks.fmf_check import FMFAbstractCheck
+from colin.core.constant import FACET_DOCKERFILE
 from colin.core.exceptions import ColinException
 from colin.core.result import CheckResult
 from colin.utils.cont import ImageName
@@ -23,12 +24,13 @@ from colin.utils.cont import ImageName
 
 class FromTagNotLatestCheck(FMFAbstractCheck, DockerfileAbstractCheck):
     name = "from_tag_not_latest"
+    facets = (FACET_DOCKERFILE,)
 
     def check(self, target):
-        if not target.instance.parent_images:
+        if not target.model.parent_images:
             raise ColinException("Cannot find FROM instruction.")
 
-        im = ImageName.parse(target.instance.baseimage)
+        im = ImageName.parse(target.model.baseimage)
         passed = im.tag and im.tag != "latest"
         return CheckResult(
             ok=passed,
@@ -13,22 +13,30 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import contextlib
+import json as json_module
 import logging
 import os
+import signal
 import sys
 
 import click
 import six
 
-from colin.utils.cmd_tools import get_version_msg_from_the_cmd, is_rpm_installed
 from .default_group import DefaultGroup
-from ..core.checks.abstract_check import AbstractCheck
-from ..core.colin import get_checks, run
-from ..core.constant import COLIN_CHECKS_PATH
+from ..core.constant import (
+    COLIN_CHECKS_PATH,
+    CONTAINERS_STORAGE_ENV,
+    CONTAINERS_STORAGE_PREFIX,
+    PODMAN_SOCKET_ENV,
+)
 from ..core.exceptions import ColinException
-from ..core.ruleset.ruleset import get_rulesets, get_checks_paths
+from ..core.ruleset.paths import get_rulesets, get_checks_paths
 from ..version import __version__
 
+# Modules pulling in heavy dependencies (fmf, yaml, dockerfile_parse, xml, ...)
+# are imported in the commands using them to keep --help and completion fast.
+
 logger = logging.getLogger("colin.cli")
 
 CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"], auto_envvar_prefix="COLIN")
@@ -44,7 +52,18 @@ def cli():
 
 
 @click.command(name="check", context_settings=CONTEXT_SETTINGS)
-@click.argument("TARGET", type=click.STRING)
+@click.argument("TARGET", type=click.STRING, nargs=-1, metavar="TARGET...")
+@click.option(
+    "--targets-from",
+    type=click.File(mode="r"),
+    help="File with the targets to check (one per line).",
+)
+@click.option(
+    "--target-jobs",
+    type=click.IntRange(min=1),
+    default=4,
+    help="Number of targets to check at once. (default=4)",
+)
 @click.option("--parent-target", type=click.STRING, help="Parent target")
 @click.option(
     "--ruleset",
@@ -72,7 +91,21 @@ def cli():
 @click.option(
     "--xunit", type=click.File(mode="w"), help="File to save the output as xunit to."
 )
-@click.option("--stat", is_flag=True, help="Print statistics instead of full results.")
+@click.option(
+    "--jsonl",
+    type=click.File(mode="w"),
+    help="File to stream the results to as json lines ('-' for stdout).",
+)
+@click.option(
+    "--trace",
+    type=click.File(mode="w"),
+    help="File to save the timeline of the run to (trace-event JSON for Perfetto).",
+)
+@click.option(
+    "--stat",
+    is_flag=True,
+    help="Print statistics and timing instead of full results.",
+)
 @click.option(
     "--skip",
     "-s",
@@ -109,14 +142,59 @@ def cli():
     default=False,
     help="Pull from an insecure registry (HTTP or invalid TLS).",
 )
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of checks to run in parallel. (default=1)",
+)
+@click.option(
+    "--layer-cache",
+    is_flag=True,
+    default=False,
+    help="Check out oci images from the persistent cache of unpacked layers.",
+)
+@click.option(
+    "--result-cache",
+    is_flag=True,
+    default=False,
+    help="Reuse the stored results of the same image and check definitions.",
+)
+@click.option(
+    "--podman-socket",
+    type=click.STRING,
+    envvar=PODMAN_SOCKET_ENV,
+    help="Access the images by the podman API service listening on the Unix "
+    "socket (podman CLI is used by default).",
+)
+@click.option(
+    "--containers-storage",
+    type=click.Path(exists=True, dir_okay=True, file_okay=False),
+    envvar=CONTAINERS_STORAGE_ENV,
+    help="Read the images directly from the containers-storage directory "
+    "(overlay driver, e.g. /var/lib/containers/storage).",
+)
+@click.option(
+    "--server",
+    type=click.STRING,
+    help="Run the checks by `colin serve` listening on the Unix socket "
+    "(path) or on http://127.0.0.1:PORT.",
+)
+@click.pass_context
 def check(
+    ctx,
     target,
+    targets_from,
+    target_jobs,
     parent_target,
     ruleset,
     ruleset_file,
     debug,
     json,
     xunit,
+    jsonl,
+    trace,
     stat,
     skip,
     tag,
@@ -126,10 +204,24 @@ def check(
     timeout,
     pull,
     insecure,
+    jobs,
+    layer_cache,
+    result_cache,
+    podman_socket,
+    containers_storage,
+    server,
 ):
     """
     Check the image/dockerfile (default).
     """
+    targets = list(target)
+    if targets_from:
+        targets += _read_targets(targets_from)
+    if not targets:
+        raise click.MissingParameter(
+            ctx=ctx, param_hint="'TARGET'", param_type="argument"
+        )
+
     if ruleset and ruleset_file:
         raise click.BadOptionUsage(
             "Options '--ruleset' and '--file-ruleset' cannot be used together."
@@ -145,33 +237,130 @@ def check(
             "Parent directory for the xunit output file does not exist."
         )
 
+    if (
+        jsonl
+        and not _is_stdout(jsonl)
+        and not os.path.isdir(os.path.dirname(os.path.realpath(jsonl.name)))
+    ):
+        raise click.BadOptionUsage(
+            "Parent directory for the jsonl output file does not exist."
+        )
+
+    if trace and not os.path.isdir(os.path.dirname(os.path.realpath(trace.name))):
+        raise click.BadOptionUsage(
+            "Parent directory for the trace output file does not exist."
+        )
+
+    podman = _get_podman_option(podman_socket, containers_storage)
+
+    if server:
+        local_options = [
+            name
+            for name, value in (
+                ("--checks-path", checks_paths),
+                ("--layer-cache", layer_cache),
+                ("--result-cache", result_cache),
+                ("--podman-socket", podman_socket),
+                ("--containers-storage", containers_storage),
+            )
+            if value
+        ]
+        if local_options:
+            raise click.UsageError(
+                f"Options {', '.join(local_options)} cannot be used with '--server' "
+                "(the server uses its own settings, see `colin serve --help`)."
+            )
+
+    if trace:
+        from ..utils.tracing import start_tracing
+
+        start_tracing()
+
     try:
         if not debug:
             logging.basicConfig(stream=six.StringIO())
 
         log_level = _get_log_level(debug=debug, verbose=verbose)
-        results = run(
-            target=target,
-            parent_target=parent_target,
-            ruleset_name=ruleset,
-            ruleset_file=ruleset_file,
-            logging_level=log_level,
-            tags=tag,
-            pull=pull,
-            checks_paths=checks_paths,
-            target_type=target_type,
-            timeout=timeout,
-            insecure=insecure,
-            skips=skip,
+        if server:
+            from ..core.server import check_many_on_server, check_on_server
+
+            request = dict(
+                target_type=target_type,
+                parent_target=parent_target,
+                ruleset_name=ruleset,
+                ruleset=_load_ruleset(ruleset_file) if ruleset_file else None,
+                tags=list(tag) or None,
+                skips=list(skip) or None,
+                pull=pull,
+                insecure=insecure,
+                timeout=timeout,
+                jobs=jobs,
+            )
+        if len(targets) > 1:
+            if server:
+                target_results = check_many_on_server(
+                    server, targets=targets, target_jobs=target_jobs, **request
+                )
+            else:
+                from ..core.colin import run_many
+
+                target_results = run_many(
+                    targets=targets,
+                    target_jobs=target_jobs,
+                    parent_target=parent_target,
+                    ruleset_name=ruleset,
+                    ruleset_file=ruleset_file,
+                    logging_level=log_level,
+                    tags=tag,
+                    pull=pull,
+                    checks_paths=checks_paths,
+                    target_type=target_type,
+                    timeout=timeout,
+                    insecure=insecure,
+                    skips=skip,
+                    jobs=jobs,
+                    layer_cache=layer_cache,
+                    result_cache=result_cache,
+                    podman=podman,
+                )
+            _check_many(
+                results_of_targets=target_results,
+                json=json,
+                xunit=xunit,
+                jsonl=jsonl,
+                stat=stat,
+                verbose=verbose,
+            )
+        if server:
+            results = check_on_server(server, target=targets[0], **request)
+        else:
+            from ..core.colin import run
+
+            results = run(
+                target=targets[0],
+                parent_target=parent_target,
+                ruleset_name=ruleset,
+                ruleset_file=ruleset_file,
+                logging_level=log_level,
+                tags=tag,
+                pull=pull,
+                checks_paths=checks_paths,
+                target_type=target_type,
+                timeout=timeout,
+                insecure=insecure,
+                skips=skip,
+                jobs=jobs,
+                layer_cache=layer_cache,
+                result_cache=result_cache,
+                podman=podman,
+            )
+        _stream_results(
+            results=results, xunit=xunit, jsonl=jsonl, stat=stat, verbose=verbose
         )
-        _print_results(results=results, stat=stat, verbose=verbose)
 
         if json:
             results.save_json_to_file(file=json)
 
-        if xunit:
-            results.save_xunit_to_file(file=xunit)
-
         if not results.ok:
             sys.exit(1)
         elif results.fail:
@@ -189,6 +378,11 @@ def check(
             raise
         else:
             raise click.ClickException(str(ex))
+    finally:
+        if trace:
+            from ..utils.tracing import stop_tracing
+
+            stop_tracing().save(trace)
 
 
 @click.command(name="list-checks", context_settings=CONTEXT_SETTINGS)
@@ -244,6 +438,9 @@ def list_checks(ruleset, ruleset_file, debug, json, skip, tag, verbose, checks_p
         )
 
     try:
+        from ..core.checks.abstract_check import AbstractCheck
+        from ..core.colin import get_checks
+
         if not debug:
             logging.basicConfig(stream=six.StringIO())
 
@@ -303,6 +500,8 @@ def info():
     """
     Show info about colin and its dependencies.
     """
+    from ..utils.cmd_tools import get_version_msg_from_the_cmd, is_rpm_installed
+
     installation_path = os.path.abspath(
         os.path.join(os.path.dirname(__file__), os.path.pardir)
     )
@@ -322,13 +521,288 @@ def info():
     )
 
 
+@click.group(name="cache", context_settings=CONTEXT_SETTINGS)
+def cache():
+    """
+    Manage the persistent cache of unpacked image layers.
+    """
+    pass
+
+
+@cache.command(name="stats", context_settings=CONTEXT_SETTINGS)
+def cache_stats():
+    """
+    Show the size of the layer cache.
+    """
+    from ..utils.layer_cache import LayerCache
+
+    stats = LayerCache().stats()
+    click.echo(f"path: {stats['path']}")
+    click.echo(f"layers: {stats['layers']}")
+    click.echo(f"size: {stats['size']} B")
+    click.echo(f"max size: {stats['max_size']} B")
+
+
+@cache.command(name="prune", context_settings=CONTEXT_SETTINGS)
+@click.option(
+    "--max-size",
+    type=click.IntRange(min=0),
+    help="Evict least recently used layers until the cache is smaller (in bytes).",
+)
+@click.option("--all", "prune_all", is_flag=True, help="Remove all the cached layers.")
+def cache_prune(max_size, prune_all):
+    """
+    Evict layers from the layer cache.
+    """
+    from ..utils.layer_cache import LayerCache
+
+    evicted = LayerCache().prune(max_size=0 if prune_all else max_size)
+    for diff_id in evicted:
+        click.echo(diff_id)
+    click.echo(f"{len(evicted)} layer(s) removed.")
+
+
+@click.command(name="serve", context_settings=CONTEXT_SETTINGS)
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False),
+    help="Unix socket to listen on.",
+)
+@click.option(
+    "--port",
+    type=click.IntRange(min=1, max=65535),
+    help="Port to listen on (127.0.0.1 only).",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    default=2,
+    help="Number of check requests running at once. (default=2)",
+)
+@click.option(
+    "--queue-size",
+    type=click.IntRange(min=0),
+    default=16,
+    help="Number of requests waiting for a free slot, "
+    "more are rejected. (default=16)",
+)
+@click.option(
+    "--ruleset",
+    "-r",
+    type=click.STRING,
+    envvar="COLIN_RULESET",
+    help="Ruleset to load at start (others are loaded on first use).",
+)
+@click.option(
+    "--workers",
+    type=click.IntRange(min=0),
+    default=0,
+    help="Number of forked worker processes sharing the loaded checks "
+    "(default=0, requests are served by the threads of one process).",
+)
+@click.option(
+    "--max-requests",
+    type=click.IntRange(min=1),
+    help="Replace the worker after so many requests.",
+)
+@click.option(
+    "checks_paths",
+    "--checks-path",
+    type=click.Path(exists=True, dir_okay=True, file_okay=False),
+    multiple=True,
+    envvar=COLIN_CHECKS_PATH,
+    help=f"Path to directory containing checks (default {get_checks_paths()}).",
+)
+@click.option(
+    "--layer-cache",
+    is_flag=True,
+    default=False,
+    help="Check out oci images from the persistent cache of unpacked layers.",
+)
+@click.option(
+    "--result-cache",
+    is_flag=True,
+    default=False,
+    help="Reuse the stored results of the same image and check definitions.",
+)
+@click.option(
+    "--podman-socket",
+    type=click.STRING,
+    envvar=PODMAN_SOCKET_ENV,
+    help="Access the images by the podman API service listening on the Unix "
+    "socket (podman CLI is used by default).",
+)
+@click.option(
+    "--containers-storage",
+    type=click.Path(exists=True, dir_okay=True, file_okay=False),
+    envvar=CONTAINERS_STORAGE_ENV,
+    help="Read the images directly from the containers-storage directory "
+    "(overlay driver, e.g. /var/lib/containers/storage).",
+)
+@click.option(
+    "--debug",
+    default=False,
+    is_flag=True,
+    help="Enable debugging mode (debugging logs, full tracebacks).",
+)
+@click.option("--verbose", "-v", is_flag=True, help="Verbose mode.")
+def serve(
+    socket_path,
+    port,
+    jobs,
+    queue_size,
+    ruleset,
+    workers,
+    max_requests,
+    checks_paths,
+    layer_cache,
+    result_cache,
+    podman_socket,
+    containers_storage,
+    debug,
+    verbose,
+):
+    """
+    Run the checks requested over a Unix socket or localhost HTTP.
+    """
+    if bool(socket_path) == bool(port):
+        raise click.BadOptionUsage(
+            "Exactly one of the options '--socket' and '--port' has to be used."
+        )
+    if max_requests and not workers:
+        raise click.BadOptionUsage(
+            "Option '--max-requests' can be used only with '--workers'."
+        )
+    podman = _get_podman_option(podman_socket, containers_storage)
+
+    try:
+        from ..core.colin import _set_logging
+        from ..core.server import ColinService, PreforkServer, create_server
+
+        log_level = _get_log_level(debug=debug, verbose=verbose)
+        _set_logging(level=log_level)
+        service = ColinService(
+            jobs=jobs,
+            queue_size=queue_size,
+            checks_paths=checks_paths,
+            result_cache=result_cache,
+            layer_cache=layer_cache,
+            logging_level=log_level,
+            max_requests=max_requests,
+            podman=podman,
+        )
+        service.warm_up(ruleset_name=ruleset)
+        server = create_server(service, socket_path=socket_path, port=port)
+    except ColinException as ex:
+        logger.error("An error occurred: %r", ex)
+        if debug:
+            raise
+        raise click.ClickException(str(ex))
+
+    click.echo(
+        f"Listening on {socket_path or f'http://127.0.0.1:{server.server_address[1]}'}."
+    )
+    # stop on SIGTERM the same way as on Ctrl+C (and remove the socket)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        if workers:
+            PreforkServer(server, workers=workers).serve_forever()
+        else:
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
 cli.add_command(check)
 cli.add_command(list_checks)
 cli.add_command(list_rulesets)
 cli.add_command(info)
+cli.add_command(cache)
+cli.add_command(serve)
 cli.set_default_command(check)  # type: ignore
 
 
+def _get_podman_option(podman_socket, containers_storage):
+    """the podman backend for the image targets (see colin.utils.podman.get_podman)"""
+    if podman_socket and containers_storage:
+        raise click.BadOptionUsage(
+            "Options '--podman-socket' and '--containers-storage' "
+            "cannot be used together."
+        )
+    if containers_storage:
+        return CONTAINERS_STORAGE_PREFIX + containers_storage
+    return podman_socket
+
+
+def _load_ruleset(fileobj):
+    """content of the ruleset file (sent to the server)"""
+    from ..core.ruleset.loader import get_ruleset_struct_from_fileobj
+
+    return get_ruleset_struct_from_fileobj(fileobj).d
+
+
+def _read_targets(fileobj):
+    """targets from the file: one per line, empty lines and # comments are skipped"""
+    targets = []
+    for line in fileobj:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            targets.append(line)
+    return targets
+
+
+def _check_many(results_of_targets, json, xunit, jsonl, stat, verbose):
+    """print the results of more targets (iterable of TargetResults) and exit"""
+    from ..core.result import TargetResults
+    from ..core.result_writers import JsonLinesWriter, XunitWriter
+
+    jsonl_writer = JsonLinesWriter(jsonl) if jsonl else None
+    print_results = not (jsonl and _is_stdout(jsonl))
+    all_results = []
+    with contextlib.ExitStack() as stack:
+        xunit_writer = stack.enter_context(XunitWriter(xunit)) if xunit else None
+        for target_results in results_of_targets:
+            all_results.append(target_results)
+            if target_results.error is None:
+                if jsonl_writer:
+                    for result in target_results.results.results:
+                        jsonl_writer.add(result, target=target_results.target)
+                    jsonl_writer.add_phases(
+                        target_results.results.phases_dict, target=target_results.target
+                    )
+                if xunit_writer:
+                    xunit_writer.add_testsuite(
+                        target_results.results.results, name=target_results.target
+                    )
+            elif jsonl_writer:
+                jsonl_writer.add_error(target_results.target, target_results.error)
+
+            if not print_results:
+                continue
+            click.secho(f"{target_results.target}:", bold=True)
+            if target_results.duplicate_of is not None:
+                click.echo(f"(same as {target_results.duplicate_of})")
+            if target_results.error is not None:
+                click.secho(f"ERROR: {target_results.error}", fg="red")
+            else:
+                _print_results(
+                    results=target_results.results, stat=stat, verbose=verbose
+                )
+
+    if json:
+        json_module.dump(obj=TargetResults.json_of_all(all_results), fp=json, indent=4)
+
+    if not all(t.ok for t in all_results):
+        sys.exit(1)
+    elif any(t.fail for t in all_results):
+        sys.exit(3)
+    sys.exit(0)
+
+
 def _print_results(results, stat=False, verbose=False):
     """
     Prints the results to the stdout
@@ -342,6 +816,38 @@ def _print_results(results, stat=False, verbose=False):
     )
 
 
+def _stream_results(results, xunit=None, jsonl=None, stat=False, verbose=False):
+    """
+    Print the results and write them to the streaming outputs as they come
+
+    :param results: CheckResults instance
+    :param xunit: file to write the xunit output to
+    :param jsonl: file to write the json lines to (the results are not printed to stdout)
+    """
+    from ..core.result_writers import JsonLinesWriter, XunitWriter
+
+    jsonl_writer = JsonLinesWriter(jsonl) if jsonl else None
+    with contextlib.ExitStack() as stack:
+        if jsonl_writer:
+            results.add_listener(jsonl_writer.add)
+        if xunit:
+            xunit_writer = stack.enter_context(XunitWriter(xunit))
+            xunit_writer.start_testsuite()
+            results.add_listener(xunit_writer.add)
+
+        if jsonl and _is_stdout(jsonl):
+            for _ in results.results:
+                pass
+        else:
+            _print_results(results=results, stat=stat, verbose=verbose)
+    if jsonl_writer:
+        jsonl_writer.add_phases(results.phases_dict)
+
+
+def _is_stdout(file):
+    return getattr(file, "name", None) == "<stdout>"
+
+
 def _print_checks(checks):
     if not checks:
         click.echo("No check found.")
@@ -15,34 +15,315 @@
 
 import logging
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 
-from .constant import CHECK_TIMEOUT
+from .constant import (
+    CHECK_TIMEOUT,
+    FACET_CONFIG,
+    FACET_DOCKERFILE,
+    FACET_FILES,
+    FACET_LABELS,
+    FACETS,
+)
+from .label_evaluator import LabelEvaluator
 from .result import CheckResults, FailedCheckResult
+from .result_cache import check_fingerprint
 from ..utils.cmd_tools import exit_after
+from ..utils.metrics import RunPhases, measure
+from ..utils.oci import PathFilter
+from ..utils.tracing import span
 
 logger = logging.getLogger(__name__)
 
+# facets not reading the content of the files of the image
+_NO_CONTENT_FACETS = {FACET_LABELS, FACET_CONFIG, FACET_DOCKERFILE, FACET_FILES}
 
-def go_through_checks(target, checks, timeout=None):
+
+def go_through_checks(
+    target, checks, timeout=None, jobs=None, result_cache=None, phases=None
+):
+    """
+    Run the checks against the target.
+
+    :param target: Target instance
+    :param checks: list of check instances or CheckPlan
+    :param timeout: timeout per-check (in seconds)
+    :param jobs: int, number of checks to run at once (None or 1 means one after another)
+    :param result_cache: ResultCache instance, the cached results are returned
+                         without touching the target
+    :param phases: RunPhases instance to add the phases of the run to
+    :return: CheckResults instance
+    """
     logger.debug("Going through checks.")
-    results = _result_generator(target=target, checks=checks, timeout=timeout)
-    return CheckResults(results=results)
+    if not isinstance(checks, CheckPlan):
+        checks = CheckPlan(checks)
+    phases = phases or RunPhases()
+    run = _CheckRun(
+        plan=checks,
+        target=target,
+        timeout=timeout,
+        result_cache=result_cache,
+        phases=phases,
+    )
+    if jobs and jobs > 1:
+        results = _parallel_result_generator(run=run, jobs=jobs)
+    else:
+        results = _result_generator(run=run)
+    return CheckResults(results=_in_plan_order(checks, results), phases=phases)
+
+
+def _in_plan_order(plan, check_results):
+    """
+    Yield the results in the order of the checks in the plan (ruleset order),
+    each one as soon as the results of all the checks before it are known.
+
+    :param plan: CheckPlan
+    :param check_results: generator of (check, result) in the order the checks run
+    """
+    positions = {}
+    for index, check in enumerate(plan.checks):
+        positions.setdefault(id(check), []).append(index)
+    ready = {}
+    next_index = 0
+    try:
+        for check, result in check_results:
+            ready[positions[id(check)].pop(0)] = result
+            while next_index in ready:
+                yield ready.pop(next_index)
+                next_index += 1
+    finally:
+        check_results.close()
+
+
+def _get_path_filter(checks):
+    """
+    Paths of the image filesystem read by the checks.
+
+    :param checks: list of check instances
+    :return: PathFilter or None when some check can read any path
+    """
+    path_filter = PathFilter()
+    for check in checks:
+        if check.paths is None:
+            return None
+        if not check.paths and not (
+            check.facets and set(check.facets) <= _NO_CONTENT_FACETS
+        ):
+            # needs the filesystem, but does not say which paths
+            return None
+        path_filter.add(*check.paths)
+    if not (path_filter.files or path_filter.directories or path_filter.patterns):
+        return None
+    return path_filter
+
+
+def _facets_cost(facets):
+    """index of the most expensive facet; unknown facets are the most expensive"""
+    if not facets or any(f not in FACETS for f in facets):
+        return len(FACETS)
+    return max(FACETS.index(f) for f in facets)
+
+
+class CheckStage:
+    """Checks needing the same (most expensive) facet of the target."""
+
+    def __init__(self, facets, checks, name=None):
+        """
+        :param facets: frozenset of str, facets needed by the checks
+        :param checks: tuple of check instances
+        :param name: str, the most expensive facet (used in the phases of the run)
+        """
+        self.facets = facets
+        self.checks = checks
+        self.name = name or "other"
+
+    def __repr__(self):
+        return f"CheckStage({sorted(self.facets)}, {len(self.checks)} checks)"
+
+
+class CheckPlan:
+    """
+    Checks selected from the ruleset, prepared to run against any number of targets.
+
+    The checks are grouped to stages by the facets of the target they need
+    (see AbstractCheck.facets); the stages are ordered from the cheapest one.
+    The checks keep the ruleset order inside the stage, the results
+    are reported in the ruleset order.
+
+    Use Ruleset.compile to get the plan.
+    """
+
+    def __init__(self, checks):
+        """
+        :param checks: list of check instances (already prepared)
+        """
+        self.checks = tuple(checks)
+        self.label_evaluator = LabelEvaluator(self.checks)
+        groups = {}
+        for check in self.checks:
+            groups.setdefault(_facets_cost(check.facets), []).append(check)
+        self.stages = tuple(
+            CheckStage(
+                facets=frozenset(f for c in groups[cost] for f in c.facets),
+                checks=tuple(groups[cost]),
+                name=FACETS[cost] if cost < len(FACETS) else None,
+            )
+            for cost in sorted(groups)
+        )
+        self.facets = frozenset(f for stage in self.stages for f in stage.facets)
+        self.path_filter = _get_path_filter(self.checks)
+        self._fingerprints = {}
+
+    def fingerprint(self, check):
+        """
+        Fingerprint of the check in the plan (computed once).
+
+        :param check: check instance from the plan
+        :return: str
+        """
+        fingerprint = self._fingerprints.get(id(check))
+        if fingerprint is None:
+            fingerprint = check_fingerprint(check)
+            self._fingerprints[id(check)] = fingerprint
+        return fingerprint
+
+    def __iter__(self):
+        return iter(self.checks)
+
+    def __len__(self):
+        return len(self.checks)
+
+
+def _prepare_target(target, facets, timeout=None):
+    """
+    Prepare the access paths of the target for the facets.
+
+    Failures are only logged: the checks access the target
+    lazily again and report the problem in their results.
+    """
+    if not facets:
+        return
+    logger.debug("Preparing the target for facets: %s", sorted(facets))
+    try:
+        exit_after(timeout or CHECK_TIMEOUT)(target.prepare)(facets)
+    except Exception as ex:
+        logger.warning("Cannot prepare the target for %s: %r", sorted(facets), ex)
+
+
+class _CheckRun:
+    """State of one run of the plan against the target."""
+
+    def __init__(self, plan, target, timeout=None, result_cache=None, phases=None):
+        self.plan = plan
+        self.target = target
+        self.timeout = timeout
+        self.phases = phases or RunPhases()
+        self.target.set_path_filter(plan.path_filter)
+        # label checks are evaluated all at once, in one pass over the labels
+        self.label_results = plan.label_evaluator.for_target()
+        self.cached = None
+        self.known = {}
+        if result_cache is not None:
+            self.cached = result_cache.for_target(target)
+        if self.cached is not None:
+            for check in plan.checks:
+                result = self.cached.get(plan.fingerprint(check))
+                if result is not None:
+                    self.known[id(check)] = result
+
+    @property
+    def stages(self):
+        """the cheap stages run first"""
+        return self.plan.stages
+
+    def prepare(self, stage):
+        if all(id(check) in self.known for check in stage.checks):
+            return
+        with self.phases.phase(f"prepare:{stage.name}"):
+            _prepare_target(self.target, stage.facets, timeout=self.timeout)
+
+    def run_check(self, check, stage):
+        if id(check) in self.known:
+            logger.debug("Result of %s found in the cache.", check.name)
+            return self.known[id(check)]
+        with span(
+            check.name, "check", {"target": str(self.target.target_name)}
+        ) as check_span, measure() as metrics:
+            result = _run_check(
+                check=check,
+                target=self.target,
+                timeout=self.timeout,
+                label_evaluator=self.label_results,
+            )
+            check_span.set("status", result.status)
+        result.metrics = metrics
+        # sum of the time of the checks (more than elapsed when running in parallel)
+        self.phases.add(f"checks:{stage.name}", metrics.wall_time)
+        if self.cached is not None:
+            self.cached.add(self.plan.fingerprint(check), result)
+        return result
+
+    def finish(self):
+        try:
+            if self.cached is not None:
+                self.cached.save()
+        finally:
+            with self.phases.phase("clean_up"):
+                self.target.clean_up()
+
+
+def _result_generator(run):
+    try:
+        for stage in run.stages:
+            run.prepare(stage)
+            for check in stage.checks:
+                yield check, run.run_check(check, stage)
+    finally:
+        run.finish()
+
+
+def _run_check(check, target, timeout=None, label_evaluator=None):
+    logger.debug("Checking %s", check.name)
+    _timeout = timeout or check.timeout or CHECK_TIMEOUT
+    logger.debug("Check timeout: %s", _timeout)
+    if label_evaluator is not None and check in label_evaluator:
+
+        def check_function(t):
+            return label_evaluator.get_result(check, t)
+
+    else:
+        check_function = check.check
+    try:
+        return exit_after(_timeout)(check_function)(target)
+    except TimeoutError as ex:
+        logger.warning("The check hit the timeout: %s", _timeout)
+        return FailedCheckResult(check, logs=[str(ex)])
+    except Exception as ex:
+        tb = traceback.format_exc()
+        logger.warning("There was an error while performing check: %s", tb)
+        return FailedCheckResult(check, logs=[str(ex)])
+
 
+def _parallel_result_generator(run, jobs=2):
+    """
+    Run the checks on a pool of `jobs` worker threads, one stage after another.
 
-def _result_generator(target, checks, timeout=None):
+    The (check, result) pairs are yielded in the same order as the checks in the stages.
+    """
+    executor = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="colin-check")
+    futures = []
     try:
-        for check in checks:
-            logger.debug("Checking %s", check.name)
-            try:
-                _timeout = timeout or check.timeout or CHECK_TIMEOUT
-                logger.debug("Check timeout: %s", _timeout)
-                yield exit_after(_timeout)(check.check)(target)
-            except TimeoutError as ex:
-                logger.warning("The check hit the timeout: %s", _timeout)
-                yield FailedCheckResult(check, logs=[str(ex)])
-            except Exception as ex:
-                tb = traceback.format_exc()
-                logger.warning("There was an error while performing check: %s", tb)
-                yield FailedCheckResult(check, logs=[str(ex)])
+        for stage in run.stages:
+            run.prepare(stage)
+            stage_futures = [
+                executor.submit(run.run_check, check, stage) for check in stage.checks
+            ]
+            futures.extend(stage_futures)
+            for check, future in zip(stage.checks, stage_futures):
+                yield check, future.result()
     finally:
-        target.clean_up()
+        # when the consumer stops early, do not start the remaining checks
+        for future in futures:
+            future.cancel()
+        executor.shutdown(wait=True)
+        run.finish()
@@ -13,12 +13,24 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 import json
+import re
 from typing import Optional
 
+from ..exceptions import ColinRulesetException
+
 
 class AbstractCheck:
     name: Optional[str] = None
     check_type: Optional[str] = None
+    # attributes holding regular expressions, precompiled by prepare
+    regex_attributes: tuple = ()
+    # parts of the target the check needs (colin.core.constant.FACETS);
+    # empty means unknown, such checks are run last
+    facets: tuple = ()
+    # paths of the image filesystem the check reads: files, directories
+    # (ending with "/") or glob patterns; () for the checks reading none
+    # of the files, None means any path (set it again when overriding check)
+    paths: Optional[tuple] = None
 
     def __init__(self, message, description, reference_url, tags):
         self.message = message
@@ -30,6 +42,39 @@ class AbstractCheck:
     def check(self, target):
         pass
 
+    def prepare(self):
+        """
+        Validate and precompile the parameters of the check.
+
+        Called once when the ruleset is compiled
+        (after the attributes from the ruleset are set).
+
+        :raises ColinRulesetException: a parameter is not valid
+        """
+        self._patterns = {}
+        for attribute in self.regex_attributes:
+            regex = getattr(self, attribute, None)
+            if regex is None:
+                continue
+            try:
+                self._patterns[regex] = re.compile(regex)
+            except (re.error, TypeError) as ex:
+                raise ColinRulesetException(
+                    f"Check {self.name}: invalid regex in '{attribute}' ({regex!r}): {ex}"
+                )
+
+    def get_pattern(self, regex):
+        """
+        Get the compiled regex (precompiled by prepare if possible).
+
+        :param regex: str
+        :return: compiled pattern
+        """
+        try:
+            return self._patterns[regex]
+        except (AttributeError, KeyError):
+            return re.compile(regex)
+
     def __str__(self):
         return (
             f"{self.name}\n"
@@ -12,14 +12,16 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
-import re
-
 from .abstract_check import ImageAbstractCheck
+from ..constant import FACET_EXEC
 from ..exceptions import ColinException
 from ..result import CheckResult, FailedCheckResult
 
 
 class CmdAbstractCheck(ImageAbstractCheck):
+    regex_attributes = ("expected_regex",)
+    facets = (FACET_EXEC,)
+
     def __init__(
         self,
         message,
@@ -85,7 +87,7 @@ class CmdAbstractCheck(ImageAbstractCheck):
                 passed = False
 
         if self.expected_regex is not None:
-            pattern = re.compile(self.expected_regex)
+            pattern = self.get_pattern(self.expected_regex)
             if pattern.match(output):
                 logs.append(
                     f"ok: Output of the command '{self.cmd}' "
@@ -13,10 +13,11 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 import logging
-import re
 
 from .abstract_check import DockerfileAbstractCheck
 from .check_utils import check_label
+from ..constant import FACET_DOCKERFILE, FACET_LABELS
+from ..dockerfile_model import DockerfileModel
 from ..result import CheckResult
 
 logger = logging.getLogger(__name__)
@@ -27,14 +28,19 @@ def get_instructions_from_dockerfile_parse(dfp, instruction):
     Get the list of instruction dictionary for given instruction name.
     (Subset of DockerfileParser.structure only for given instruction.)
 
-    :param dfp: DockerfileParser
+    :param dfp: DockerfileParser or DockerfileModel
     :param instruction: str
     :return: list
     """
+    if isinstance(dfp, DockerfileModel):
+        return list(dfp.get_instructions(instruction))
     return [inst for inst in dfp.structure if inst["instruction"] == instruction]
 
 
 class InstructionAbstractCheck(DockerfileAbstractCheck):
+    regex_attributes = ("value_regex",)
+    facets = (FACET_DOCKERFILE,)
+
     def __init__(
         self,
         message,
@@ -51,10 +57,8 @@ class InstructionAbstractCheck(DockerfileAbstractCheck):
         self.required = required
 
     def check(self, target):
-        instructions = get_instructions_from_dockerfile_parse(
-            target.instance, self.instruction
-        )
-        pattern = re.compile(self.value_regex)
+        instructions = target.model.get_instructions(self.instruction)
+        pattern = self.get_pattern(self.value_regex)
         logs = []
         passed = True
         for inst in instructions:
@@ -77,6 +81,8 @@ class InstructionAbstractCheck(DockerfileAbstractCheck):
 
 
 class InstructionCountAbstractCheck(DockerfileAbstractCheck):
+    facets = (FACET_DOCKERFILE,)
+
     def __init__(
         self,
         message,
@@ -93,9 +99,7 @@ class InstructionCountAbstractCheck(DockerfileAbstractCheck):
         self.max_count = max_count
 
     def check(self, target):
-        count = len(
-            get_instructions_from_dockerfile_parse(target.instance, self.instruction)
-        )
+        count = len(target.model.get_instructions(self.instruction))
 
         log = "Found {} occurrences of the {} instruction. Needed: min {} | max {}".format(
             count, self.instruction, self.min_count, self.max_count
@@ -118,6 +122,9 @@ class InstructionCountAbstractCheck(DockerfileAbstractCheck):
 
 
 class DockerfileLabelAbstractCheck(DockerfileAbstractCheck):
+    regex_attributes = ("value_regex",)
+    facets = (FACET_LABELS,)
+
     def __init__(
         self,
         message,
@@ -134,7 +141,7 @@ class DockerfileLabelAbstractCheck(DockerfileAbstractCheck):
         self.value_regex = value_regex
 
     def check(self, target):
-        labels = target.instance.labels
+        labels = target.labels
         passed = check_label(
             labels=self.label,
             required=self.required,
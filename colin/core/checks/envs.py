@@ -13,13 +13,16 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
-import re
-
 from .abstract_check import ImageAbstractCheck
+from ..constant import FACET_CONFIG
 from ..result import CheckResult
 
 
 class EnvCheck(ImageAbstractCheck):
+    regex_attributes = ("value_regex",)
+    facets = (FACET_CONFIG,)
+    paths = ()
+
     def __init__(
         self,
         message,
@@ -51,7 +54,7 @@ class EnvCheck(ImageAbstractCheck):
             if self.required and not self.value_regex:
                 passed = True
             elif self.value_regex:
-                pattern = re.compile(self.value_regex)
+                pattern = self.get_pattern(self.value_regex)
                 passed = bool(pattern.match(env_vars_dict[self.env_var]))
             else:
                 passed = False
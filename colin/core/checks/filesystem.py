@@ -15,6 +15,7 @@
 import logging
 
 from .abstract_check import ImageAbstractCheck
+from ..constant import FACET_FILES
 from ..result import CheckResult
 
 logger = logging.getLogger(__name__)
@@ -23,6 +24,8 @@ logger = logging.getLogger(__name__)
 class FileCheck(ImageAbstractCheck):
     """Check presence of files; w/o mounting the whole FS"""
 
+    facets = (FACET_FILES,)
+
     def __init__(
         self, message, description, reference_url, tags, files, all_must_be_present
     ):
@@ -30,6 +33,10 @@ class FileCheck(ImageAbstractCheck):
         self.files = files
         self.all_must_be_present = all_must_be_present
 
+    @property
+    def paths(self):
+        return tuple(self.files or ())
+
     def _handle_image(self, target):
         passed = self.all_must_be_present
 
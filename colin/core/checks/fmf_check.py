@@ -2,9 +2,11 @@
 Module with FMF abstract check class
 """
 
+import copy
 import logging
 import inspect
 import os
+import threading
 from typing import Optional
 
 from .abstract_check import AbstractCheck
@@ -13,22 +15,131 @@ from ..fmf_extension import ExtendedTree
 logger = logging.getLogger(__name__)
 
 
-def receive_fmf_metadata(name, path, object_list=False):
+def _fmf_tree_key(path):
+    """
+    Identify the version of the FMF tree: all the .fmf files under the path.
+    """
+    fmf_files = []
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(".fmf") or name == "version":
+                st = os.stat(os.path.join(root, name))
+                fmf_files.append((root, name, st.st_mtime_ns, st.st_size))
+    return tuple(fmf_files)
+
+
+class CheckMetadata:
+    """
+    FMF metadata of a check without the tree (name and data of the FMF node),
+    e.g. loaded from the compiled cache.
+    """
+
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+
+    def __repr__(self):
+        return f"CheckMetadata({self.name!r})"
+
+
+class FMFMetadataIndex:
+    """
+    FMF tree of one directory parsed once and indexed by the node names.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: str, directory with the FMF tree
+        """
+        self.path = path
+        self.tree = ExtendedTree(path)
+        self.nodes = []
+        self._by_name = {}
+        for node in self.tree.climb():
+            # ignore items with @ in names, to avoid using unreferenced items
+            if "@" in node.name:
+                continue
+            self.nodes.append(node)
+            self._by_name.setdefault(node.name.rsplit("/", 1)[-1], []).append(node)
+
+    def find(self, name):
+        """
+        :param name: str - name as pattern to search - "/name" (prepended hierarchy item)
+        :return: list of nodes with the name ending with "/name"
+        """
+        if "/" in name:
+            return [x for x in self.nodes if x.name.endswith("/" + name)]
+        return list(self._by_name.get(name, ()))
+
+
+class FMFMetadataCache:
+    """
+    Process-wide, thread-safe cache of the FMF trees (one per directory).
+
+    The entries are validated by the modification times of the .fmf files,
+    so changed metadata are parsed again.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._indexes = {}
+
+    def get_index(self, path):
+        """
+        :param path: str, directory with the FMF tree
+        :return: FMFMetadataIndex
+        """
+        path = os.path.abspath(path)
+        key = _fmf_tree_key(path)
+        with self._lock:
+            cached = self._indexes.get(path)
+            if cached is not None and cached[0] == key:
+                return cached[1]
+            logger.debug("parsing FMF tree (path:%s)", path)
+            index = FMFMetadataIndex(path)
+            self._indexes[path] = (key, index)
+            return index
+
+    def invalidate(self, path=None):
+        """
+        Forget the parsed trees.
+
+        :param path: str, directory to invalidate; everything if None
+        """
+        with self._lock:
+            if path is None:
+                self._indexes.clear()
+                return
+            path = os.path.abspath(path)
+            for p in list(self._indexes):
+                if p == path or p.startswith(path.rstrip(os.sep) + os.sep):
+                    del self._indexes[p]
+
+
+_FMF_METADATA_CACHE = FMFMetadataCache()
+
+
+def get_fmf_metadata_cache():
+    """the process-wide FMFMetadataCache"""
+    return _FMF_METADATA_CACHE
+
+
+def receive_fmf_metadata(name, path, object_list=False, fmf_index=None):
     """
     search node identified by name fmfpath
 
     :param path: path to filesystem
     :param name: str - name as pattern to search - "/name" (prepended hierarchy item)
     :param object_list: bool, if true, return whole list of found items
+    :param fmf_index: FMFMetadataIndex of the path (looked up in the cache if None)
     :return: Tree Object or list
     """
     output = {}
-    fmf_tree = ExtendedTree(path)
     logger.debug("get FMF metadata for test (path:%s name=%s)", path, name)
-    # ignore items with @ in names, to avoid using unreferenced items
-    items = [
-        x for x in fmf_tree.climb() if x.name.endswith("/" + name) and "@" not in x.name
-    ]
+    if fmf_index is None:
+        fmf_index = _FMF_METADATA_CACHE.get_index(path)
+    items = fmf_index.find(name)
     if object_list:
         return items
     if len(items) == 1:
@@ -79,8 +190,9 @@ class FMFAbstractCheck(AbstractCheck):
             args_names = inspect.getargspec(master_class.__init__).args
         for arg in args_names:
             # copy all arguments from metadata.data to class __init__  kwargs
+            # (deep copy: the metadata are shared by all instances of the class)
             try:
-                kwargs[arg] = self.metadata.data[arg]
+                kwargs[arg] = copy.deepcopy(self.metadata.data[arg])
             except KeyError:
                 pass
         try:
@@ -16,12 +16,17 @@ import logging
 
 from .abstract_check import ImageAbstractCheck, DockerfileAbstractCheck
 from .check_utils import check_label
+from ..constant import FACET_LABELS
 from ..result import CheckResult
 
 logger = logging.getLogger(__name__)
 
 
 class LabelAbstractCheck(ImageAbstractCheck, DockerfileAbstractCheck):
+    regex_attributes = ("value_regex",)
+    facets = (FACET_LABELS,)
+    paths = ()
+
     def __init__(
         self,
         message,
@@ -67,6 +72,9 @@ class LabelAbstractCheck(ImageAbstractCheck, DockerfileAbstractCheck):
 
 
 class DeprecatedLabelAbstractCheck(ImageAbstractCheck, DockerfileAbstractCheck):
+    facets = (FACET_LABELS,)
+    paths = ()
+
     def __init__(self, message, description, reference_url, tags, old_label, new_label):
         super().__init__(message, description, reference_url, tags)
         self.old_label = old_label
@@ -89,6 +97,9 @@ class DeprecatedLabelAbstractCheck(ImageAbstractCheck, DockerfileAbstractCheck):
 
 
 class InheritedOptionalLabelAbstractCheck(ImageAbstractCheck):
+    facets = (FACET_LABELS,)
+    paths = ()
+
     def __init__(self, message, description, reference_url, tags):
         """
         Abstract check for Dockerfile/Image labels.
@@ -14,10 +14,15 @@
 #
 
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from .check_runner import go_through_checks
+from .result import TargetResults
+from .result_cache import ResultCache
 from .ruleset.ruleset import Ruleset
 from .target import Target
+from ..utils.metrics import RunPhases
 
 logger = logging.getLogger(__name__)
 
@@ -36,10 +41,21 @@ def run(
     insecure=False,
     skips=None,
     timeout=None,
+    jobs=None,
+    layer_cache=False,
+    result_cache=False,
+    podman=None,
 ):
     """
     Runs the sanity checks for the target.
 
+    :param podman: str, socket of the podman API service used for the images
+                   (default is $COLIN_PODMAN_SOCKET, the podman CLI if not set)
+    :param result_cache: bool or ResultCache, reuse the persistent results
+                         of the same target and checks
+    :param layer_cache: bool or LayerCache, use the persistent cache of unpacked
+                        layers for oci targets
+    :param jobs: int, number of checks to run in parallel (default is one at a time)
     :param timeout: timeout per-check (in seconds)
     :param skips: name of checks to skip
     :param target: str (image name, oci, or dockertar)
@@ -59,7 +75,50 @@ def run(
     """
     _set_logging(level=logging_level)
     logger.debug("Checking started.")
+    phases = RunPhases()
 
+    with phases.phase("target"):
+        target = _get_target(
+            target=target,
+            parent_target=parent_target,
+            logging_level=logging_level,
+            pull=pull,
+            target_type=target_type,
+            insecure=insecure,
+            layer_cache=layer_cache,
+            podman=podman,
+        )
+
+    with phases.phase("ruleset"):
+        checks_to_run = Ruleset(
+            ruleset_name=ruleset_name,
+            ruleset_file=ruleset_file,
+            ruleset=ruleset,
+            checks_paths=checks_paths,
+        ).compile(target_type=target.__class__, tags=tags, skips=skips)
+    if result_cache is True:
+        result_cache = ResultCache()
+    return go_through_checks(
+        target=target,
+        checks=checks_to_run,
+        timeout=timeout,
+        jobs=jobs,
+        result_cache=result_cache or None,
+        phases=phases,
+    )
+
+
+def _get_target(
+    target,
+    target_type,
+    parent_target,
+    logging_level,
+    pull,
+    insecure,
+    layer_cache,
+    podman=None,
+):
+    """create the target (and its parent)"""
     parent = None
     if parent_target is not None and target_type != "dockerfile":
         parent = Target.get_instance(
@@ -68,6 +127,8 @@ def run(
             pull=pull,
             target_type=target_type,
             insecure=insecure,
+            layer_cache=layer_cache,
+            podman=podman,
         )
 
     target = Target.get_instance(
@@ -77,18 +138,170 @@ def run(
         pull=pull,
         target_type=target_type,
         insecure=insecure,
+        layer_cache=layer_cache,
+        podman=podman,
     )
+    return target
 
-    checks_to_run = _get_checks(
-        target_type=target.__class__,
-        tags=tags,
+
+def run_many(
+    targets,
+    target_type,
+    parent_target=None,
+    tags=None,
+    ruleset_name=None,
+    ruleset_file=None,
+    ruleset=None,
+    logging_level=logging.WARNING,
+    checks_paths=None,
+    pull=None,
+    insecure=False,
+    skips=None,
+    timeout=None,
+    jobs=None,
+    layer_cache=False,
+    result_cache=False,
+    podman=None,
+    target_jobs=4,
+):
+    """
+    Runs the sanity checks for more targets with one ruleset.
+
+    The ruleset is loaded and compiled once, `target_jobs` targets are prepared
+    and checked at once. Targets resolving to the same content (e.g. the same
+    image ID) are checked only once.
+
+    :param targets: list of str (image names, oci, or paths to dockerfiles)
+    :param target_jobs: int, number of targets checked at once
+    :return: generator of TargetResults (in the order of the targets)
+
+    See run for the other parameters.
+    """
+    _set_logging(level=logging_level)
+    logger.debug("Checking of %d targets started.", len(targets))
+
+    ruleset = Ruleset(
         ruleset_name=ruleset_name,
         ruleset_file=ruleset_file,
         ruleset=ruleset,
         checks_paths=checks_paths,
-        skips=skips,
     )
-    return go_through_checks(target=target, checks=checks_to_run, timeout=timeout)
+    if result_cache is True:
+        result_cache = ResultCache()
+    if layer_cache is True:
+        # one cache instance shared by all the targets
+        from ..utils.layer_cache import LayerCache
+
+        layer_cache = LayerCache()
+
+    parent = None
+    if parent_target is not None and target_type != "dockerfile":
+        parent = Target.get_instance(
+            target=parent_target,
+            logging_level=logging_level,
+            pull=pull,
+            target_type=target_type,
+            insecure=insecure,
+            layer_cache=layer_cache,
+            podman=podman,
+        )
+
+    lock = threading.Lock()
+    identities = {}
+
+    def check_target(target_name):
+        phases = RunPhases()
+        try:
+            with phases.phase("target"):
+                target = Target.get_instance(
+                    target=target_name,
+                    parent_target=parent,
+                    logging_level=logging_level,
+                    pull=pull,
+                    target_type=target_type,
+                    insecure=insecure,
+                    layer_cache=layer_cache,
+                    podman=podman,
+                )
+            try:
+                identity = target.identity
+            except Exception as ex:
+                logger.debug("Cannot identify %s: %r", target_name, ex)
+                identity = None
+            with lock:
+                original = identities.get(identity) if identity else None
+                if identity and original is None:
+                    identities[identity] = target_name
+            if original is not None:
+                logger.info("%s is the same as %s.", target_name, original)
+                target.clean_up()
+                return TargetResults(target_name, duplicate_of=original)
+
+            with phases.phase("ruleset"):
+                plan = ruleset.compile(
+                    target_type=target.__class__, tags=tags, skips=skips
+                )
+            results = go_through_checks(
+                target=target,
+                checks=plan,
+                timeout=timeout,
+                jobs=jobs,
+                result_cache=result_cache or None,
+                phases=phases,
+            )
+            # run the checks here, in the worker
+            list(results.results)
+            return TargetResults(target_name, results=results)
+        except Exception as ex:
+            logger.error("Cannot check %s: %r", target_name, ex)
+            return TargetResults(target_name, error=ex)
+
+    executor = ThreadPoolExecutor(
+        max_workers=target_jobs, thread_name_prefix="colin-target"
+    )
+    futures = {}
+    try:
+        ordered = []
+        for target_name in targets:
+            if target_name not in futures:
+                futures[target_name] = executor.submit(check_target, target_name)
+            ordered.append(target_name)
+        positions = {name: ordered.index(name) for name in futures}
+        # target checked as the original -> the same target listed before it
+        reported_as_duplicate = {}
+        reported = {}
+        for target_name in ordered:
+            result = futures[target_name].result()
+            if target_name in reported:
+                # listed more times
+                result = TargetResults(target_name, duplicate_of=target_name)
+            elif target_name in reported_as_duplicate:
+                result = TargetResults(
+                    target_name, duplicate_of=reported_as_duplicate[target_name]
+                )
+            elif (
+                result.duplicate_of is not None
+                and positions[result.duplicate_of] > positions[target_name]
+            ):
+                # identified after a target listed later, but the first one
+                # in the order is reported as the original
+                reported_as_duplicate[result.duplicate_of] = target_name
+                original = futures[result.duplicate_of].result()
+                result = TargetResults(
+                    target_name, results=original.results, error=original.error
+                )
+            if result.duplicate_of is not None:
+                original = reported[result.duplicate_of]
+                result.results = original.results
+                result.error = original.error
+            reported.setdefault(target_name, result)
+            yield result
+    finally:
+        for future in futures.values():
+            future.cancel()
+        executor.shutdown(wait=True)
+        if parent is not None:
+            parent.clean_up()
 
 
 def get_checks(
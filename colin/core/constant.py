@@ -28,3 +28,46 @@ OUTPUT_CHARS = {PASSED: ".", FAILED: "x", ERROR: "#"}
 COLIN_CHECKS_PATH = "CHECKS_PATH"
 
 CHECK_TIMEOUT = 10 * 60  # s
+
+LAYER_CACHE_SIZE = 10 * 1024**3  # B
+LAYER_CACHE_SIZE_ENV = "COLIN_LAYER_CACHE_SIZE"
+
+# layers of the oci images unpacked in parallel: the number of the processes
+# is limited by the memory expected to be used by them (a heuristic,
+# the memory is not limited), the layers extracted but not applied yet take
+# at most half of the free disk space, but not more than UNPACK_SCRATCH_SIZE
+UNPACK_MEMORY = 2 * 1024**3  # B
+UNPACK_MEMORY_ENV = "COLIN_UNPACK_MEMORY"
+UNPACK_WORKER_MEMORY = 128 * 1024**2  # B
+UNPACK_SCRATCH_SIZE = 4 * 1024**3  # B
+UNPACK_SCRATCH_SIZE_ENV = "COLIN_UNPACK_SCRATCH_SIZE"
+
+# rulesets kept loaded by `colin serve` (the least recently used ones are dropped)
+SERVER_RULESETS = 32
+
+# path to the socket of the podman API service (`podman system service`);
+# the podman CLI is used when not set
+PODMAN_SOCKET_ENV = "COLIN_PODMAN_SOCKET"
+PODMAN_API_VERSION = "v4.0.0"
+# graph root of the local containers-storage (overlay) to read the images from
+CONTAINERS_STORAGE_ENV = "COLIN_CONTAINERS_STORAGE"
+CONTAINERS_STORAGE_PREFIX = "containers-storage:"
+# mounted images are kept for reuse, unmounted when not used for so long
+IMAGE_MOUNT_IDLE_TIMEOUT = 60  # s
+
+# parts of the target the checks need (AbstractCheck.facets),
+# FACETS is ordered from the cheapest to the most expensive one
+FACET_LABELS = "labels"
+FACET_CONFIG = "config"
+FACET_DOCKERFILE = "dockerfile"
+FACET_FILES = "files"
+FACET_FILESYSTEM = "filesystem"
+FACET_EXEC = "exec"
+FACETS = (
+    FACET_LABELS,
+    FACET_CONFIG,
+    FACET_DOCKERFILE,
+    FACET_FILES,
+    FACET_FILESYSTEM,
+    FACET_EXEC,
+)
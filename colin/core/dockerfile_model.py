@@ -0,0 +1,120 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Parsed Dockerfile shared by all the Dockerfile checks.
+
+DockerfileParser re-parses the whole content on every access of .structure
+or .labels, so the target parses the file once into this immutable model.
+"""
+from types import MappingProxyType
+
+
+def _index_instructions(structure):
+    index = {}
+    for instruction in structure:
+        index.setdefault(instruction["instruction"], []).append(instruction)
+    return MappingProxyType({k: tuple(v) for k, v in index.items()})
+
+
+class DockerfileStage:
+    """One build stage: the FROM instruction and everything up to the next FROM."""
+
+    def __init__(self, index, structure):
+        """
+        :param index: int, number of the stage (from 0)
+        :param structure: tuple of instructions (the first one is FROM)
+        """
+        self.index = index
+        self.structure = structure
+        self.instructions = _index_instructions(structure)
+        from_value = structure[0]["value"].split() if structure else []
+        # FROM [--platform=...] image [AS name]
+        from_value = [v for v in from_value if not v.startswith("--")]
+        self.baseimage = from_value[0] if from_value else None
+        self.name = (
+            from_value[2]
+            if len(from_value) >= 3 and from_value[1].lower() == "as"
+            else None
+        )
+
+    def get_instructions(self, instruction):
+        """
+        :param instruction: str, e.g. "RUN"
+        :return: tuple of instruction dictionaries
+        """
+        return self.instructions.get(instruction, ())
+
+    def __repr__(self):
+        return f"DockerfileStage({self.index}, {self.baseimage!r}, name={self.name!r})"
+
+
+class DockerfileModel:
+    """
+    Immutable, parsed-once representation of the Dockerfile.
+
+    Instructions are dictionaries in the format of DockerfileParser.structure
+    (instruction, startline, endline, content, value), wrapped as read-only mappings.
+    """
+
+    def __init__(self, structure, labels, parent_images, baseimage):
+        self.structure = tuple(MappingProxyType(dict(i)) for i in structure)
+        self.instructions = _index_instructions(self.structure)
+        self.labels = MappingProxyType(dict(labels))
+        self.parent_images = tuple(parent_images)
+        self.baseimage = baseimage
+        self.stages = self._split_stages(self.structure)
+
+    @classmethod
+    def from_parser(cls, parser):
+        """
+        Parse the Dockerfile once.
+
+        :param parser: DockerfileParser instance
+        :return: DockerfileModel
+        """
+        return cls(
+            structure=parser.structure,
+            labels=parser.labels,
+            parent_images=parser.parent_images,
+            baseimage=parser.baseimage,
+        )
+
+    @staticmethod
+    def _split_stages(structure):
+        stages = []
+        current = []
+        for instruction in structure:
+            if instruction["instruction"] == "FROM" and current:
+                stages.append(current)
+                current = []
+            if instruction["instruction"] == "FROM" or current:
+                current.append(instruction)
+        if current:
+            stages.append(current)
+        return tuple(DockerfileStage(i, tuple(s)) for i, s in enumerate(stages))
+
+    def get_instructions(self, instruction):
+        """
+        Get all the occurrences of the instruction (in all the stages).
+
+        :param instruction: str, e.g. "RUN"
+        :return: tuple of instruction dictionaries
+        """
+        return self.instructions.get(instruction, ())
+
+    @property
+    def final_stage(self):
+        """the stage the resulting image is built from (None without FROM)"""
+        return self.stages[-1] if self.stages else None
@@ -0,0 +1,187 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Evaluate all the label checks of a ruleset in one pass over the labels.
+
+The label checks (LabelAbstractCheck, DeprecatedLabelAbstractCheck and
+DockerfileLabelAbstractCheck not overriding the check method) are compiled
+into an inverted index (label name -> rules) with precompiled patterns.
+The results are the same as the ones of the check methods.
+"""
+
+import logging
+import re
+import threading
+import traceback
+
+from .checks.dockerfile import DockerfileLabelAbstractCheck
+from .checks.labels import DeprecatedLabelAbstractCheck, LabelAbstractCheck
+from .result import CheckResult, FailedCheckResult
+
+logger = logging.getLogger(__name__)
+
+
+class _LabelRule:
+    """check_label of one check with the precompiled pattern"""
+
+    def __init__(self, check, labels):
+        self.check = check
+        self.labels = set(labels)
+        self.required = check.required
+        self.pattern = (
+            check.get_pattern(check.value_regex) if check.value_regex else None
+        )
+
+    def evaluate(self, present_labels, target_labels):
+        if not present_labels:
+            return not self.required
+        if self.required and not self.pattern:
+            return True
+        elif self.pattern:
+            return all(
+                bool(self.pattern.search(target_labels[label]))
+                for label in present_labels
+            )
+        else:
+            return False
+
+
+class _DeprecatedLabelRule:
+    def __init__(self, check):
+        self.check = check
+        self.labels = {check.old_label}
+
+    def evaluate(self, present_labels, target_labels):
+        old_present = bool(present_labels)
+        return (not old_present) or (self.check.new_label in target_labels)
+
+
+def _compile_rule(check):
+    """
+    :return: rule or None if the check has to be run as usual
+    """
+    check_class = type(check)
+    try:
+        if isinstance(check, LabelAbstractCheck):
+            if check_class.check is LabelAbstractCheck.check:
+                return _LabelRule(check, check.labels)
+        elif isinstance(check, DeprecatedLabelAbstractCheck):
+            if check_class.check is DeprecatedLabelAbstractCheck.check:
+                return _DeprecatedLabelRule(check)
+        elif isinstance(check, DockerfileLabelAbstractCheck):
+            if check_class.check is DockerfileLabelAbstractCheck.check:
+                return _LabelRule(check, check.label)
+    except (re.error, TypeError) as ex:
+        # the check method reports the problem as an error of the check
+        logger.debug("Cannot compile the label check %s: %r", check.name, ex)
+    return None
+
+
+class LabelEvaluator:
+    """
+    All the label checks of the ruleset evaluated at once.
+
+    The evaluator is immutable and can be shared by the runs on more targets.
+    """
+
+    def __init__(self, checks):
+        """
+        :param checks: list of check instances (the other checks are ignored)
+        """
+        self._rules = {}
+        self._index = {}
+        for check in checks:
+            rule = _compile_rule(check)
+            if rule is None:
+                continue
+            self._rules[id(check)] = rule
+            for label in rule.labels:
+                self._index.setdefault(label, []).append(rule)
+
+    def __contains__(self, check):
+        return id(check) in self._rules
+
+    def __len__(self):
+        return len(self._rules)
+
+    def evaluate(self, target_labels):
+        """
+        Evaluate all the rules.
+
+        :param target_labels: dict (or None) with the labels of the target
+        :return: dict (id of the check -> CheckResult)
+        """
+        present = {}
+        if target_labels is not None:
+            for label in target_labels:
+                for rule in self._index.get(label, ()):
+                    present.setdefault(id(rule), []).append(label)
+
+        results = {}
+        for check_id, rule in self._rules.items():
+            check = rule.check
+            try:
+                passed = rule.evaluate(present.get(id(rule)), target_labels)
+            except Exception as ex:
+                tb = traceback.format_exc()
+                logger.warning("There was an error while performing check: %s", tb)
+                results[check_id] = FailedCheckResult(check, logs=[str(ex)])
+                continue
+            results[check_id] = CheckResult(
+                ok=passed,
+                description=check.description,
+                message=check.message,
+                reference_url=check.reference_url,
+                check_name=check.name,
+                logs=[],
+            )
+        return results
+
+    def for_target(self):
+        """
+        :return: LabelResults for one run of the checks
+        """
+        return LabelResults(self)
+
+
+class LabelResults:
+    """
+    Results of the label checks for one target.
+
+    The labels of the target are read (and walked) once, when the first
+    result is requested.
+    """
+
+    def __init__(self, evaluator):
+        self.evaluator = evaluator
+        self._lock = threading.Lock()
+        self._results = None
+
+    def __contains__(self, check):
+        return check in self.evaluator
+
+    def get_result(self, check, target):
+        """
+        Get the result of the label check (all of them are evaluated on the first call).
+
+        :param check: check instance (has to be in the evaluator)
+        :param target: Target instance
+        :return: CheckResult
+        """
+        with self._lock:
+            if self._results is None:
+                logger.debug("Evaluating %d label checks at once.", len(self.evaluator))
+                self._results = self.evaluator.evaluate(target.labels)
+        return self._results[id(check)]
@@ -20,11 +20,17 @@ loads AbstractCheck classes from it.
 import inspect
 import logging
 import os
+import threading
 from importlib import import_module
 from importlib.util import module_from_spec
 from importlib.util import spec_from_file_location
 
-from ..core.checks.fmf_check import receive_fmf_metadata, FMFAbstractCheck
+from ..core.checks.fmf_check import (
+    CheckMetadata,
+    FMFAbstractCheck,
+    get_fmf_metadata_cache,
+    receive_fmf_metadata,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -62,16 +68,32 @@ def should_we_load(kls):
     return any(m.__name__ == "AbstractCheck" for m in mro)
 
 
-def load_check_classes_from_file(path):
+def load_check_classes_from_file(path, metadata=None):
+    """
+    :param path: str, path to the python file
+    :param metadata: dict (class name -> {"name": .., "data": ..}), FMF metadata
+                     of the classes known in advance (e.g. from the compiled cache)
+    :return: list of classes
+    """
     logger.debug("Getting check(s) from the file '%s'.", path)
     m = _load_module(path)
 
     check_classes = []
+    fmf_index = None
     for _, obj in inspect.getmembers(m, inspect.isclass):
         if should_we_load(obj):
             if issubclass(obj, FMFAbstractCheck):
+                if metadata and obj.__name__ in metadata:
+                    obj.metadata = CheckMetadata(**metadata[obj.__name__])
+                    check_classes.append(obj)
+                    continue
+                if fmf_index is None:
+                    # one parsed FMF tree for all the classes in the file
+                    fmf_index = get_fmf_metadata_cache().get_index(
+                        os.path.dirname(path)
+                    )
                 node_metadata = receive_fmf_metadata(
-                    name=obj.name, path=os.path.dirname(path)
+                    name=obj.name, path=os.path.dirname(path), fmf_index=fmf_index
                 )
                 obj.metadata = node_metadata
             check_classes.append(obj)
@@ -82,14 +104,98 @@ def load_check_classes_from_file(path):
     return check_classes
 
 
+def _file_key(path):
+    """
+    Identify the version of the check file: the file itself and
+    the FMF metadata in its directory (they are attached to the classes).
+    """
+    st = os.stat(path)
+    fmf_files = []
+    directory = os.path.dirname(path)
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".fmf"):
+            fmf_st = os.stat(os.path.join(directory, name))
+            fmf_files.append((name, fmf_st.st_mtime_ns, fmf_st.st_size))
+    return st.st_mtime_ns, st.st_size, tuple(fmf_files)
+
+
+class CheckRegistry:
+    """
+    Process-wide, thread-safe cache of the check classes loaded from the files.
+
+    The entries are keyed by path and modification time, so changed files
+    are loaded again; use invalidate to drop entries explicitly.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._files = {}
+
+    def get_check_classes(self, path, metadata=None):
+        """
+        Get the check classes defined in the file (loaded only once).
+
+        :param path: str, path to the python file
+        :param metadata: dict, FMF metadata of the classes known in advance
+                         (see load_check_classes_from_file)
+        :return: list of classes
+        """
+        path = os.path.abspath(path)
+        key = _file_key(path)
+        with self._lock:
+            cached = self._files.get(path)
+            if cached is not None and cached[0] == key:
+                logger.debug("Check classes from '%s' found in the registry.", path)
+                return list(cached[1])
+            check_classes = load_check_classes_from_file(path, metadata=metadata)
+            self._files[path] = (key, check_classes)
+            return list(check_classes)
+
+    def invalidate(self, path=None):
+        """
+        Forget the loaded classes.
+
+        :param path: str, file or directory to invalidate; everything if None
+        """
+        with self._lock:
+            if path is None:
+                self._files.clear()
+                return
+            path = os.path.abspath(path)
+            for p in list(self._files):
+                if p == path or p.startswith(path.rstrip(os.sep) + os.sep):
+                    del self._files[p]
+
+
+_CHECK_REGISTRY = CheckRegistry()
+
+
+def get_check_registry():
+    """the process-wide CheckRegistry"""
+    return _CHECK_REGISTRY
+
+
+def invalidate_check_registry(path=None):
+    """
+    Drop the cached check classes and FMF metadata
+    (all of them or the ones under the path).
+
+    :param path: str, file or directory; None means everything
+    """
+    _CHECK_REGISTRY.invalidate(path)
+    get_fmf_metadata_cache().invalidate(path)
+
+
 class CheckLoader:
     """
     find recursively all checks on a given path
     """
 
-    def __init__(self, checks_paths):
+    def __init__(self, checks_paths, compiled_cache=None):
         """
         :param checks_paths: list of str, directories where the checks are present
+        :param compiled_cache: CompiledCache instance to load the index of the checks from;
+                               all the checks are loaded to find one if None
         """
         logger.debug("Will load checks from paths '%s'.", checks_paths)
         for p in checks_paths:
@@ -97,7 +203,10 @@ class CheckLoader:
                 raise RuntimeError(f"Provided path {p} is not a directory.")
         self._check_classes = None
         self._mapping = None
+        self._class_paths = {}
+        self._index = None
         self.paths = checks_paths
+        self.compiled_cache = compiled_cache
 
     def obtain_check_classes(self):
         """find children of AbstractCheck class and return them as a list"""
@@ -107,12 +216,61 @@ class CheckLoader:
                 for fi in files:
                     if not fi.endswith(".py"):
                         continue
-                    path = os.path.join(root, fi)
-                    check_classes = check_classes.union(
-                        set(load_check_classes_from_file(path))
-                    )
+                    path = os.path.abspath(os.path.join(root, fi))
+                    classes = get_check_registry().get_check_classes(path)
+                    for check_class in classes:
+                        self._class_paths[check_class] = path
+                    check_classes = check_classes.union(set(classes))
         return list(check_classes)
 
+    def _build_index(self):
+        files = {}
+        checks = {}
+        for check_class in self.mapping.values():
+            path = self._class_paths[check_class]
+            metadata = None
+            if issubclass(check_class, FMFAbstractCheck) and check_class.metadata:
+                metadata = {
+                    "name": check_class.metadata.name,
+                    "data": check_class.metadata.data,
+                }
+            files.setdefault(path, {})[check_class.__name__] = metadata
+            checks[check_class.name] = [path, check_class.__name__]
+        return {"files": files, "checks": checks}
+
+    @property
+    def index(self):
+        """index of the checks from the compiled cache (see CompiledCache.get_check_index)"""
+        if self._index is None:
+            self._index = self.compiled_cache.get_check_index(
+                self.paths, build=self._build_index
+            )
+        return self._index
+
+    def get_check_class(self, name):
+        """
+        Get the check class by the name of the check.
+
+        With the compiled cache, only the file defining the check is loaded.
+
+        :param name: str, name of the check
+        :return: the class
+        :raises KeyError: the check does not exist
+        """
+        if self._mapping is None and self.compiled_cache is not None:
+            entry = self.index["checks"].get(name)
+            if entry is None:
+                raise KeyError(name)
+            path, class_name = entry
+            metadata = {k: v for k, v in self.index["files"].get(path, {}).items() if v}
+            for check_class in get_check_registry().get_check_classes(
+                path, metadata=metadata
+            ):
+                if check_class.__name__ == class_name and check_class.name == name:
+                    return check_class
+            logger.debug("Check %s not found in the compiled index.", name)
+        return self.mapping[name]
+
     def import_class(self, import_name):
         """
         import selected class
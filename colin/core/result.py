@@ -13,15 +13,20 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import io
 import json
-from xml.etree.ElementTree import Element, SubElement, tostring
-from xml.dom import minidom
+from types import SimpleNamespace
 
 from .constant import COLOURS, ERROR, FAILED, OUTPUT_CHARS, PASSED
+from .result_writers import XunitWriter
 from ..utils.caching_iterable import CachingIterable
+from ..utils.metrics import CheckMetrics
 
 
 class CheckResult:
+    # CheckMetrics of the run of the check (None for the results from the cache)
+    metrics = None
+
     def __init__(self, ok, description, message, reference_url, check_name, logs):
         self.ok = ok
         self.description = description
@@ -37,6 +42,53 @@ class CheckResult:
     def __str__(self):
         return f"{self.status}:{self.message}"
 
+    def to_dict(self):
+        """
+        Get the dictionary representation (from_dict creates the result back).
+
+        :return: dict
+        """
+        return {
+            "ok": self.ok,
+            "description": self.description,
+            "message": self.message,
+            "reference_url": self.reference_url,
+            "check_name": self.check_name,
+            "logs": list(self.logs),
+        }
+
+    def to_json_dict(self):
+        """
+        Get the representation used in the json outputs.
+
+        :return: dict
+        """
+        return {
+            "name": self.check_name,
+            "ok": self.ok,
+            "status": self.status,
+            "description": self.description,
+            "message": self.message,
+            "reference_url": self.reference_url,
+            "logs": self.logs,
+            "metrics": self.metrics.to_dict() if self.metrics else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        :param data: dict created by to_dict
+        :return: CheckResult
+        """
+        return cls(
+            ok=data["ok"],
+            description=data["description"],
+            message=data["message"],
+            reference_url=data["reference_url"],
+            check_name=data["check_name"],
+            logs=list(data["logs"]),
+        )
+
 
 class DockerfileCheckResult(CheckResult):
     def __init__(
@@ -55,8 +107,31 @@ class DockerfileCheckResult(CheckResult):
 
 
 class CheckResults:
-    def __init__(self, results):
-        self.results = CachingIterable(results)
+    def __init__(self, results, phases=None):
+        """
+        :param results: iterable of CheckResult
+        :param phases: RunPhases instance filled while the checks are running
+        """
+        self.phases = phases
+        self._listeners = []
+        self.results = CachingIterable(self._notify(results))
+
+    def _notify(self, results):
+        for r in results:
+            for listener in self._listeners:
+                listener(r)
+            yield r
+
+    def add_listener(self, listener):
+        """
+        Call the function with every result as soon as it is available
+        (i.e. while the results are iterated for the first time).
+
+        :param listener: function accepting CheckResult
+        """
+        for r in self.results.vals:
+            listener(r)
+        self._listeners.append(listener)
 
     @property
     def results_per_check(self):
@@ -69,19 +144,17 @@ class CheckResults:
 
         :return: dict (str -> dict (str -> str))
         """
-        result_list = [
-            {
-                "name": r.check_name,
-                "ok": r.ok,
-                "status": r.status,
-                "description": r.description,
-                "message": r.message,
-                "reference_url": r.reference_url,
-                "logs": r.logs,
-            }
-            for r in self.results
-        ]
-        return {"checks": result_list}
+        result_list = [r.to_json_dict() for r in self.results]
+        return {"checks": result_list, "phases": self.phases_dict}
+
+    @property
+    def phases_dict(self):
+        """
+        Get the time spent in the phases of the run (available after the run).
+
+        :return: dict (str -> float, seconds)
+        """
+        return self.phases.to_dict() if self.phases else {}
 
     @property
     def json(self):
@@ -103,38 +176,9 @@ class CheckResults:
         :return: str
         """
 
-        top = Element("testsuites")
-
-        testsuite = SubElement(top, "testsuite")
-
-        for r in self.results:
-            testcase = SubElement(
-                testsuite,
-                "testcase",
-                {
-                    "name": r.check_name,
-                    # Can't use PASSED or FAILED global variables because their values are PASS
-                    # and FAIL respectively and xunit wants them suffixed with -ED.
-                    "status": "PASSED" if r.ok else "FAILED",
-                    "url": r.reference_url,
-                },
-            )
-            if r.logs:
-                logs = SubElement(testcase, "logs")
-                for log in r.logs:
-                    log = SubElement(
-                        logs,
-                        "log",
-                        {
-                            "message": log,
-                            "result": "INFO",
-                            "waiver_authorization": "Not Waivable",
-                        },
-                    )
-
-        rough_string = tostring(top, "utf-8")
-        reparsed = minidom.parseString(rough_string)
-        return reparsed.toprettyxml(indent="  ")
+        output = io.StringIO()
+        self.save_xunit_to_file(output)
+        return output.getvalue()
 
     def save_xunit_to_file(self, file):
         """
@@ -142,7 +186,8 @@ class CheckResults:
         :param file: the file to which to write
         :return: return code of the write command
         """
-        file.write(self.xunit)
+        with XunitWriter(file) as writer:
+            writer.add_testsuite(self.results)
 
     @property
     def statistics(self):
@@ -213,6 +258,36 @@ class CheckResults:
                 output_function(f"{status}:{count} ", nl=False)
             output_function("")
 
+        if stat and has_check:
+            self._generate_timing_output(output_function)
+
+    def _generate_timing_output(self, output_function, slowest=5):
+        """
+        :param output_function: function to send output to
+        :param slowest: int, number of the slowest checks to show
+        """
+        phases = self.phases_dict
+        if phases:
+            output_function(
+                "phases: " + ", ".join(f"{name} {s:.3f}s" for name, s in phases.items())
+            )
+        measured = sorted(
+            (r for r in self.results if r.metrics),
+            key=lambda r: r.metrics.wall_time,
+            reverse=True,
+        )
+        if measured:
+            output_function(
+                "slowest checks: "
+                + ", ".join(
+                    f"{r.check_name} {r.metrics.wall_time:.3f}s "
+                    f"(cpu {r.metrics.cpu_time:.3f}s, "
+                    f"{r.metrics.tool_calls} tool calls, "
+                    f"{r.metrics.bytes_read} B read)"
+                    for r in measured[:slowest]
+                )
+            )
+
     def get_pretty_string(self, stat, verbose):
         """
         Pretty string representation of the results
@@ -228,6 +303,52 @@ class CheckResults:
         return pretty_output.result
 
 
+class TargetResults:
+    """Results of one target checked by colin.core.colin.run_many."""
+
+    def __init__(self, target, results=None, error=None, duplicate_of=None):
+        """
+        :param target: str, the target as it was given
+        :param results: CheckResults instance (None if the target cannot be checked)
+        :param error: Exception, why the target cannot be checked
+        :param duplicate_of: str, the target with the same content
+                             (the results are shared)
+        """
+        self.target = target
+        self.results = results
+        self.error = error
+        self.duplicate_of = duplicate_of
+
+    @property
+    def ok(self):
+        return self.error is None and self.results.ok
+
+    @property
+    def fail(self):
+        return self.error is None and self.results.fail
+
+    @staticmethod
+    def json_of_all(target_results):
+        """
+        :param target_results: list of TargetResults
+        :return: dict
+        """
+        return {
+            "targets": [
+                {
+                    "target": t.target,
+                    "error": str(t.error) if t.error is not None else None,
+                    "duplicate_of": t.duplicate_of,
+                    "checks": t.results._dict_of_results["checks"]
+                    if t.results is not None
+                    else [],
+                    "phases": t.results.phases_dict if t.results is not None else {},
+                }
+                for t in target_results
+            ]
+        }
+
+
 class FailedCheckResult(CheckResult):
     def __init__(self, check, logs=None):
         super().__init__(
@@ -244,11 +365,41 @@ class FailedCheckResult(CheckResult):
         return ERROR
 
 
+def result_from_json_dict(data):
+    """
+    Create the result back from its json representation (see CheckResult.to_json_dict).
+
+    :param data: dict
+    :return: CheckResult (FailedCheckResult for the errors)
+    """
+    if data["status"] == ERROR:
+        check = SimpleNamespace(
+            name=data["name"],
+            message=data["message"],
+            description=data["description"],
+            reference_url=data["reference_url"],
+        )
+        result = FailedCheckResult(check, logs=list(data["logs"]))
+    else:
+        result = CheckResult(
+            ok=data["ok"],
+            description=data["description"],
+            message=data["message"],
+            reference_url=data["reference_url"],
+            check_name=data["name"],
+            logs=list(data["logs"]),
+        )
+    if data.get("metrics"):
+        result.metrics = CheckMetrics.from_dict(data["metrics"])
+    return result
+
+
 class _PrettyOutputToStr:
     def __init__(self):
         self.result = ""
 
-    def save_output(self, text=None, nl=True):
+    def save_output(self, text=None, nl=True, **_):
+        # styling (fg, ...) is ignored
         text = text or ""
         self.result += text
         if nl:
@@ -0,0 +1,179 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Persistent cache of the check results.
+
+The results are stored per target identity (image ID, oci manifest digest,
+hash of the Dockerfile; see Target.identity) and keyed by the fingerprint
+of the check: source of the check class (and its predecessors) and the
+resolved attributes of the check instance. When the definition of the check
+changes, the fingerprint changes and the check is run again.
+
+Errors are not cached.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from tempfile import NamedTemporaryFile
+
+from .result import CheckResult
+from ..utils.cache import get_cache_dir
+from ..version import __version__
+
+logger = logging.getLogger(__name__)
+
+_SOURCE_HASHES = {}
+_SOURCE_HASHES_LOCK = threading.Lock()
+
+
+def _source_hash(path):
+    st = os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size)
+    with _SOURCE_HASHES_LOCK:
+        if key not in _SOURCE_HASHES:
+            with open(path, "rb") as fd:
+                _SOURCE_HASHES[key] = hashlib.sha256(fd.read()).hexdigest()
+        return _SOURCE_HASHES[key]
+
+
+def _class_source_files(check_class):
+    """files defining the class and its predecessors (found via their functions)"""
+    paths = []
+    for cls in check_class.__mro__:
+        for value in vars(cls).values():
+            code = getattr(value, "__code__", None) or getattr(
+                getattr(value, "fget", None), "__code__", None
+            )
+            if code is not None and os.path.isfile(code.co_filename):
+                if code.co_filename not in paths:
+                    paths.append(code.co_filename)
+                break
+    return paths
+
+
+def check_fingerprint(check):
+    """
+    Fingerprint of the check: its code and the resolved attributes.
+
+    :param check: check instance
+    :return: str
+    """
+    digest = hashlib.sha256(__version__.encode())
+    check_class = type(check)
+    digest.update(f"{check_class.__module__}.{check_class.__qualname__}".encode())
+    for path in _class_source_files(check_class):
+        digest.update(_source_hash(path).encode())
+    attributes = {k: v for k, v in vars(check).items() if not k.startswith("_")}
+    digest.update(json.dumps(attributes, sort_keys=True, default=repr).encode())
+    return digest.hexdigest()
+
+
+class CachedTargetResults:
+    """Cached results of one target (loaded once, saved at the end of the run)."""
+
+    def __init__(self, path, entries):
+        self.path = path
+        self._entries = entries
+        self._new = {}
+        self._lock = threading.Lock()
+
+    def get(self, fingerprint):
+        """
+        :param fingerprint: str, see check_fingerprint
+        :return: CheckResult or None
+        """
+        entry = self._entries.get(fingerprint)
+        if entry is None:
+            return None
+        try:
+            return CheckResult.from_dict(entry)
+        except (KeyError, TypeError):
+            return None
+
+    def add(self, fingerprint, result):
+        """
+        Remember the result (errors and special result classes are not cached).
+
+        :param fingerprint: str, see check_fingerprint
+        :param result: CheckResult
+        """
+        if type(result) is not CheckResult:
+            return
+        with self._lock:
+            self._new[fingerprint] = result.to_dict()
+
+    def save(self):
+        with self._lock:
+            if not self._new:
+                return
+            names = {r["check_name"] for r in self._new.values()}
+            # results of the older definitions of the same checks are obsolete
+            entries = {
+                fp: r
+                for fp, r in self._entries.items()
+                if r.get("check_name") not in names
+            }
+            entries.update(self._new)
+            self._new = {}
+        directory = os.path.dirname(self.path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with NamedTemporaryFile(
+                "w", dir=directory, prefix="tmp-", suffix=".json", delete=False
+            ) as fd:
+                json.dump(entries, fd)
+            os.replace(fd.name, self.path)
+        except OSError as ex:
+            logger.warning("Cannot save the results to the cache: %r", ex)
+            return
+        self._entries = entries
+
+
+class ResultCache:
+    def __init__(self, path=None):
+        """
+        :param path: str, cache directory (default is ~/.cache/colin/results)
+        """
+        self.path = path or get_cache_dir("results")
+
+    def _target_path(self, identity):
+        key = hashlib.sha256(identity.encode()).hexdigest()
+        return os.path.join(self.path, key[:2], key + ".json")
+
+    def for_target(self, target):
+        """
+        Get the cached results of the target.
+
+        :param target: Target instance
+        :return: CachedTargetResults or None if the target cannot be identified
+        """
+        try:
+            identity = target.identity
+        except Exception as ex:
+            logger.debug("Cannot identify the target: %r", ex)
+            return None
+        if identity is None:
+            return None
+        path = self._target_path(identity)
+        try:
+            with open(path) as fd:
+                entries = json.load(fd)
+        except (OSError, ValueError):
+            entries = {}
+        logger.debug("%d cached results for %s.", len(entries), identity)
+        return CachedTargetResults(path, entries)
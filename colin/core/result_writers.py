@@ -0,0 +1,185 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Streaming writers of the results.
+
+Every result is written (and flushed) as soon as it is available,
+so the consumers can react on failures before the whole run is finished
+and nothing has to be kept in memory.
+"""
+
+import json
+import threading
+
+
+def _quote_attribute(value):
+    value = str(value)
+    for char, entity in (("&", "&amp;"), ("<", "&lt;"), ('"', "&quot;"), (">", "&gt;")):
+        value = value.replace(char, entity)
+    return f'"{value}"'
+
+
+def _attributes(attributes):
+    return "".join(f" {k}={_quote_attribute(v)}" for k, v in attributes)
+
+
+class JsonLinesWriter:
+    """One json document (same as in the json output) per result."""
+
+    def __init__(self, file):
+        """
+        :param file: file object to write to
+        """
+        self.file = file
+        self._lock = threading.Lock()
+
+    def _write(self, record):
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def add(self, result, target=None):
+        """
+        :param result: CheckResult
+        :param target: str, the target of the result (when checking more targets)
+        """
+        record = result.to_json_dict()
+        if target is not None:
+            record = dict(target=target, **record)
+        self._write(record)
+
+    def add_phases(self, phases, target=None):
+        """
+        Record the time spent in the phases of the run (written after the results).
+
+        :param phases: dict (str -> float), see CheckResults.phases_dict
+        :param target: str, the target of the run (when checking more targets)
+        """
+        record = {"phases": phases}
+        if target is not None:
+            record = dict(target=target, **record)
+        self._write(record)
+
+    def add_error(self, target, error):
+        """
+        Record the target which cannot be checked.
+
+        :param target: str
+        :param error: Exception
+        """
+        self._write({"target": target, "error": str(error)})
+
+
+class XunitWriter:
+    """
+    Xunit output written one testcase at a time.
+
+    The output is the same as the one of the former ElementTree
+    serialization pretty-printed by minidom.
+    """
+
+    def __init__(self, file):
+        """
+        :param file: file object to write to
+        """
+        self.file = file
+        self._started = False
+        self._closed = False
+        self._testsuite = None
+        self._testsuite_empty = True
+
+    def _write(self, text):
+        self.file.write(text)
+        self.file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def start_testsuite(self, name=None):
+        """
+        :param name: str, name of the testsuite (e.g. the target)
+        """
+        if not self._started:
+            self._write('<?xml version="1.0" ?>\n<testsuites>\n')
+            self._started = True
+        self._testsuite = _attributes([("name", name)] if name else [])
+        self._testsuite_empty = True
+
+    def add(self, result):
+        """
+        Write the testcase of the result into the current testsuite.
+
+        :param result: CheckResult
+        """
+        lines = []
+        if self._testsuite_empty:
+            lines.append(f"  <testsuite{self._testsuite}>\n")
+            self._testsuite_empty = False
+        testcase = _attributes(
+            [
+                ("name", result.check_name),
+                # Can't use PASSED or FAILED global variables because their values are PASS
+                # and FAIL respectively and xunit wants them suffixed with -ED.
+                ("status", "PASSED" if result.ok else "FAILED"),
+                ("url", result.reference_url),
+            ]
+        )
+        if result.logs:
+            lines.append(f"    <testcase{testcase}>\n      <logs>\n")
+            for log in result.logs:
+                log_attributes = _attributes(
+                    [
+                        ("message", log),
+                        ("result", "INFO"),
+                        ("waiver_authorization", "Not Waivable"),
+                    ]
+                )
+                lines.append(f"        <log{log_attributes}/>\n")
+            lines.append("      </logs>\n    </testcase>\n")
+        else:
+            lines.append(f"    <testcase{testcase}/>\n")
+        self._write("".join(lines))
+
+    def end_testsuite(self):
+        if self._testsuite_empty:
+            self._write(f"  <testsuite{self._testsuite}/>\n")
+        else:
+            self._write("  </testsuite>\n")
+        self._testsuite = None
+
+    def add_testsuite(self, results, name=None):
+        """
+        :param results: iterable of CheckResult
+        :param name: str, name of the testsuite (e.g. the target)
+        """
+        self.start_testsuite(name=name)
+        for result in results:
+            self.add(result)
+        self.end_testsuite()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._testsuite is not None:
+            self.end_testsuite()
+        if self._started:
+            self._write("</testsuites>\n")
+        else:
+            self._write('<?xml version="1.0" ?>\n<testsuites/>\n')
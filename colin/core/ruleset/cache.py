@@ -0,0 +1,123 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Compiled cache of the rulesets and the check metadata stored on disk.
+
+The entries are keyed by the content hashes of the inputs:
+- parsed ruleset files (keyed by the content of the ruleset),
+- index of the checks: check name -> python file, class and merged FMF metadata
+  (keyed by the content of all the .py and .fmf files in the checks directories).
+
+A warm invocation therefore skips parsing of YAML and FMF files
+and imports only the modules of the checks in use.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from tempfile import NamedTemporaryFile
+
+from ...utils.cache import get_cache_dir
+
+logger = logging.getLogger(__name__)
+
+# bump when the format of the cached data changes
+CACHE_FORMAT_VERSION = "1"
+
+
+def _hash_checks_paths(checks_paths):
+    digest = hashlib.sha256(CACHE_FORMAT_VERSION.encode())
+    for checks_path in checks_paths:
+        for root, dirs, files in os.walk(checks_path):
+            dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+            for name in sorted(files):
+                if not (name.endswith((".py", ".fmf")) or name == "version"):
+                    continue
+                path = os.path.abspath(os.path.join(root, name))
+                digest.update(path.encode() + b"\0")
+                with open(path, "rb") as fd:
+                    digest.update(hashlib.sha256(fd.read()).digest())
+    return digest.hexdigest()
+
+
+class CompiledCache:
+    def __init__(self, path=None):
+        """
+        :param path: str, cache directory (default is ~/.cache/colin/compiled)
+        """
+        self.path = path or get_cache_dir("compiled")
+
+    def _read(self, kind, key):
+        try:
+            with open(os.path.join(self.path, kind, key + ".json")) as fd:
+                return json.load(fd)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, kind, key, data):
+        directory = os.path.join(self.path, kind)
+        try:
+            payload = json.dumps(data)
+            os.makedirs(directory, exist_ok=True)
+            with NamedTemporaryFile(
+                "w", dir=directory, prefix="tmp-", suffix=".json", delete=False
+            ) as fd:
+                fd.write(payload)
+            os.replace(fd.name, os.path.join(directory, key + ".json"))
+        except (OSError, TypeError, ValueError) as ex:
+            logger.debug("Cannot store %s %s in the cache: %r", kind, key, ex)
+
+    def get_ruleset(self, content, parse):
+        """
+        Get the parsed ruleset.
+
+        :param content: str, content of the ruleset file
+        :param parse: function parsing the content, called on a cache miss
+        :return: dict
+        """
+        key = hashlib.sha256(
+            (CACHE_FORMAT_VERSION + "\0" + content).encode()
+        ).hexdigest()
+        ruleset = self._read("rulesets", key)
+        if ruleset is not None:
+            logger.debug("Ruleset found in the compiled cache.")
+            return ruleset
+        ruleset = parse(content)
+        self._write("rulesets", key, ruleset)
+        return ruleset
+
+    def get_check_index(self, checks_paths, build):
+        """
+        Get the index of the checks.
+
+        {
+          "files": {"/path/to/labels.py": {"MaintainerLabelCheck": {"name": .., "data": ..}}},
+          "checks": {"maintainer_label": ["/path/to/labels.py", "MaintainerLabelCheck"]}
+        }
+
+        :param checks_paths: list of str, directories where the checks are present
+        :param build: function creating the index, called on a cache miss
+        :return: dict
+        """
+        key = _hash_checks_paths(checks_paths)
+        index = self._read("checks", key)
+        if index is not None:
+            logger.debug("Index of the checks found in the compiled cache.")
+            return index
+        index = build()
+        self._write("checks", key, index)
+        return index
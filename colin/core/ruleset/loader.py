@@ -24,20 +24,30 @@ from ..exceptions import ColinRulesetException
 logger = logging.getLogger(__name__)
 
 
-def get_ruleset_struct_from_fileobj(fileobj):
+def get_ruleset_struct_from_fileobj(fileobj, compiled_cache=None):
+    """
+    :param fileobj: file object with the ruleset (YAML or JSON)
+    :param compiled_cache: CompiledCache instance to get the parsed ruleset from
+    :return: RulesetStruct
+    """
     try:
         logger.debug("Loading ruleset from file '%s'.", fileobj.name)
-        return RulesetStruct(yaml.safe_load(fileobj))
+        if compiled_cache is None:
+            return RulesetStruct(yaml.safe_load(fileobj))
+        content = fileobj.read()
+        if isinstance(content, bytes):
+            content = content.decode("utf-8")
+        return RulesetStruct(compiled_cache.get_ruleset(content, yaml.safe_load))
     except Exception as ex:
         msg = f"Ruleset file '{fileobj.name}' cannot be loaded: {ex}"
         logger.error(msg)
         raise ColinRulesetException(msg)
 
 
-def get_ruleset_struct_from_file(file_path):
+def get_ruleset_struct_from_file(file_path, compiled_cache=None):
     try:
         with open(file_path) as fd:
-            return get_ruleset_struct_from_fileobj(fd)
+            return get_ruleset_struct_from_fileobj(fd, compiled_cache=compiled_cache)
     except ColinRulesetException as ex:
         raise ex
     except Exception as ex:
@@ -0,0 +1,135 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+"""
+Locating the rulesets and the checks on disk.
+
+Kept free of heavy imports (YAML, FMF, ...) so the CLI can use it cheaply.
+"""
+
+import logging
+import os
+import sys
+
+from ..constant import EXTS, RULESET_DIRECTORY, RULESET_DIRECTORY_NAME
+from ..exceptions import ColinRulesetException
+
+logger = logging.getLogger(__name__)
+
+
+def get_checks_paths(checks_paths=None):
+    """
+    Get path to checks.
+
+    :param checks_paths: list of str, directories where the checks are present
+    :return: list of str (absolute path of directory with checks)
+    """
+    p = os.path.join(__file__, os.pardir, os.pardir, os.pardir, "checks")
+    p = os.path.abspath(p)
+    # let's utilize the default upstream checks always
+    if checks_paths:
+        p += [os.path.abspath(x) for x in checks_paths]
+    return [p]
+
+
+def get_ruleset_file(ruleset=None):
+    """
+    Get the ruleset file from name
+
+    :param ruleset: str
+    :return: str
+    """
+    ruleset = ruleset or "default"
+
+    ruleset_dirs = get_ruleset_dirs()
+    for ruleset_directory in ruleset_dirs:
+        possible_ruleset_files = [
+            os.path.join(ruleset_directory, ruleset + ext) for ext in EXTS
+        ]
+
+        for ruleset_file in possible_ruleset_files:
+            if os.path.isfile(ruleset_file):
+                logger.debug("Ruleset file '%s' found.", ruleset_file)
+                return ruleset_file
+
+    logger.warning(
+        "Ruleset with the name '%s' cannot be found at '%s'.", ruleset, ruleset_dirs
+    )
+    raise ColinRulesetException(f"Ruleset with the name '{ruleset}' cannot be found.")
+
+
+def get_ruleset_dirs():
+    """
+    Get the directory with ruleset files
+    First directory to check:  ./rulesets
+    Second directory to check:  $HOME/.local/share/colin/rulesets
+    Third directory to check: /usr/local/share/colin/rulesets
+    :return: str
+    """
+
+    ruleset_dirs = []
+
+    cwd_rulesets = os.path.join(".", RULESET_DIRECTORY_NAME)
+    if os.path.isdir(cwd_rulesets):
+        logger.debug(
+            "Ruleset directory found in current directory ('%s').", cwd_rulesets
+        )
+        ruleset_dirs.append(cwd_rulesets)
+
+    if "VIRTUAL_ENV" in os.environ:
+        venv_local_share = os.path.join(os.environ["VIRTUAL_ENV"], RULESET_DIRECTORY)
+        if os.path.isdir(venv_local_share):
+            logger.debug(
+                "Virtual env ruleset directory found ('%s').", venv_local_share
+            )
+            ruleset_dirs.append(venv_local_share)
+
+    local_share = os.path.join(os.path.expanduser("~"), ".local", RULESET_DIRECTORY)
+    if os.path.isdir(local_share):
+        logger.debug("Local ruleset directory found ('%s').", local_share)
+        ruleset_dirs.append(local_share)
+
+    usr_local_share = os.path.join("/usr/local", RULESET_DIRECTORY)
+    if os.path.isdir(usr_local_share):
+        logger.debug("Global ruleset directory found ('%s').", usr_local_share)
+        ruleset_dirs.append(usr_local_share)
+
+    if sys.prefix != "/usr/local":
+        global_share = os.path.join(sys.prefix, RULESET_DIRECTORY)
+        if os.path.isdir(global_share):
+            logger.debug("Global ruleset directory found ('%s').", global_share)
+            ruleset_dirs.append(global_share)
+
+    if not ruleset_dirs:
+        msg = "Ruleset directory cannot be found."
+        logger.warning(msg)
+        raise ColinRulesetException(msg)
+
+    return ruleset_dirs
+
+
+def get_rulesets():
+    """ "
+    Get available rulesets.
+    """
+    rulesets_dirs = get_ruleset_dirs()
+    ruleset_files = []
+    for rulesets_dir in rulesets_dirs:
+        for f in os.listdir(rulesets_dir):
+            for ext in EXTS:
+                file_path = os.path.join(rulesets_dir, f)
+                if os.path.isfile(file_path) and f.lower().endswith(ext):
+                    ruleset_files.append((f[: -len(ext)], file_path))
+    return ruleset_files
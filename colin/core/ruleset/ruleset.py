@@ -14,15 +14,21 @@
 #
 
 import logging
-import os
-import sys
+import threading
 
+from .cache import CompiledCache
 from .loader import (
     RulesetStruct,
     get_ruleset_struct_from_file,
     get_ruleset_struct_from_fileobj,
 )
-from ..constant import EXTS, RULESET_DIRECTORY, RULESET_DIRECTORY_NAME
+from .paths import (  # noqa: F401 (re-exported)
+    get_checks_paths,
+    get_ruleset_dirs,
+    get_ruleset_file,
+    get_rulesets,
+)
+from ..check_runner import CheckPlan
 from ..exceptions import ColinRulesetException
 from ..loader import CheckLoader
 from ..target import is_compatible
@@ -32,7 +38,12 @@ logger = logging.getLogger(__name__)
 
 class Ruleset:
     def __init__(
-        self, ruleset_name=None, ruleset_file=None, ruleset=None, checks_paths=None
+        self,
+        ruleset_name=None,
+        ruleset_file=None,
+        ruleset=None,
+        checks_paths=None,
+        compiled_cache=None,
     ):
         """
         Load ruleset for colin.
@@ -42,25 +53,60 @@ class Ruleset:
         :param ruleset_file: fileobj instance holding ruleset configuration
         :param ruleset: dict, content of a ruleset file
         :param checks_paths: list of str, directories where the checks are present
+        :param compiled_cache: CompiledCache instance, False to disable the cache
+                               (default is the one in ~/.cache/colin)
         """
-        self.check_loader = CheckLoader(get_checks_paths(checks_paths))
+        self._plans = {}
+        self._plans_lock = threading.Lock()
+        if compiled_cache is None:
+            compiled_cache = CompiledCache()
+        compiled_cache = compiled_cache or None
+        self.check_loader = CheckLoader(
+            get_checks_paths(checks_paths), compiled_cache=compiled_cache
+        )
         if ruleset:
             self.ruleset_struct = RulesetStruct(ruleset)
         elif ruleset_file:
-            self.ruleset_struct = get_ruleset_struct_from_fileobj(ruleset_file)
+            self.ruleset_struct = get_ruleset_struct_from_fileobj(
+                ruleset_file, compiled_cache=compiled_cache
+            )
         else:
             logger.debug("Loading ruleset with the name '%s'.", ruleset_name)
             ruleset_path = get_ruleset_file(ruleset=ruleset_name)
-            self.ruleset_struct = get_ruleset_struct_from_file(ruleset_path)
+            self.ruleset_struct = get_ruleset_struct_from_file(
+                ruleset_path, compiled_cache=compiled_cache
+            )
         if self.ruleset_struct.version not in ["1", 1]:
             raise ColinRulesetException(
                 "colin accepts only ruleset version '1'. You provided %r"
                 % self.ruleset_struct.version
             )
 
+    def compile(self, target_type, tags=None, skips=None):
+        """
+        Get the plan of the checks for given type/tags/skips.
+
+        The plan is built once per arguments and reused by the next calls
+        (e.g. when checking many targets with the same ruleset).
+
+        :param target_type: TargetType class
+        :param tags: list of str
+        :param skips: list of str
+        :return: CheckPlan instance
+        """
+        key = (target_type, frozenset(tags) if tags else None, frozenset(skips or ()))
+        with self._plans_lock:
+            plan = self._plans.get(key)
+            if plan is None:
+                plan = CheckPlan(
+                    self.get_checks(target_type=target_type, tags=tags, skips=skips)
+                )
+                self._plans[key] = plan
+            return plan
+
     def get_checks(self, target_type, tags=None, skips=None):
         """
-        Get all checks for given type/tags.
+        Get all checks for given type/tags (new instances on each call).
 
         :param skips: list of str
         :param target_type: TargetType class
@@ -89,7 +135,7 @@ class Ruleset:
                 check_class = self.check_loader.import_class(check_struct.import_name)
             else:
                 try:
-                    check_class = self.check_loader.mapping[check_struct.name]
+                    check_class = self.check_loader.get_check_class(check_struct.name)
                 except KeyError:
                     logger.error(
                         "Check %s was not found -- it can't be loaded",
@@ -136,114 +182,9 @@ class Ruleset:
             for k, v in check_struct.other_attributes.items():
                 # yes, this overrides things; yes, users may easily and severely broke their setup
                 setattr(check_instance, k, v)
+            check_instance.prepare()
 
             result.append(check_instance)
             logger.debug("Check instance %s added.", check_instance.name)
 
         return result
-
-
-def get_checks_paths(checks_paths=None):
-    """
-    Get path to checks.
-
-    :param checks_paths: list of str, directories where the checks are present
-    :return: list of str (absolute path of directory with checks)
-    """
-    p = os.path.join(__file__, os.pardir, os.pardir, os.pardir, "checks")
-    p = os.path.abspath(p)
-    # let's utilize the default upstream checks always
-    if checks_paths:
-        p += [os.path.abspath(x) for x in checks_paths]
-    return [p]
-
-
-def get_ruleset_file(ruleset=None):
-    """
-    Get the ruleset file from name
-
-    :param ruleset: str
-    :return: str
-    """
-    ruleset = ruleset or "default"
-
-    ruleset_dirs = get_ruleset_dirs()
-    for ruleset_directory in ruleset_dirs:
-        possible_ruleset_files = [
-            os.path.join(ruleset_directory, ruleset + ext) for ext in EXTS
-        ]
-
-        for ruleset_file in possible_ruleset_files:
-            if os.path.isfile(ruleset_file):
-                logger.debug("Ruleset file '%s' found.", ruleset_file)
-                return ruleset_file
-
-    logger.warning(
-        "Ruleset with the name '%s' cannot be found at '%s'.", ruleset, ruleset_dirs
-    )
-    raise ColinRulesetException(f"Ruleset with the name '{ruleset}' cannot be found.")
-
-
-def get_ruleset_dirs():
-    """
-    Get the directory with ruleset files
-    First directory to check:  ./rulesets
-    Second directory to check:  $HOME/.local/share/colin/rulesets
-    Third directory to check: /usr/local/share/colin/rulesets
-    :return: str
-    """
-
-    ruleset_dirs = []
-
-    cwd_rulesets = os.path.join(".", RULESET_DIRECTORY_NAME)
-    if os.path.isdir(cwd_rulesets):
-        logger.debug(
-            "Ruleset directory found in current directory ('%s').", cwd_rulesets
-        )
-        ruleset_dirs.append(cwd_rulesets)
-
-    if "VIRTUAL_ENV" in os.environ:
-        venv_local_share = os.path.join(os.environ["VIRTUAL_ENV"], RULESET_DIRECTORY)
-        if os.path.isdir(venv_local_share):
-            logger.debug(
-                "Virtual env ruleset directory found ('%s').", venv_local_share
-            )
-            ruleset_dirs.append(venv_local_share)
-
-    local_share = os.path.join(os.path.expanduser("~"), ".local", RULESET_DIRECTORY)
-    if os.path.isdir(local_share):
-        logger.debug("Local ruleset directory found ('%s').", local_share)
-        ruleset_dirs.append(local_share)
-
-    usr_local_share = os.path.join("/usr/local", RULESET_DIRECTORY)
-    if os.path.isdir(usr_local_share):
-        logger.debug("Global ruleset directory found ('%s').", usr_local_share)
-        ruleset_dirs.append(usr_local_share)
-
-    if sys.prefix != "/usr/local":
-        global_share = os.path.join(sys.prefix, RULESET_DIRECTORY)
-        if os.path.isdir(global_share):
-            logger.debug("Global ruleset directory found ('%s').", global_share)
-            ruleset_dirs.append(global_share)
-
-    if not ruleset_dirs:
-        msg = "Ruleset directory cannot be found."
-        logger.warning(msg)
-        raise ColinRulesetException(msg)
-
-    return ruleset_dirs
-
-
-def get_rulesets():
-    """ "
-    Get available rulesets.
-    """
-    rulesets_dirs = get_ruleset_dirs()
-    ruleset_files = []
-    for rulesets_dir in rulesets_dirs:
-        for f in os.listdir(rulesets_dir):
-            for ext in EXTS:
-                file_path = os.path.join(rulesets_dir, f)
-                if os.path.isfile(file_path) and f.lower().endswith(ext):
-                    ruleset_files.append((f[: -len(ext)], file_path))
-    return ruleset_files
@@ -0,0 +1,609 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Long-running colin service (`colin serve`) and its client (`colin check --server`).
+
+The service keeps the rulesets, their compiled plans and the check classes
+loaded, so a request pays only for the checks themselves.
+
+The API is HTTP on a Unix socket or on localhost:
+
+  GET /health -> {"status": "ok", "running": 1, "queued": 0}
+  POST /check {"target": "fedora:35", "target_type": "image", "tags": [...], ...}
+       -> results as they come, one json per line (application/x-ndjson):
+          {"name": ..., "status": ..., ...}  (same as in the json output)
+          {"phases": {...}}                  (last line of the successful run)
+          {"error": "..."}                   (the target cannot be checked)
+
+The POST requests have to be application/json (415 otherwise); the checks of
+the rulesets sent in the requests cannot use `import_name`.
+
+At most `jobs` requests run at once, at most `queue_size` wait for a slot;
+the other ones are rejected with 503. The `jobs` of a request are limited
+to the `jobs` of the service, its `timeout` to CHECK_TIMEOUT (400 otherwise).
+
+With PreforkServer, the limits apply to each of the worker processes.
+"""
+
+import gc
+import http.client
+import json
+import logging
+import os
+import signal
+import socketserver
+import threading
+import time
+import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from .check_runner import go_through_checks
+from .colin import _get_target
+from .constant import CHECK_TIMEOUT, SERVER_RULESETS
+from .exceptions import ColinException
+from .result import CheckResults, TargetResults, result_from_json_dict
+from .result_cache import ResultCache
+from .ruleset.ruleset import Ruleset
+from .target import TARGET_TYPES
+from ..utils.image_mounts import release_all_mounts
+from ..utils.metrics import RunPhases
+from ..utils.unix_http import UnixHTTPConnection
+from ..version import __version__
+
+logger = logging.getLogger(__name__)
+
+# keys of the check request (and their types)
+REQUEST_KEYS = {
+    "target": str,
+    "target_type": str,
+    "parent_target": str,
+    "ruleset_name": str,
+    "ruleset": dict,
+    "tags": list,
+    "skips": list,
+    "pull": bool,
+    "insecure": bool,
+    "timeout": int,
+    "jobs": int,
+}
+
+
+def validate_request(request):
+    """
+    :param request: dict, the check request
+    :raises ColinException: when the request is not valid
+    """
+    if not isinstance(request, dict):
+        raise ColinException("The request has to be a json object.")
+    unknown = set(request) - set(REQUEST_KEYS)
+    if unknown:
+        raise ColinException(f"Unknown keys in the request: {sorted(unknown)}")
+    if not request.get("target"):
+        raise ColinException("The target is missing.")
+    for key, value in request.items():
+        if value is not None and not isinstance(value, REQUEST_KEYS[key]):
+            raise ColinException(
+                f"'{key}' has to be {REQUEST_KEYS[key].__name__}, not {value!r}."
+            )
+    jobs = request.get("jobs")
+    if jobs is not None and jobs < 1:
+        raise ColinException(f"'jobs' has to be at least 1, not {jobs}.")
+    timeout = request.get("timeout")
+    if timeout is not None and not 0 < timeout <= CHECK_TIMEOUT:
+        raise ColinException(
+            f"'timeout' has to be between 1 and {CHECK_TIMEOUT} seconds, not {timeout}."
+        )
+    checks = (request.get("ruleset") or {}).get("checks") or []
+    if not isinstance(checks, list) or not all(isinstance(c, dict) for c in checks):
+        raise ColinException("'checks' of the ruleset have to be a list of objects.")
+    if any("import_name" in c for c in checks):
+        # the server would import any module the client names
+        raise ColinException(
+            "Checks of the rulesets in the requests cannot use 'import_name'."
+        )
+
+
+class ColinService:
+    """Runs the check requests with warm rulesets."""
+
+    def __init__(
+        self,
+        jobs=2,
+        queue_size=16,
+        checks_paths=None,
+        result_cache=False,
+        layer_cache=False,
+        logging_level=logging.WARNING,
+        max_requests=None,
+        podman=None,
+    ):
+        """
+        :param jobs: int, number of requests running at once
+        :param queue_size: int, number of requests waiting for a free slot
+        :param checks_paths: list of str, directories where the checks are present
+        :param result_cache: bool or ResultCache, reuse the persistent results
+        :param layer_cache: bool or LayerCache, cache of unpacked layers for oci targets
+        :param logging_level: logging level of the targets
+        :param max_requests: int, `exhausted` is set when so many check requests
+                             are admitted (used to recycle the workers of PreforkServer)
+        :param podman: str, socket of the podman API service used for the images
+        """
+        self.jobs = jobs
+        self.queue_size = queue_size
+        self.checks_paths = checks_paths
+        if result_cache is True:
+            result_cache = ResultCache()
+        self.result_cache = result_cache or None
+        if layer_cache is True:
+            from ..utils.layer_cache import LayerCache
+
+            layer_cache = LayerCache()
+        self.layer_cache = layer_cache
+        self.logging_level = logging_level
+        self.max_requests = max_requests
+        self.podman = podman
+        self.exhausted = threading.Event()
+
+        self._slots = threading.BoundedSemaphore(jobs)
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._running = 0
+        self._served = 0
+        self._rulesets = OrderedDict()
+
+    def warm_up(self, ruleset_name=None):
+        """
+        Load the ruleset and compile it for all the target types.
+
+        :param ruleset_name: str (default ruleset if None)
+        """
+        ruleset = self.get_ruleset(ruleset_name=ruleset_name)
+        for target_class in TARGET_TYPES.values():
+            ruleset.compile(target_type=target_class)
+
+    def get_ruleset(self, ruleset_name=None, ruleset=None):
+        """
+        Get the loaded ruleset (loaded on the first request).
+
+        :param ruleset_name: str
+        :param ruleset: dict, content of a ruleset file
+        :return: Ruleset
+        """
+        key = (ruleset_name, json.dumps(ruleset, sort_keys=True) if ruleset else None)
+        with self._lock:
+            loaded = self._rulesets.get(key)
+            if loaded is not None:
+                self._rulesets.move_to_end(key)
+        if loaded is None:
+            loaded = Ruleset(
+                ruleset_name=ruleset_name,
+                ruleset=ruleset,
+                checks_paths=self.checks_paths,
+            )
+            with self._lock:
+                loaded = self._rulesets.setdefault(key, loaded)
+                # least recently used rulesets are dropped
+                while len(self._rulesets) > SERVER_RULESETS:
+                    self._rulesets.popitem(last=False)
+        return loaded
+
+    def admit(self):
+        """
+        Reserve the place for the request.
+
+        :return: bool, False when the queue is full
+        """
+        with self._lock:
+            if self._admitted >= self.jobs + self.queue_size:
+                return False
+            self._admitted += 1
+            self._served += 1
+            if self.max_requests and self._served >= self.max_requests:
+                self.exhausted.set()
+            return True
+
+    def release(self):
+        """free the place reserved by admit"""
+        with self._lock:
+            self._admitted -= 1
+
+    @property
+    def status(self):
+        with self._lock:
+            return {
+                "status": "ok",
+                "version": __version__,
+                "pid": os.getpid(),
+                "served": self._served,
+                "running": self._running,
+                "queued": self._admitted - self._running,
+            }
+
+    def check(self, request):
+        """
+        Run the check request (waits for a free slot).
+
+        :param request: dict, valid check request
+        :return: generator of records (dicts, see the module docstring)
+        """
+        with self._slots:
+            with self._lock:
+                self._running += 1
+            try:
+                yield from self._check(request)
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+    def _check(self, request):
+        phases = RunPhases()
+        target_type = request.get("target_type") or "image"
+        try:
+            with phases.phase("target"):
+                target = _get_target(
+                    target=request["target"],
+                    target_type=target_type,
+                    parent_target=request.get("parent_target"),
+                    logging_level=self.logging_level,
+                    pull=request.get("pull"),
+                    insecure=request.get("insecure") or False,
+                    layer_cache=self.layer_cache,
+                    podman=self.podman,
+                )
+            with phases.phase("ruleset"):
+                plan = self.get_ruleset(
+                    ruleset_name=request.get("ruleset_name"),
+                    ruleset=request.get("ruleset"),
+                ).compile(
+                    target_type=target.__class__,
+                    tags=request.get("tags"),
+                    skips=request.get("skips"),
+                )
+            results = go_through_checks(
+                target=target,
+                checks=plan,
+                timeout=request.get("timeout"),
+                # the request cannot take more threads than the server runs requests
+                jobs=min(request.get("jobs") or 1, self.jobs),
+                result_cache=self.result_cache,
+                phases=phases,
+            )
+            for result in results.results:
+                yield result.to_json_dict()
+            yield {"phases": results.phases_dict}
+        except Exception as ex:
+            logger.warning("Cannot check %s: %r", request["target"], ex)
+            yield {"error": str(ex)}
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    server_version = f"colin/{__version__}"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def address_string(self):
+        # unix sockets have no client address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        logger.debug("%s: %s", self.address_string(), format % args)
+
+    def _send_json(self, code, data):
+        body = (json.dumps(data) + "\n").encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send_json(404, {"error": f"Unknown path {self.path}."})
+            return
+        self._send_json(200, self.service.status)
+
+    def do_POST(self):
+        if self.path != "/check":
+            self._send_json(404, {"error": f"Unknown path {self.path}."})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length)
+        except ValueError as ex:
+            self._send_json(400, {"error": str(ex)})
+            return
+        if self.headers.get_content_type() != "application/json":
+            self._send_json(415, {"error": "The request has to be application/json."})
+            return
+        try:
+            request = json.loads(body)
+            validate_request(request)
+        except (ValueError, ColinException) as ex:
+            self._send_json(400, {"error": str(ex)})
+            return
+        if not self.service.admit():
+            self._send_json(503, {"error": "Too many requests, try again later."})
+            return
+        records = self.service.check(request)
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            for record in records:
+                self.wfile.write((json.dumps(record) + "\n").encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            logger.info("Client of %s disconnected.", request["target"])
+        finally:
+            # stops the checks when the client is gone
+            records.close()
+            self.service.release()
+
+
+class _ThreadingMixIn(socketserver.ThreadingMixIn):
+    """One thread per connection; the connections being handled are counted."""
+
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._connections = 0
+        self._idle = threading.Condition()
+
+    def process_request(self, request, client_address):
+        with self._idle:
+            self._connections += 1
+        super().process_request(request, client_address)
+
+    def shutdown_request(self, request):
+        try:
+            super().shutdown_request(request)
+        finally:
+            with self._idle:
+                self._connections -= 1
+                self._idle.notify_all()
+
+    def wait_idle(self):
+        """wait till all the accepted connections are handled"""
+        with self._idle:
+            while self._connections > 0:
+                self._idle.wait()
+
+
+class _UnixHTTPServer(_ThreadingMixIn, socketserver.UnixStreamServer):
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.server_address)
+        except OSError:
+            pass
+
+
+class _LocalHTTPServer(_ThreadingMixIn, HTTPServer):
+    pass
+
+
+def create_server(service, socket_path=None, port=None):
+    """
+    Create the server of the service (call serve_forever to run it).
+
+    :param service: ColinService
+    :param socket_path: str, Unix socket to listen on
+    :param port: int, port to listen on (localhost only)
+    :return: socketserver.BaseServer
+    """
+    if socket_path:
+        if os.path.exists(socket_path):
+            # left over by the previous instance
+            os.unlink(socket_path)
+        server = _UnixHTTPServer(socket_path, _RequestHandler)
+    elif port is not None:
+        server = _LocalHTTPServer(("127.0.0.1", port), _RequestHandler)
+    else:
+        raise ColinException("Socket path or port is required.")
+    server.service = service
+    return server
+
+
+class PreforkServer:
+    """
+    Parent process forking workers serving the same listening socket.
+
+    The rulesets and the checks are loaded in the parent (ColinService.warm_up)
+    and shared copy-on-write by the workers; the workers are replaced after
+    `max_requests` requests (see ColinService.max_requests) or when they die.
+    """
+
+    # do not respawn the crashing workers in a busy loop
+    min_worker_lifetime = 1.0
+    # how often the worker checks if it should stop accepting the requests
+    poll_interval = 0.5
+
+    def __init__(self, server, workers):
+        """
+        :param server: server created by create_server
+        :param workers: int, number of worker processes
+        """
+        self.server = server
+        self.workers = workers
+        self._pids = {}
+        self._stopping = False
+
+    def serve_forever(self):
+        """Fork the workers and replace them when they exit (till interrupted)."""
+        # the workers compete for the connections: the losers must not block in accept
+        self.server.socket.setblocking(False)
+        self.server.timeout = self.poll_interval
+        if hasattr(gc, "freeze"):
+            # objects loaded so far are not touched by the gc in the workers,
+            # so their pages stay shared
+            gc.collect()
+            gc.freeze()
+        try:
+            for _ in range(self.workers):
+                self._spawn()
+            while True:
+                pid, status = os.wait()
+                started = self._pids.pop(pid, None)
+                if started is None:
+                    continue
+                logger.info("Worker %d exited with status %d.", pid, status)
+                if status and time.monotonic() - started < self.min_worker_lifetime:
+                    time.sleep(self.min_worker_lifetime)
+                self._spawn()
+        finally:
+            self.stop()
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._run_worker()
+            except KeyboardInterrupt:
+                pass
+            except BaseException:
+                logger.exception("Worker %d failed.", os.getpid())
+                code = 1
+            finally:
+                release_all_mounts()
+                os._exit(code)
+        logger.debug("Worker %d started.", pid)
+        self._pids[pid] = time.monotonic()
+
+    def _run_worker(self):
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        service = self.server.service
+        while not service.exhausted.is_set():
+            self.server.handle_request()
+        logger.debug("Worker %d accepted its requests.", os.getpid())
+        self.server.wait_idle()
+
+    def stop(self):
+        """Stop the workers and close the listening socket."""
+        if self._stopping:
+            return
+        self._stopping = True
+        for pid in list(self._pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in list(self._pids):
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self._pids = {}
+        self.server.server_close()
+
+
+def _get_connection(address):
+    """
+    :param address: str, path to the Unix socket or http://127.0.0.1:PORT
+    :return: http.client.HTTPConnection
+    """
+    if address.startswith("http://"):
+        url = urllib.parse.urlsplit(address)
+        return http.client.HTTPConnection(url.hostname, url.port)
+    return UnixHTTPConnection(address)
+
+
+def _records(connection, response):
+    try:
+        for line in response:
+            if line.strip():
+                yield json.loads(line)
+    finally:
+        connection.close()
+
+
+def check_on_server(address, target, **request):
+    """
+    Check the target by the running `colin serve`.
+
+    :param address: str, path to the Unix socket or http://127.0.0.1:PORT
+    :param target: str, image name, oci:path:image or path to the dockerfile
+                   (as seen by the server)
+    :param request: other keys of the request (target_type, tags, skips, ...)
+    :return: CheckResults instance (the results are read as the server sends them)
+    """
+    request = {k: v for k, v in request.items() if v is not None}
+    request["target"] = target
+    validate_request(request)
+    connection = _get_connection(address)
+    try:
+        connection.request(
+            "POST",
+            "/check",
+            body=json.dumps(request),
+            headers={"Content-Type": "application/json"},
+        )
+        response = connection.getresponse()
+    except OSError as ex:
+        connection.close()
+        raise ColinException(f"Cannot connect to the colin server {address}: {ex}")
+    if response.status != 200:
+        try:
+            message = json.loads(response.read())["error"]
+        except (ValueError, KeyError, TypeError):
+            message = response.reason
+        finally:
+            connection.close()
+        raise ColinException(f"The colin server refused the request: {message}")
+
+    phases = RunPhases()
+
+    def results():
+        for record in _records(connection, response):
+            if "error" in record:
+                raise ColinException(record["error"])
+            if "phases" in record:
+                for name, seconds in record["phases"].items():
+                    phases.add(name, seconds)
+                continue
+            yield result_from_json_dict(record)
+
+    return CheckResults(results=results(), phases=phases)
+
+
+def check_many_on_server(address, targets, target_jobs=4, **request):
+    """
+    Check more targets by the running `colin serve`.
+
+    :param address: str, path to the Unix socket or http://127.0.0.1:PORT
+    :param targets: list of str
+    :param target_jobs: int, number of requests sent at once
+    :param request: other keys of the request (target_type, tags, skips, ...)
+    :return: generator of TargetResults (in the order of the targets)
+    """
+
+    def check_target(target):
+        try:
+            results = check_on_server(address, target, **request)
+            list(results.results)
+            return TargetResults(target, results=results)
+        except Exception as ex:
+            logger.error("Cannot check %s: %r", target, ex)
+            return TargetResults(target, error=ex)
+
+    with ThreadPoolExecutor(
+        max_workers=target_jobs, thread_name_prefix="colin-client"
+    ) as executor:
+        yield from executor.map(check_target, targets)
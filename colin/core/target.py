@@ -13,19 +13,32 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
 
+import hashlib
 import io
-import json
 import logging
 import os
-import shutil
 import subprocess
+import threading
 from tempfile import mkdtemp
 
 from dockerfile_parse import DockerfileParser
 
 from .checks.abstract_check import ImageAbstractCheck, DockerfileAbstractCheck
+from .constant import (
+    FACET_CONFIG,
+    FACET_DOCKERFILE,
+    FACET_FILES,
+    FACET_FILESYSTEM,
+    FACET_LABELS,
+)
+from .dockerfile_model import DockerfileModel
 from ..core.exceptions import ColinException
+from ..utils.cmd_tools import run_cmd
 from ..utils.cont import ImageName
+from ..utils.layer_cache import LayerCache
+from ..utils.metrics import count_bytes_read
+from ..utils.oci import FilesystemIndex, OciImage, remove_tree, unpack_image
+from ..utils.podman import get_podman
 
 logger = logging.getLogger(__name__)
 
@@ -54,6 +67,10 @@ class Target:
         self._labels = None
         self.target_name = None
         self.parent_target = None
+        # paths of the filesystem read by the checks (None means any path)
+        self.path_filter = None
+        # guards the lazily computed properties when checks run in parallel
+        self._lock = threading.RLock()
 
     @property
     def labels(self):
@@ -64,6 +81,45 @@ class Target:
         """
         return None
 
+    @property
+    def identity(self):
+        """
+        Identification of the content of the target (e.g. image ID),
+        including the parent target; None if the content cannot be identified.
+
+        :return: str or None
+        """
+        own = self._own_identity()
+        if own is None:
+            return None
+        if self.parent_target is None:
+            return own
+        parent = self.parent_target.identity
+        if parent is None:
+            return None
+        return f"{own} parent={parent}"
+
+    def _own_identity(self):
+        return None
+
+    def prepare(self, facets):
+        """
+        Prepare the access paths needed for the facets of the target
+        (e.g. mount the filesystem) before the checks run.
+
+        :param facets: set of str (see colin.core.constant.FACETS)
+        """
+        pass
+
+    def set_path_filter(self, path_filter):
+        """
+        Tell the target which paths of the filesystem the checks read,
+        the target does not need to provide the other ones.
+
+        :param path_filter: PathFilter or None for the whole filesystem
+        """
+        self.path_filter = path_filter
+
     def clean_up(self):
         """
         Perform clean up on the low level objects: atm oci and skopeo mountpoints
@@ -114,6 +170,19 @@ class DockerfileTarget(Target):
             self.instance = DockerfileParser(fileobj=target)
         else:
             self.instance = DockerfileParser(fileobj=open(target))
+        self._model = None
+
+    @property
+    def model(self):
+        """
+        Dockerfile parsed once and shared by all the checks.
+
+        :return: DockerfileModel
+        """
+        with self._lock:
+            if self._model is None:
+                self._model = DockerfileModel.from_parser(self.instance)
+            return self._model
 
     @property
     def labels(self):
@@ -122,9 +191,15 @@ class DockerfileTarget(Target):
 
         :return: [str]
         """
-        if self._labels is None:
-            self._labels = self.instance.labels
-        return self._labels
+        return self.model.labels
+
+    def prepare(self, facets):
+        if facets & {FACET_DOCKERFILE, FACET_LABELS}:
+            self.model
+
+    def _own_identity(self):
+        content = self.instance.content
+        return "dockerfile:sha256:" + hashlib.sha256(content.encode()).hexdigest()
 
     @classmethod
     def get_compatible_check_class(cls):
@@ -163,7 +238,9 @@ class AbstractImageTarget(Target):
         """
         try:
             with open(self.cont_path(file_path)) as fd:
-                return fd.read()
+                content = fd.read()
+                count_bytes_read(fd.buffer.tell())
+                return content
         except OSError as ex:
             logger.error("error while accessing file %s: %r", file_path, ex)
             raise ColinException(
@@ -193,6 +270,14 @@ class AbstractImageTarget(Target):
             raise OSError(f"{file_path} is not a file")
         return True
 
+    def stat(self, file_path):
+        """
+        stat the file 'file_path' (symlinks are followed)
+        :param file_path: str, path to the file
+        :return: os.stat_result
+        """
+        return os.stat(self.cont_path(file_path))
+
     def cont_path(self, path):
         """
         provide absolute path within the container
@@ -218,83 +303,110 @@ class ImageTarget(AbstractImageTarget):
 
     target_type = "image"
 
-    def __init__(self, target, pull, parent_target=None, insecure=False, **_):
+    def __init__(
+        self, target, pull, parent_target=None, insecure=False, podman=None, **_
+    ):
+        """
+        :param target: str, name of the image
+        :param pull: bool, pull the image if it is not present
+        :param parent_target: str, name of the parent image
+        :param insecure: bool, pull from an insecure registry (HTTP/invalid TLS)
+        :param podman: path to the socket of the podman API service
+                       or "containers-storage:<graph root>" (see get_podman)
+        """
         super().__init__()
         logger.debug("Target is an image.")
         self.pull = pull
         self.insecure = insecure
+        self.podman = get_podman(podman)
         self.image_name_obj = ImageName.parse(target)
         self.target_name = self.image_name_obj.name
         self.parent_target = parent_target
 
         self._config_metadata = None
         self._mount_point = None
-        self._mounted_container_id = None
+        self._fs_view = None
         self.image_id = None
 
         self._try_image()
 
     @property
     def config_metadata(self):
-        if not self._config_metadata:
-            cmd = ["podman", "inspect", self.target_name]
-            loaded_config = json.loads(subprocess.check_output(cmd))
-            if loaded_config and isinstance(loaded_config, list):
-                self._config_metadata = loaded_config[0]
-                # FIXME: Better validation.
-            else:
-                raise ColinException("Cannot load config for the image.")
-
-        return self._config_metadata
+        with self._lock:
+            if not self._config_metadata:
+                self._config_metadata = self.podman.inspect(self.target_name)
+            return self._config_metadata
 
     @property
     def labels(self):
         return self.config_metadata["Labels"] or {}
 
+    def prepare(self, facets):
+        if facets & {FACET_LABELS, FACET_CONFIG}:
+            self.config_metadata
+        if FACET_FILES in facets and self.fs_view is None:
+            self.mount_point
+        if FACET_FILESYSTEM in facets:
+            self.mount_point
+
+    def _own_identity(self):
+        return f"image:{self.image_id}" if self.image_id else None
+
+    @property
+    def fs_view(self):
+        """
+        files of the image read directly from the storage, without mounting it
+        (None if not supported by the podman backend)
+        """
+        with self._lock:
+            if self._fs_view is None:
+                self._fs_view = self.podman.image_view(self.image_id)
+            return self._fs_view
+
+    def file_is_present(self, file_path):
+        if self.fs_view is None:
+            return super().file_is_present(file_path)
+        return self.fs_view.file_is_present(file_path)
+
+    def stat(self, file_path):
+        if self.fs_view is None:
+            return super().stat(file_path)
+        return self.fs_view.stat(file_path)
+
+    def cont_path(self, path):
+        if self.fs_view is None:
+            return super().cont_path(path)
+        try:
+            return self.fs_view.real_path(path)
+        except IsADirectoryError:
+            # merged from more layers, only the mounted image has it
+            return super().cont_path(path)
+
     @property
     def mount_point(self):
-        """podman mount -- real filesystem"""
-        if self._mount_point is None:
-            cmd_create = ["podman", "create", self.target_name, "some-cmd"]
-            self._mounted_container_id = (
-                subprocess.check_output(cmd_create).decode().rstrip()
-            )
-            cmd_mount = ["podman", "mount", self._mounted_container_id]
-            self._mount_point = subprocess.check_output(cmd_mount).decode().rstrip()
-        return self._mount_point
+        """podman image mount -- real filesystem (shared with other targets of the image)"""
+        with self._lock:
+            if self._mount_point is None:
+                self._mount_point = self.podman.image_mounts.acquire(self.image_id)
+            return self._mount_point
 
     def _try_image(self):
         logger.debug("Trying to find an image.")
-        cmd = ["podman", "images", "--quiet", self.target_name]
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        if result.returncode == 0:
-            self.image_id = result.stdout.decode().rstrip()
+        self.image_id = self.podman.find_image(self.target_name)
+        if self.image_id:
             logger.debug("Image found with id: '%s'.", self.image_id)
-        else:
-            if "unable to find" not in result.stderr.decode():
-                raise ColinException(f"Podman error: {result.stderr}")
-            if not self.pull:
-                raise ColinException(f"Image '{self.target_name}' not found.")
-            logger.debug("Pulling an image.")
-            cmd_pull = ["podman", "pull", "--quiet", self.target_name]
-            result_pull = subprocess.run(
-                cmd_pull, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-            )
-            if result_pull.returncode == 0:
-                self.image_id = result_pull.stdout.decode().rstrip()
-                logger.debug("Image pulled with id: '%s'.", self.image_id)
-            else:
-                raise ColinException(f"Cannot pull an image: '{self.target_name}'.")
+            return
+        if not self.pull:
+            raise ColinException(f"Image '{self.target_name}' not found.")
+        logger.debug("Pulling an image.")
+        self.image_id = self.podman.pull(self.target_name, insecure=self.insecure)
+        logger.debug("Image pulled with id: '%s'.", self.image_id)
 
     def clean_up(self):
-        if self._mount_point:
-            cmd = ["podman", "umount", self._mounted_container_id]
-            subprocess.check_call(cmd, stdout=subprocess.DEVNULL)
-            self._mount_point = None
-        if self._mounted_container_id:
-            cmd = ["podman", "rm", self._mounted_container_id]
-            subprocess.check_call(cmd, stdout=subprocess.DEVNULL)
-            self._mounted_container_id = None
+        with self._lock:
+            if self._mount_point:
+                self.podman.image_mounts.release(self.image_id)
+                self._mount_point = None
 
     def get_output(self, cmd):
         raise NotImplementedError("Unsupported right now.")
@@ -307,7 +419,14 @@ class OciTarget(AbstractImageTarget):
 
     target_type = "oci"
 
-    def __init__(self, target, parent_target=None, **_):
+    def __init__(self, target, parent_target=None, layer_cache=None, **_):
+        """
+        :param target: str, oci:path:image
+        :param parent_target: Target for the parent image
+        :param layer_cache: LayerCache instance or True for the default cache;
+                            when set, the root filesystem is checked out from
+                            the cached layers instead of unpacking the image
+        """
         super().__init__()
         logger.debug("Target is an oci repository.")
 
@@ -321,22 +440,70 @@ class OciTarget(AbstractImageTarget):
             raise RuntimeError("Invalid oci target: should be 'path:image'.")
 
         self.parent_target = parent_target
+        if layer_cache is True:
+            layer_cache = LayerCache()
+        self.layer_cache = layer_cache or None
         self._tmpdir = None
         self._mount_point = None
         self._layers_path = None
         self._labels = None
+        self._oci_image = None
+        self._fs_index = None
+
+    @property
+    def oci_image(self):
+        """image read directly from the oci layout (index, manifest, config)"""
+        with self._lock:
+            if self._oci_image is None:
+                self._oci_image = OciImage(
+                    layout_path=self.oci_path, ref_name=self.ref_image_name
+                )
+            return self._oci_image
+
+    @property
+    def fs_index(self):
+        """index of the image filesystem built from the layer tar headers"""
+        with self._lock:
+            if self._fs_index is None:
+                self._fs_index = FilesystemIndex.from_image(self.oci_image)
+            return self._fs_index
+
+    def file_is_present(self, file_path):
+        """
+        check if file 'file_path' is present, raises IOError if file_path
+        is not a file; answered from the layer index, nothing is unpacked
+        :param file_path: str, path to the file
+        :return: True if file exists, False if file does not exist
+        """
+        return self.fs_index.file_is_present(file_path)
+
+    def stat(self, file_path):
+        return self.fs_index.stat(file_path)
+
+    def prepare(self, facets):
+        if facets & {FACET_LABELS, FACET_CONFIG}:
+            self.oci_image.config
+        if FACET_FILES in facets:
+            # answered from the layer index, no need to unpack
+            self.fs_index
+        if FACET_FILESYSTEM in facets:
+            self.mount_point
+
+    def _own_identity(self):
+        return f"oci:{self.oci_image.manifest_digest}"
 
     @property
     def labels(self):
         """
-        Provide labels without the need of dockerd. Instead skopeo is being used.
+        Provide labels without the need of dockerd or skopeo,
+        the image config is read from the oci layout.
 
         :return: dict
         """
-        if self._labels is None:
-            cmd = ["skopeo", "inspect", self.skopeo_target]
-            self._labels = json.loads(subprocess.check_output(cmd))["Labels"]
-        return self._labels
+        with self._lock:
+            if self._labels is None:
+                self._labels = self.oci_image.labels
+            return self._labels
 
     @property
     def layers_path(self):
@@ -348,13 +515,14 @@ class OciTarget(AbstractImageTarget):
     @property
     def mount_point(self):
         """oci checkout -- real filesystem"""
-        if self._mount_point is None:
-            checkout_dir = os.path.join(self.tmpdir, "checkout")
-            os.makedirs(checkout_dir)
-            # root filesystem is unpacked in rootfs subdirectory
-            self._mount_point = os.path.join(checkout_dir, "rootfs")
-            self._checkout(checkout_dir)
-        return self._mount_point
+        with self._lock:
+            if self._mount_point is None:
+                checkout_dir = os.path.join(self.tmpdir, "checkout")
+                os.makedirs(checkout_dir)
+                # root filesystem is unpacked in rootfs subdirectory
+                self._mount_point = os.path.join(checkout_dir, "rootfs")
+                self._checkout(checkout_dir)
+            return self._mount_point
 
     @property
     def oci_path(self):
@@ -371,15 +539,34 @@ class OciTarget(AbstractImageTarget):
     @property
     def tmpdir(self):
         """Temporary directory holding all the runtime data."""
-        if self._tmpdir is None:
-            self._tmpdir = mkdtemp(prefix="colin-", dir="/var/tmp")
-        return self._tmpdir
+        with self._lock:
+            if self._tmpdir is None:
+                self._tmpdir = mkdtemp(prefix="colin-", dir="/var/tmp")
+            return self._tmpdir
 
     def clean_up(self):
-        shutil.rmtree(self.tmpdir)
+        with self._lock:
+            remove_tree(self.tmpdir)
 
     def _checkout(self, checkout_dir):
         """check out the image filesystem on self.mount_point"""
+        if self.path_filter is not None:
+            # the checks read only the content of these paths
+            path_filter = self.path_filter.resolve(self.fs_index)
+            logger.debug("Unpacking only %s.", path_filter)
+            unpack_image(self.oci_image, self._mount_point, path_filter)
+            return
+        if self.layer_cache:
+            logger.debug("Checking out the image from the layer cache.")
+            self.layer_cache.checkout(self.oci_image, self._mount_point)
+            return
+        try:
+            unpack_image(self.oci_image, self._mount_point)
+            return
+        except (ColinException, OSError) as ex:
+            logger.warning("Cannot unpack the image, trying umoci: %r", ex)
+            if os.path.lexists(self._mount_point):
+                remove_tree(self._mount_point)
         cmd = [
             "umoci",
             "unpack",
@@ -394,12 +581,8 @@ class OciTarget(AbstractImageTarget):
     def _run_and_log(cmd, error_msg):
         """run provided command and log all of its output"""
         logger.debug("running command %s", cmd)
-        kwargs = {
-            "stderr": subprocess.STDOUT,
-            "env": os.environ.copy(),
-        }
         try:
-            out = subprocess.check_output(cmd, **kwargs)
+            out = run_cmd(cmd, stderr=subprocess.STDOUT, env=os.environ.copy()).stdout
         except subprocess.CalledProcessError as ex:
             logger.error(ex.output)
             logger.error(error_msg)
@@ -408,8 +591,9 @@ class OciTarget(AbstractImageTarget):
 
     @property
     def config_metadata(self):
-        """metadata from "Config" key"""
-        raise NotImplementedError("Skopeo does not provide metadata yet.")
+        """image metadata in the format of `podman inspect`"""
+        with self._lock:
+            return self.oci_image.config_metadata
 
     def get_output(self, cmd):
         raise NotImplementedError("Unsupported right now.")
@@ -0,0 +1,34 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import os
+
+CACHE_DIR_ENV = "COLIN_CACHE_DIR"
+
+
+def get_cache_dir(*subdirs):
+    """
+    Get the directory for the persistent caches of colin:
+    $COLIN_CACHE_DIR, $XDG_CACHE_HOME/colin or ~/.cache/colin
+
+    :param subdirs: str, path components inside the cache directory
+    :return: str
+    """
+    cache_dir = os.environ.get(CACHE_DIR_ENV)
+    if not cache_dir:
+        xdg_cache = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+            os.path.expanduser("~"), ".cache"
+        )
+        cache_dir = os.path.join(xdg_cache, "colin")
+    return os.path.join(cache_dir, *subdirs)
@@ -15,13 +15,11 @@
 import functools
 import logging
 import subprocess
-import threading
 import time
 
-try:
-    import thread
-except ImportError:
-    import _thread as thread  # type: ignore
+from .metrics import count_bytes_read, count_tool_call
+from .tracing import span
+from .watchdog import current_deadline, get_watchdog
 
 logger = logging.getLogger(__name__)
 
@@ -102,24 +100,27 @@ def is_rpm_installed():
 
 def exit_after(s):
     """
-    Use as decorator to exit process if
-    function takes longer than s seconds.
+    Use as decorator to stop the function if
+    it takes longer than s seconds (TimeoutError is raised).
 
     Direct call is available via exit_after(TIMEOUT_IN_S)(fce)(args).
 
-    Inspired by https://stackoverflow.com/a/31667005
+    Works in any thread; the timeouts are watched by a single watchdog thread.
     """
 
     def outer(fn):
         def inner(*args, **kwargs):
-            timer = threading.Timer(s, thread.interrupt_main)
-            timer.start()
-            try:
-                result = fn(*args, **kwargs)
-            except KeyboardInterrupt:
+            with get_watchdog().deadline(s) as deadline:
+                try:
+                    result = fn(*args, **kwargs)
+                except (KeyboardInterrupt, TimeoutError):
+                    if deadline.expired:
+                        raise TimeoutError(
+                            f"Function '{fn.__name__}' hit the timeout ({s}s)."
+                        )
+                    raise
+            if deadline.expired:
                 raise TimeoutError(f"Function '{fn.__name__}' hit the timeout ({s}s).")
-            finally:
-                timer.cancel()
             return result
 
         return inner
@@ -127,6 +128,44 @@ def exit_after(s):
     return outer
 
 
+def run_cmd(cmd, check=True, stdout=subprocess.PIPE, stderr=None, env=None):
+    """
+    Run the external command and wait for it.
+
+    The process is killed when the deadline of the current thread
+    (e.g. timeout of the running check) expires.
+
+    :param cmd: [str]
+    :param check: bool, raise CalledProcessError for non-zero exit code
+    :param stdout: same as for subprocess.Popen
+    :param stderr: same as for subprocess.Popen
+    :param env: dict, environment variables for the command
+    :return: subprocess.CompletedProcess
+    """
+    deadline = current_deadline()
+    count_tool_call()
+    with span(" ".join(cmd[:2]), "cmd", {"cmd": cmd}) as cmd_span:
+        with subprocess.Popen(cmd, stdout=stdout, stderr=stderr, env=env) as process:
+            cmd_span.set("pid", process.pid)
+            if deadline:
+                deadline.register_process(process)
+            try:
+                out, err = process.communicate()
+            finally:
+                if deadline:
+                    deadline.unregister_process(process)
+        cmd_span.set("exit_code", process.returncode)
+    if isinstance(out, bytes):
+        count_bytes_read(len(out))
+    if deadline and deadline.expired:
+        raise TimeoutError(f"Command {cmd} killed, the timeout ({deadline.timeout}s).")
+    if check and process.returncode:
+        raise subprocess.CalledProcessError(
+            process.returncode, cmd, output=out, stderr=err
+        )
+    return subprocess.CompletedProcess(cmd, process.returncode, out, err)
+
+
 def retry(retry_count=5, delay=2):
     """
     Use as decorator to retry functions few times with delays
@@ -0,0 +1,407 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Read the images of the local containers-storage (overlay driver) directly.
+
+    <root>/overlay-images/images.json         images: names, top layer
+    <root>/overlay-images/<id>/<big data>     image config, manifest
+    <root>/overlay-layers/layers.json         layers: parents
+    <root>/overlay/<layer id>/diff/           content of the layer
+
+The files of the image are looked up in the diff directories of the layers
+(the same way as overlayfs merges them), nothing is mounted or written.
+"""
+
+import base64
+import json
+import logging
+import os
+import posixpath
+import re
+import stat
+import subprocess
+import threading
+
+from .cmd_tools import run_cmd
+from .image_mounts import ImageMounts
+from .oci import (
+    MAX_SYMLINK_HOPS,
+    OPAQUE_WHITEOUT,
+    WHITEOUT_PREFIX,
+    config_metadata,
+    normalize_path,
+)
+from ..core.constant import IMAGE_MOUNT_IDLE_TIMEOUT
+from ..core.exceptions import ColinException
+
+logger = logging.getLogger(__name__)
+
+OPAQUE_XATTRS = ("trusted.overlay.opaque", "user.overlay.opaque")
+
+IMAGE_ID_REGEX = re.compile(r"^[0-9a-f]{3,64}$")
+
+
+def big_data_file_name(key):
+    """
+    Name of the file holding the big data item of the image
+    (as makeBigDataBaseName in containers/storage).
+
+    :param key: str, e.g. "manifest" or "sha256:<image id>"
+    :return: str
+    """
+    if re.match(r"^[0-9a-z.]*$", key):
+        return key
+    return "=" + base64.b64encode(key.encode()).decode()
+
+
+class ContainersStorage:
+    """Images read directly from the containers-storage directory (read-only)."""
+
+    def __init__(self, root, mount_idle_timeout=IMAGE_MOUNT_IDLE_TIMEOUT):
+        """
+        :param root: str, graph root of the storage (e.g. /var/lib/containers/storage)
+        :param mount_idle_timeout: float, seconds an unused image stays mounted
+                                   (the images are mounted only for the checks
+                                   needing the whole filesystem)
+        """
+        self.root = root
+        self.image_mounts = ImageMounts(self, idle_timeout=mount_idle_timeout)
+        self._views = {}
+        self._lock = threading.Lock()
+
+    def _read_json(self, *path):
+        path = os.path.join(self.root, *path)
+        try:
+            with open(path) as fd:
+                return json.load(fd)
+        except (OSError, ValueError) as ex:
+            raise ColinException(
+                f"Cannot read the containers-storage file '{path}': {ex!r}"
+            )
+
+    def _images(self):
+        return self._read_json("overlay-images", "images.json") or []
+
+    def _find(self, name):
+        images = self._images()
+        for image in images:
+            if name in (image.get("names") or []):
+                return image
+        image_name, _, digest = name.partition("@")
+        if digest:
+            for image in images:
+                names = image.get("names") or []
+                digests = image.get("digests") or [image.get("digest")]
+                if digest in digests and any(
+                    _matches_repository(n, image_name) for n in names
+                ):
+                    return image
+        else:
+            # short name, e.g. fedora:35 for registry.fedoraproject.org/fedora:35
+            matching = [
+                image
+                for image in images
+                if any(n.endswith("/" + name) for n in image.get("names") or [])
+            ]
+            for image in matching:
+                # as podman, the local images are preferred
+                if "localhost/" + name in (image.get("names") or []):
+                    return image
+            if len(matching) > 1:
+                repositories = sorted(
+                    n
+                    for image in matching
+                    for n in image.get("names") or []
+                    if n.endswith("/" + name)
+                )
+                raise ColinException(
+                    f"Short name '{name}' matches more images: {repositories}, "
+                    "use the full name."
+                )
+            if matching:
+                return matching[0]
+        if IMAGE_ID_REGEX.match(name):
+            for image in images:
+                if image["id"].startswith(name):
+                    return image
+        return None
+
+    def find_image(self, name):
+        """
+        :param name: str, name of the image (or its ID)
+        :return: str, ID of the image or None if there is no such image
+        """
+        image = self._find(name)
+        return image["id"] if image else None
+
+    def pull(self, name, insecure=False):
+        raise ColinException(
+            f"Cannot pull an image: '{name}' (the containers-storage is read-only)."
+        )
+
+    def _image(self, name_or_id):
+        image = self._find(name_or_id)
+        if image is None:
+            raise ColinException(f"Image '{name_or_id}' not found.")
+        return image
+
+    def inspect(self, name):
+        """
+        :param name: str, name of the image
+        :return: dict, metadata of the image (as in `podman inspect`)
+        """
+        image = self._image(name)
+        image_id = image["id"]
+        config = self._read_json(
+            "overlay-images", image_id, big_data_file_name(f"sha256:{image_id}")
+        )
+        metadata = config_metadata(
+            config, image_id=image_id, digest=image.get("digest")
+        )
+        metadata["RepoTags"] = image.get("names") or []
+        return metadata
+
+    def layer_dirs(self, image_id):
+        """
+        :param image_id: str, ID of the image
+        :return: list of str, diff directories from the base layer to the top one
+        """
+        layers = {
+            layer["id"]: layer
+            for layer in self._read_json("overlay-layers", "layers.json")
+        }
+        layer_id = self._image(image_id).get("layer")
+        dirs = []
+        while layer_id:
+            if layer_id not in layers or len(dirs) > len(layers):
+                raise ColinException(f"Layer '{layer_id}' not found in the storage.")
+            dirs.append(os.path.join(self.root, "overlay", layer_id, "diff"))
+            layer_id = layers[layer_id].get("parent")
+        return list(reversed(dirs))
+
+    def image_view(self, image_id):
+        """
+        :param image_id: str, ID of the image
+        :return: OverlayView of the image filesystem (shared per image)
+        """
+        with self._lock:
+            if image_id not in self._views:
+                self._views[image_id] = OverlayView(self.layer_dirs(image_id))
+            return self._views[image_id]
+
+    def mount_image(self, image_id):
+        cmd = ["podman", "--root", self.root, "image", "mount", image_id]
+        return run_cmd(cmd).stdout.decode().rstrip()
+
+    def unmount_image(self, image_id):
+        cmd = ["podman", "--root", self.root, "image", "unmount", image_id]
+        run_cmd(cmd, stdout=subprocess.DEVNULL)
+
+
+class OverlayView:
+    """
+    Files of the image looked up in the diff directories of its layers
+    (whiteouts and opaque directories are applied as overlayfs does).
+    """
+
+    def __init__(self, layer_dirs):
+        """
+        :param layer_dirs: list of str, diff directories from the base layer to the top one
+        """
+        self.layer_dirs = list(layer_dirs)
+        # merged directory -> diff directories contributing to it (top one first)
+        self._dirs = {"/": tuple(reversed(self.layer_dirs))}
+
+    def _child(self, dir_path, name):
+        """
+        :return: (str, os.stat_result), real path and stat of the top-most entry
+                 or None when there is no such entry
+        """
+        path = posixpath.join(dir_path, name)
+        relative = path.lstrip("/")
+        whiteout = posixpath.join(dir_path, WHITEOUT_PREFIX + name).lstrip("/")
+        found = None
+        merged = []
+        for layer in self._dirs[dir_path]:
+            st = _lstat(os.path.join(layer, relative))
+            if st is None:
+                if _lstat(os.path.join(layer, whiteout)) is not None:
+                    # .wh.<name> hides the entries of the lower layers
+                    break
+                continue
+            if _is_whiteout(st):
+                break
+            if found is None:
+                found = (os.path.join(layer, relative), st)
+            if not stat.S_ISDIR(st.st_mode):
+                break
+            merged.append(layer)
+            if _is_opaque(os.path.join(layer, relative)):
+                break
+        if found is not None and stat.S_ISDIR(found[1].st_mode):
+            self._dirs[path] = tuple(merged)
+        return found
+
+    def lookup(self, path, follow_symlinks=True):
+        """
+        Find the file, symlinks are resolved inside the image.
+
+        :param path: str
+        :param follow_symlinks: bool, resolve the last component as well
+        :return: (str, os.stat_result), real path and stat of the file, or None
+        """
+        resolved = self._resolve(path, follow_symlinks)
+        return resolved[1:] if resolved else None
+
+    def _resolve(self, path, follow_symlinks=True):
+        """
+        :return: (str, str, os.stat_result), path in the image with the symlinks
+                 resolved, real path and stat of the file, or None
+        """
+        components = [c for c in normalize_path(path).split("/") if c]
+        current = "/"
+        entry = None
+        hops = 0
+        while components:
+            name = components.pop(0)
+            if name == "..":
+                current = posixpath.dirname(current)
+                entry = None
+                continue
+            entry = self._child(current, name)
+            if entry is None:
+                return None
+            if stat.S_ISLNK(entry[1].st_mode) and (components or follow_symlinks):
+                hops += 1
+                if hops > MAX_SYMLINK_HOPS:
+                    return None
+                link = os.readlink(entry[0])
+                if link.startswith("/"):
+                    current = "/"
+                components = [c for c in link.split("/") if c and c != "."] + components
+                entry = None
+                continue
+            if components and not stat.S_ISDIR(entry[1].st_mode):
+                return None
+            current = posixpath.join(current, name)
+        if entry is None:
+            # a directory reached by "..", a symlink or the root
+            if current == "/":
+                top = self._dirs["/"][0]
+                return current, top, os.lstat(top)
+            entry = self._child(*posixpath.split(current))
+            if entry is None:
+                # e.g. whited out directory reached by ".."
+                return None
+        return (current,) + entry
+
+    def real_path(self, path):
+        """
+        Directories are merged from more layers, they have no single path
+        in the storage (IsADirectoryError is raised, use list_dir).
+
+        :param path: str, path in the image
+        :return: str, path of the file in the storage
+        """
+        entry = self.lookup(path)
+        if entry is None:
+            raise FileNotFoundError(f"{path} not found in the image")
+        if stat.S_ISDIR(entry[1].st_mode):
+            raise IsADirectoryError(f"{path} is a directory")
+        return entry[0]
+
+    def stat(self, path):
+        """
+        stat the file (symlinks are followed)
+
+        :param path: str
+        :return: os.stat_result
+        """
+        entry = self.lookup(path)
+        if entry is None:
+            raise FileNotFoundError(f"{path} not found in the image")
+        return entry[1]
+
+    def file_is_present(self, path):
+        """
+        Check if the file is present, raises IOError if the path is not a file.
+
+        :param path: str
+        :return: True if file exists, False if file does not exist
+        """
+        entry = self.lookup(path)
+        if entry is None:
+            return False
+        if not stat.S_ISREG(entry[1].st_mode):
+            raise OSError(f"{path} is not a file")
+        return True
+
+    def list_dir(self, path):
+        """
+        Get the names in the directory.
+
+        :param path: str
+        :return: list of str
+        """
+        resolved = self._resolve(path)
+        if resolved is None or not stat.S_ISDIR(resolved[2].st_mode):
+            raise NotADirectoryError(f"{path} is not a directory")
+        dir_path = resolved[0]
+        names = set()
+        for layer in self._dirs[dir_path]:
+            names.update(os.listdir(os.path.join(layer, dir_path.lstrip("/"))))
+        return sorted(
+            name
+            for name in names
+            if not name.startswith(WHITEOUT_PREFIX) and self._child(dir_path, name)
+        )
+
+
+def _matches_repository(name, repository):
+    """
+    :param name: str, name of the image in the storage, e.g. quay.io/example/app:1
+    :param repository: str, e.g. quay.io/example/app or example/app
+    :return: bool
+    """
+    name = name.split("@", 1)[0]
+    if ":" in name.rsplit("/", 1)[-1]:
+        name = name.rsplit(":", 1)[0]
+    return name == repository or name.endswith("/" + repository)
+
+
+def _lstat(path):
+    try:
+        return os.lstat(path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def _is_whiteout(st):
+    """overlayfs whiteout: character device 0/0"""
+    return stat.S_ISCHR(st.st_mode) and st.st_rdev == 0
+
+
+def _is_opaque(path):
+    if os.path.lexists(os.path.join(path, OPAQUE_WHITEOUT)):
+        return True
+    if not hasattr(os, "getxattr"):
+        return False
+    for attribute in OPAQUE_XATTRS:
+        try:
+            if os.getxattr(path, attribute, follow_symlinks=False) == b"y":
+                return True
+        except OSError:
+            pass
+    return False
@@ -0,0 +1,175 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Mounted podman images shared by the targets of the process.
+
+An image is mounted once and the mount is counted for every target using it
+(a target, the parent target of many targets, concurrent runs of the server).
+When nobody uses the mount, it is kept for the idle timeout in case another
+target of the same image comes, then the watchdog thread starts a thread unmounting it.
+The mounts left are unmounted when the process exits.
+"""
+
+import atexit
+import logging
+import threading
+import weakref
+
+from .watchdog import get_watchdog
+from ..core.constant import IMAGE_MOUNT_IDLE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+_MANAGERS = weakref.WeakSet()
+
+
+class _Mount:
+    def __init__(self):
+        self.path = None
+        self.refs = 0
+        self.idle_call = None
+        self.lock = threading.Lock()
+
+
+class ImageMounts:
+    """Reference-counted mounts of the images, keyed by the image ID."""
+
+    def __init__(self, podman, idle_timeout=IMAGE_MOUNT_IDLE_TIMEOUT):
+        """
+        :param podman: backend providing mount_image(image_id) -> path
+                       and unmount_image(image_id)
+        :param idle_timeout: float, seconds an unused mount is kept (0 to unmount at once)
+        """
+        self.podman = podman
+        self.idle_timeout = idle_timeout
+        self._mounts = {}
+        self._lock = threading.Lock()
+        _MANAGERS.add(self)
+
+    def acquire(self, image_id):
+        """
+        Mount the image (or reuse its mount).
+
+        :param image_id: str, ID of the image
+        :return: str, path to the mounted filesystem of the image
+        """
+        with self._lock:
+            mount = self._mounts.get(image_id)
+            if mount is None:
+                mount = self._mounts[image_id] = _Mount()
+            mount.refs += 1
+            if mount.idle_call is not None:
+                mount.idle_call.cancel()
+                mount.idle_call = None
+        with mount.lock:
+            if mount.path is None:
+                try:
+                    mount.path = self.podman.mount_image(image_id)
+                except Exception:
+                    self._forget(image_id, mount)
+                    raise
+                logger.debug("Image %s mounted at %s.", image_id, mount.path)
+            else:
+                logger.debug("Reusing the mount of the image %s.", image_id)
+            return mount.path
+
+    def release(self, image_id):
+        """
+        The image is not used by the caller anymore.
+
+        :param image_id: str, ID of the image
+        """
+        with self._lock:
+            mount = self._mounts.get(image_id)
+            if mount is None or mount.refs == 0:
+                return
+            mount.refs -= 1
+            if mount.refs:
+                return
+            if self.idle_timeout:
+                mount.idle_call = get_watchdog().schedule(
+                    self.idle_timeout, lambda: self._expire_later(image_id, mount)
+                )
+                return
+        self._unmount(image_id, mount)
+
+    def release_all(self):
+        """Unmount all the images (used or not)."""
+        with self._lock:
+            mounts, self._mounts = self._mounts, {}
+        for image_id, mount in mounts.items():
+            if mount.idle_call is not None:
+                mount.idle_call.cancel()
+            self._unmount(image_id, mount, force=True)
+
+    @property
+    def mounted(self):
+        """
+        :return: dict, image ID -> number of users of the mount
+        """
+        with self._lock:
+            return {image_id: m.refs for image_id, m in self._mounts.items()}
+
+    def _forget(self, image_id, mount):
+        with self._lock:
+            mount.refs -= 1
+            if mount.refs == 0 and self._mounts.get(image_id) is mount:
+                del self._mounts[image_id]
+
+    def _expire_later(self, image_id, mount):
+        """
+        Called on the watchdog thread: unmounting blocks on podman,
+        so it runs on its own thread not to delay the deadlines of the checks.
+        """
+        threading.Thread(
+            target=self._expire,
+            args=(image_id, mount),
+            name="colin-unmount",
+            daemon=True,
+        ).start()
+
+    def _expire(self, image_id, mount):
+        with self._lock:
+            if mount.refs or self._mounts.get(image_id) is not mount:
+                return
+        logger.debug("Mount of the image %s is idle.", image_id)
+        self._unmount(image_id, mount)
+
+    def _unmount(self, image_id, mount, force=False):
+        """
+        Unmount the image unless it was acquired again in the meantime.
+        The entry stays in place while the image is being unmounted,
+        so the concurrent acquire waits and mounts the image again.
+        """
+        with mount.lock:
+            with self._lock:
+                if mount.refs and not force:
+                    return
+            if mount.path is not None:
+                try:
+                    self.podman.unmount_image(image_id)
+                except Exception as ex:
+                    logger.warning("Cannot unmount the image %s: %r", image_id, ex)
+                mount.path = None
+            with self._lock:
+                if mount.refs == 0 and self._mounts.get(image_id) is mount:
+                    del self._mounts[image_id]
+
+
+@atexit.register
+def release_all_mounts():
+    """Unmount the images mounted by this process."""
+    for manager in list(_MANAGERS):
+        manager.release_all()
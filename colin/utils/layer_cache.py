@@ -0,0 +1,264 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Persistent cache of unpacked image layers keyed by their diffID
+(digest of the uncompressed layer).
+
+The root filesystem of an image is checked out from the cached layers
+using hardlinks, so the checkout must be treated as read-only.
+
+The checkouts hold a shared lock of the cache (also across processes),
+the layers are evicted only under the exclusive lock: by the checkout
+finishing when no other one runs, or by the `colin cache prune` command.
+"""
+import fcntl
+import json
+import logging
+import os
+import shutil
+import time
+from tempfile import mkdtemp
+
+from .cache import get_cache_dir
+from .oci import DigestReader, apply_layer, extract_layer, set_directory_attributes
+from ..core.constant import LAYER_CACHE_SIZE, LAYER_CACHE_SIZE_ENV
+from ..core.exceptions import ColinException
+
+logger = logging.getLogger(__name__)
+
+METADATA_FILE = "metadata.json"
+LAYER_DIR = "layer"
+LOCK_FILE = ".lock"
+# bumped when extract_layer changes the extracted layers,
+# the entries of the older versions are not used, only evicted
+LAYER_FORMAT = 2
+
+
+class CachedLayer:
+    """One unpacked layer in the cache."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, METADATA_FILE)) as fd:
+            metadata = json.load(fd)
+        self.diff_id = metadata["diff_id"]
+        self.size = metadata["size"]
+        self.lower_hardlinks = metadata.get("lower_hardlinks") or []
+        self.directories = metadata.get("directories") or {}
+
+    @property
+    def layer_path(self):
+        return os.path.join(self.path, LAYER_DIR)
+
+    @property
+    def last_used(self):
+        return os.stat(os.path.join(self.path, METADATA_FILE)).st_mtime
+
+    def touch(self):
+        os.utime(os.path.join(self.path, METADATA_FILE))
+
+
+class LayerCache:
+    def __init__(self, path=None, max_size=None):
+        """
+        :param path: str, cache directory (default is ~/.cache/colin/layers)
+        :param max_size: int, size budget in bytes; least recently used layers
+                         are evicted when exceeded (default is $COLIN_LAYER_CACHE_SIZE
+                         or 10 GiB)
+        """
+        self.path = path or get_cache_dir("layers")
+        if max_size is None:
+            max_size = int(os.environ.get(LAYER_CACHE_SIZE_ENV, LAYER_CACHE_SIZE))
+        self.max_size = max_size
+
+    def _entry_path(self, diff_id):
+        return os.path.join(self.path, f"{diff_id.replace(':', '-')}-v{LAYER_FORMAT}")
+
+    def get(self, diff_id):
+        """
+        Get the cached layer.
+
+        :param diff_id: str
+        :return: CachedLayer or None
+        """
+        entry_path = self._entry_path(diff_id)
+        try:
+            layer = CachedLayer(entry_path)
+        except (OSError, ValueError, KeyError):
+            return None
+        layer.touch()
+        return layer
+
+    def add(self, oci_image, descriptor, diff_id):
+        """
+        Unpack the layer of the image into the cache (if not already there).
+
+        :param oci_image: OciImage
+        :param descriptor: dict, layer descriptor
+        :param diff_id: str, digest of the uncompressed layer
+        :return: CachedLayer
+        """
+        layer = self.get(diff_id)
+        if layer is not None:
+            logger.debug("Layer %s found in the cache.", diff_id)
+            return layer
+
+        logger.debug("Unpacking layer %s into the cache.", diff_id)
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = mkdtemp(prefix="tmp-", dir=self.path)
+        try:
+            layer_path = os.path.join(tmp_path, LAYER_DIR)
+            os.mkdir(layer_path)
+            with oci_image.open_layer(descriptor) as fd:
+                reader = DigestReader(fd, diff_id)
+                size, lower_hardlinks, directories = extract_layer(reader, layer_path)
+                reader.verify()
+            with open(os.path.join(tmp_path, METADATA_FILE), "w") as fd:
+                json.dump(
+                    {
+                        "diff_id": diff_id,
+                        "size": size,
+                        "lower_hardlinks": lower_hardlinks,
+                        "directories": directories,
+                    },
+                    fd,
+                )
+            try:
+                os.rename(tmp_path, self._entry_path(diff_id))
+            except OSError:
+                # unpacked by someone else in the meantime
+                logger.debug("Layer %s already added to the cache.", diff_id)
+        finally:
+            if os.path.exists(tmp_path):
+                shutil.rmtree(tmp_path)
+        return CachedLayer(self._entry_path(diff_id))
+
+    def checkout(self, oci_image, rootfs):
+        """
+        Create the root filesystem of the image from the cached layers.
+
+        :param oci_image: OciImage
+        :param rootfs: str, directory to create
+        """
+        diff_ids = oci_image.diff_ids
+        if len(diff_ids) != len(oci_image.layers):
+            raise ColinException(
+                "Number of layers does not match the number of diffIDs."
+            )
+        os.makedirs(rootfs, exist_ok=True)
+        directories = {}
+        lease = self._lock(fcntl.LOCK_SH)
+        try:
+            for descriptor, diff_id in zip(oci_image.layers, diff_ids):
+                layer = self.add(oci_image, descriptor, diff_id)
+                apply_layer(layer.layer_path, rootfs, layer.lower_hardlinks)
+                directories.update(layer.directories)
+        finally:
+            os.close(lease)
+        set_directory_attributes(rootfs, directories)
+        lock = self._lock(fcntl.LOCK_EX | fcntl.LOCK_NB)
+        if lock is None:
+            logger.debug("Layer cache is being used, not pruning it.")
+            return
+        try:
+            self._prune(self.max_size, keep=diff_ids)
+        finally:
+            os.close(lock)
+
+    def _lock(self, operation):
+        """
+        :param operation: int, fcntl.flock operation
+        :return: int, file descriptor holding the lock, None if not locked (LOCK_NB)
+        """
+        os.makedirs(self.path, exist_ok=True)
+        fd = os.open(os.path.join(self.path, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, operation)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        except Exception:
+            os.close(fd)
+            raise
+        return fd
+
+    def entries(self):
+        """
+        Get all the cached layers.
+
+        :return: list of CachedLayer (least recently used first)
+        """
+        if not os.path.isdir(self.path):
+            return []
+        result = []
+        for name in os.listdir(self.path):
+            if name.startswith("tmp-") or name == LOCK_FILE:
+                continue
+            try:
+                result.append(CachedLayer(os.path.join(self.path, name)))
+            except (OSError, ValueError, KeyError):
+                logger.debug("Invalid cache entry %s.", name)
+        return sorted(result, key=lambda layer: layer.last_used)
+
+    def stats(self):
+        """
+        Get the statistics of the cache.
+
+        :return: dict
+        """
+        entries = self.entries()
+        return {
+            "path": self.path,
+            "layers": len(entries),
+            "size": sum(layer.size for layer in entries),
+            "max_size": self.max_size,
+        }
+
+    def prune(self, max_size=None, keep=()):
+        """
+        Evict the least recently used layers until the cache fits the size budget.
+
+        :param max_size: int, size budget in bytes (default is self.max_size)
+        :param keep: list of diffIDs that cannot be evicted
+        :return: list of evicted diffIDs
+        """
+        max_size = self.max_size if max_size is None else max_size
+        # waits for the running checkouts
+        lock = self._lock(fcntl.LOCK_EX)
+        try:
+            return self._prune(max_size, keep)
+        finally:
+            os.close(lock)
+
+    def _prune(self, max_size, keep):
+        entries = self.entries()
+        total = sum(layer.size for layer in entries)
+        evicted = []
+        for layer in entries:
+            if total <= max_size:
+                break
+            if layer.diff_id in keep:
+                continue
+            logger.debug("Evicting layer %s from the cache.", layer.diff_id)
+            # rename first so nobody picks up a half-removed layer
+            trash = os.path.join(self.path, f"tmp-evicted-{time.time()}")
+            try:
+                os.rename(layer.path, trash)
+            except OSError:
+                continue
+            shutil.rmtree(trash, ignore_errors=True)
+            total -= layer.size
+            evicted.append(layer.diff_id)
+        return evicted
@@ -0,0 +1,134 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Timing of the checks and of the phases of the run.
+
+The counters of the check are bound to the thread running the check,
+so the checks running in parallel do not mix their numbers.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+from .tracing import span
+
+_local = threading.local()
+
+
+class CheckMetrics:
+    """What one check cost."""
+
+    def __init__(self):
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.tool_calls = 0
+        self.bytes_read = 0
+
+    def to_dict(self):
+        return {
+            "wall_time": round(self.wall_time, 6),
+            "cpu_time": round(self.cpu_time, 6),
+            "tool_calls": self.tool_calls,
+            "bytes_read": self.bytes_read,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        :param data: dict created by to_dict
+        :return: CheckMetrics
+        """
+        metrics = cls()
+        metrics.wall_time = data["wall_time"]
+        metrics.cpu_time = data["cpu_time"]
+        metrics.tool_calls = data["tool_calls"]
+        metrics.bytes_read = data["bytes_read"]
+        return metrics
+
+
+@contextmanager
+def measure():
+    """
+    Measure the code running in the current thread.
+
+    :return: context manager providing CheckMetrics (filled when the block ends)
+    """
+    metrics = CheckMetrics()
+    previous = getattr(_local, "metrics", None)
+    _local.metrics = metrics
+    start_wall = time.perf_counter()
+    start_cpu = time.thread_time()
+    try:
+        yield metrics
+    finally:
+        metrics.wall_time = time.perf_counter() - start_wall
+        metrics.cpu_time = time.thread_time() - start_cpu
+        _local.metrics = previous
+
+
+def count_tool_call():
+    """Record the invocation of an external tool (e.g. podman)."""
+    metrics = getattr(_local, "metrics", None)
+    if metrics is not None:
+        metrics.tool_calls += 1
+
+
+def count_bytes_read(size):
+    """
+    Record the data read from the target.
+
+    :param size: int, number of bytes
+    """
+    metrics = getattr(_local, "metrics", None)
+    if metrics is not None and size:
+        metrics.bytes_read += size
+
+
+class RunPhases:
+    """Wall time spent in the phases of the run (ruleset load, target preparation, ...)."""
+
+    def __init__(self):
+        self._phases = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        """
+        :param name: str, name of the phase
+        :param seconds: float, added to the time already spent in the phase
+        """
+        with self._lock:
+            self._phases[name] = self._phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Measure the block as (a part of) the phase (and trace it).
+
+        :param name: str, name of the phase
+        """
+        start = time.perf_counter()
+        try:
+            with span(name, "phase"):
+                yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def to_dict(self):
+        """
+        :return: dict (name of the phase -> seconds), in the order of the phases
+        """
+        with self._lock:
+            return {name: round(s, 6) for name, s in self._phases.items()}
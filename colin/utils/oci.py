@@ -0,0 +1,1163 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Read images stored in the OCI image layout directly, without skopeo/umoci.
+
+https://github.com/opencontainers/image-spec/blob/main/image-layout.md
+"""
+import fnmatch
+import gzip
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import posixpath
+import re
+import shutil
+import stat
+import tarfile
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from ..core.constant import (
+    UNPACK_MEMORY,
+    UNPACK_MEMORY_ENV,
+    UNPACK_SCRATCH_SIZE,
+    UNPACK_SCRATCH_SIZE_ENV,
+    UNPACK_WORKER_MEMORY,
+)
+from ..core.exceptions import ColinException
+
+logger = logging.getLogger(__name__)
+
+REF_NAME_ANNOTATION = "org.opencontainers.image.ref.name"
+
+INDEX_MEDIA_TYPES = (
+    "application/vnd.oci.image.index.v1+json",
+    "application/vnd.docker.distribution.manifest.list.v2+json",
+)
+
+DIGEST_REGEX = re.compile(
+    r"^(?P<algorithm>[a-z0-9]+(?:[+._-][a-z0-9]+)*):(?P<hex>[a-zA-Z0-9=_-]+)$"
+)
+
+WHITEOUT_PREFIX = ".wh."
+OPAQUE_WHITEOUT = ".wh..wh..opq"
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+# used when the zstd frame does not say its size
+ZSTD_RATIO_ESTIMATE = 4
+
+MAX_SYMLINK_HOPS = 40
+
+GO_ARCHITECTURES = {
+    "x86_64": "amd64",
+    "aarch64": "arm64",
+    "armv7l": "arm",
+    "i686": "386",
+}
+
+
+class OciImage:
+    """
+    Image referenced by name in the OCI layout directory:
+    index.json -> manifest -> config blob
+    """
+
+    def __init__(self, layout_path, ref_name):
+        """
+        :param layout_path: str, path to the OCI layout directory
+        :param ref_name: str, value of the org.opencontainers.image.ref.name annotation
+        """
+        self.layout_path = layout_path
+        self.ref_name = ref_name
+        self._manifest_descriptor = None
+        self._manifest = None
+        self._config = None
+
+    def blob_path(self, digest):
+        """
+        Get the path of the blob in the layout.
+
+        :param digest: str, e.g. sha256:abc...
+        :return: str
+        """
+        match = DIGEST_REGEX.match(digest or "")
+        if not match:
+            raise ColinException(f"Invalid digest '{digest}' in the oci layout.")
+        return os.path.join(
+            self.layout_path, "blobs", match.group("algorithm"), match.group("hex")
+        )
+
+    def open_layer(self, descriptor):
+        """
+        Open the layer blob for reading of the uncompressed tar stream.
+
+        :param descriptor: dict, layer descriptor from the manifest
+        :return: file object (binary)
+        """
+        return open_layer_blob(self.blob_path(descriptor["digest"]))
+
+    def read_json_blob(self, digest):
+        return self._read_json(self.blob_path(digest))
+
+    @property
+    def manifest_descriptor(self):
+        """descriptor of the image manifest (mediaType, digest, size)"""
+        if self._manifest_descriptor is None:
+            self._resolve_manifest()
+        return self._manifest_descriptor
+
+    @property
+    def manifest_digest(self):
+        return self.manifest_descriptor["digest"]
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            self._resolve_manifest()
+        return self._manifest
+
+    @property
+    def config(self):
+        """image configuration (application/vnd.oci.image.config.v1+json)"""
+        if self._config is None:
+            self._config = self.read_json_blob(self.manifest["config"]["digest"])
+        return self._config
+
+    @property
+    def layers(self):
+        """list of layer descriptors, from the base layer to the top one"""
+        return self.manifest.get("layers") or []
+
+    @property
+    def diff_ids(self):
+        """digests of the uncompressed layers, same order as layers"""
+        return (self.config.get("rootfs") or {}).get("diff_ids") or []
+
+    @property
+    def labels(self):
+        return (self.config.get("config") or {}).get("Labels") or {}
+
+    @property
+    def config_metadata(self):
+        """Image metadata in the same shape as the output of `podman inspect`."""
+        return config_metadata(
+            self.config,
+            image_id=self.manifest["config"]["digest"],
+            digest=self.manifest_digest,
+        )
+
+    def _resolve_manifest(self):
+        index = self._read_json(os.path.join(self.layout_path, "index.json"))
+        descriptor = self._find_ref(index.get("manifests") or [])
+        manifest = self.read_json_blob(descriptor["digest"])
+        # nested index (multi-arch image), pick the manifest for our platform
+        while (
+            descriptor.get("mediaType") in INDEX_MEDIA_TYPES
+            or manifest.get("mediaType") in INDEX_MEDIA_TYPES
+        ):
+            descriptor = _select_platform(manifest.get("manifests") or [])
+            manifest = self.read_json_blob(descriptor["digest"])
+        logger.debug("Image '%s' resolved to %s.", self.ref_name, descriptor["digest"])
+        self._manifest_descriptor = descriptor
+        self._manifest = manifest
+
+    def _find_ref(self, manifests):
+        found = [
+            m
+            for m in manifests
+            if (m.get("annotations") or {}).get(REF_NAME_ANNOTATION) == self.ref_name
+        ]
+        if not found and not self.ref_name and len(manifests) == 1:
+            found = manifests
+        if not found:
+            raise ColinException(
+                f"Image '{self.ref_name}' not found in the oci layout '{self.layout_path}'."
+            )
+        return found[0]
+
+    @staticmethod
+    def _read_json(path):
+        try:
+            with open(path) as fd:
+                return json.load(fd)
+        except (OSError, ValueError) as ex:
+            raise ColinException(f"Cannot read oci layout file '{path}': {ex!r}")
+
+
+def config_metadata(config, image_id, digest=None):
+    """
+    Image metadata in the same shape as the output of `podman inspect`.
+
+    The "Env" and "ContainerConfig" keys are kept for the checks written
+    for the docker inspect output.
+
+    :param config: dict, image configuration (application/vnd.oci.image.config.v1+json)
+    :param image_id: str, ID of the image
+    :param digest: str, digest of the image manifest
+    :return: dict
+    """
+    image_config = config.get("config") or {}
+    return {
+        "Id": image_id,
+        "Digest": digest,
+        "Created": config.get("created"),
+        "Author": config.get("author"),
+        "Architecture": config.get("architecture"),
+        "Os": config.get("os"),
+        "Config": image_config,
+        "ContainerConfig": image_config,
+        "Labels": image_config.get("Labels"),
+        "Env": image_config.get("Env"),
+        "User": image_config.get("User", ""),
+        "RootFS": config.get("rootfs"),
+        "History": config.get("history") or [],
+    }
+
+
+def _select_platform(manifests):
+    if not manifests:
+        raise ColinException("Empty image index in the oci layout.")
+    machine = platform.machine()
+    arch = GO_ARCHITECTURES.get(machine, machine)
+    for m in manifests:
+        m_platform = m.get("platform") or {}
+        if m_platform.get("os") == "linux" and m_platform.get("architecture") == arch:
+            return m
+    return manifests[0]
+
+
+def open_layer_blob(path):
+    """
+    Open the layer blob (compressed or not) as the uncompressed tar stream.
+
+    zstd needs the zstandard module (optional dependency).
+
+    :param path: str, path to the blob
+    :return: file object (binary)
+    """
+    fd = open(path, "rb")
+    magic = fd.read(len(ZSTD_MAGIC))
+    fd.seek(0)
+    if magic.startswith(GZIP_MAGIC):
+        return gzip.GzipFile(fileobj=fd, mode="rb")
+    if magic == ZSTD_MAGIC:
+        try:
+            import zstandard
+        except ImportError:
+            fd.close()
+            raise ColinException(
+                "The zstandard module is needed for the zstd compressed layers."
+            )
+        return zstandard.ZstdDecompressor().stream_reader(fd)
+    return fd
+
+
+def uncompressed_size(path):
+    """
+    Estimate the size of the uncompressed layer from the blob
+    (gzip trailer, zstd frame header), without decompressing it.
+
+    :param path: str, path to the blob
+    :return: int, bytes
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as fd:
+        header = fd.read(18)
+        if header.startswith(GZIP_MAGIC) and size >= 4:
+            fd.seek(-4, os.SEEK_END)
+            # ISIZE is modulo 2^32 (and of the last member only)
+            return max(int.from_bytes(fd.read(4), "little"), size)
+    if header.startswith(ZSTD_MAGIC):
+        try:
+            import zstandard
+
+            content_size = zstandard.frame_content_size(header)
+        except (ImportError, zstandard.ZstdError):
+            content_size = -1
+        if content_size >= 0:
+            return max(content_size, size)
+        return size * ZSTD_RATIO_ESTIMATE
+    return size
+
+
+def whiteout_target(name):
+    """
+    :param name: str, file name, e.g. .wh.passwd
+    :return: str, name of the file hidden by the whiteout (passwd),
+             None when the name is not a (valid) whiteout of a single file
+    """
+    if name == OPAQUE_WHITEOUT or not name.startswith(WHITEOUT_PREFIX):
+        return None
+    hidden = name.replace(WHITEOUT_PREFIX, "", 1)
+    if hidden in ("", ".", "..") or "/" in hidden:
+        return None
+    return hidden
+
+
+def normalize_path(path):
+    """
+    Normalize the path inside the image, e.g. './usr//bin/' -> '/usr/bin'
+
+    :param path: str
+    :return: str, absolute path
+    """
+    return posixpath.normpath(posixpath.join("/", path)).replace("//", "/")
+
+
+class FileEntry:
+    """File in the image filesystem as described by the layer tar header."""
+
+    DIRECTORY = "directory"
+    FILE = "file"
+    SYMLINK = "symlink"
+    OTHER = "other"
+
+    def __init__(
+        self, path, type, mode=0o755, size=0, uid=0, gid=0, mtime=0, linkname=None
+    ):
+        self.path = path
+        self.type = type
+        self.mode = mode
+        self.size = size
+        self.uid = uid
+        self.gid = gid
+        self.mtime = mtime
+        self.linkname = linkname
+
+    @classmethod
+    def from_tarinfo(cls, path, tarinfo):
+        if tarinfo.isdir():
+            type = cls.DIRECTORY
+        elif tarinfo.isreg():
+            type = cls.FILE
+        elif tarinfo.issym():
+            type = cls.SYMLINK
+        else:
+            type = cls.OTHER
+        return cls(
+            path=path,
+            type=type,
+            mode=tarinfo.mode,
+            size=tarinfo.size,
+            uid=tarinfo.uid,
+            gid=tarinfo.gid,
+            mtime=tarinfo.mtime,
+            linkname=tarinfo.linkname or None,
+        )
+
+    def stat(self):
+        """
+        Get the stat-like structure for the entry.
+
+        :return: os.stat_result
+        """
+        file_type = {
+            self.DIRECTORY: stat.S_IFDIR,
+            self.FILE: stat.S_IFREG,
+            self.SYMLINK: stat.S_IFLNK,
+        }.get(self.type, 0)
+        return os.stat_result(
+            (
+                file_type | stat.S_IMODE(self.mode),
+                0,
+                0,
+                1,
+                self.uid,
+                self.gid,
+                self.size,
+                self.mtime,
+                self.mtime,
+                self.mtime,
+            )
+        )
+
+    def __repr__(self):
+        return f"FileEntry({self.path!r}, {self.type})"
+
+
+class FilesystemIndex:
+    """
+    Paths of the image filesystem built only from the tar headers of the layers
+    (whiteouts and opaque directories are applied), nothing is extracted.
+    """
+
+    def __init__(self):
+        self._entries = {"/": FileEntry("/", FileEntry.DIRECTORY)}
+        self._children = {"/": set()}
+
+    @classmethod
+    def from_image(cls, oci_image):
+        """
+        Build the index for all the layers of the OciImage.
+
+        :param oci_image: OciImage
+        :return: FilesystemIndex
+        """
+        index = cls()
+        for descriptor in oci_image.layers:
+            logger.debug("Indexing layer %s.", descriptor["digest"])
+            with oci_image.open_layer(descriptor) as fd:
+                index.add_layer(fd)
+        return index
+
+    def add_layer(self, fileobj):
+        """
+        Apply the layer on top of the already indexed ones.
+
+        :param fileobj: file object with the uncompressed layer tarball
+        """
+        whiteouts = []
+        opaque_dirs = []
+        layer_entries = {}
+        hardlinks = []
+        seekable = hasattr(fileobj, "seekable") and fileobj.seekable()
+        # for seekable (uncompressed) streams, the file content is skipped via seek
+        with tarfile.open(fileobj=fileobj, mode="r:" if seekable else "r|") as tar:
+            for tarinfo in tar:
+                path = normalize_path(tarinfo.name)
+                parent, name = posixpath.split(path)
+                if name == OPAQUE_WHITEOUT:
+                    opaque_dirs.append(parent)
+                elif name.startswith(WHITEOUT_PREFIX):
+                    hidden = whiteout_target(name)
+                    if hidden is None:
+                        logger.debug("Skipping invalid whiteout %s.", path)
+                        continue
+                    whiteouts.append(posixpath.join(parent, hidden))
+                elif tarinfo.islnk():
+                    hardlinks.append((path, normalize_path(tarinfo.linkname)))
+                elif path != "/":
+                    layer_entries[path] = FileEntry.from_tarinfo(path, tarinfo)
+
+        # whiteouts hide the content of the lower layers only
+        for path in opaque_dirs:
+            for child in list(self._children.get(path, ())):
+                self._remove(child)
+        for path in whiteouts:
+            self._remove(path)
+        for path, entry in layer_entries.items():
+            self._add(entry)
+        for path, link_target in hardlinks:
+            target_entry = self._entries.get(link_target)
+            if target_entry is None:
+                logger.debug("Target of the hardlink %s not found.", path)
+                continue
+            self._add(
+                FileEntry(
+                    path=path,
+                    type=target_entry.type,
+                    mode=target_entry.mode,
+                    size=target_entry.size,
+                    uid=target_entry.uid,
+                    gid=target_entry.gid,
+                    mtime=target_entry.mtime,
+                    # hardlink: the path it links to
+                    linkname=target_entry.linkname or link_target,
+                )
+            )
+
+    def _add(self, entry):
+        parent = posixpath.dirname(entry.path)
+        if parent not in self._entries or self._entries[parent].type != entry.DIRECTORY:
+            # parent directories are not required to be present in the layer
+            self._add(FileEntry(parent, FileEntry.DIRECTORY))
+        previous = self._entries.get(entry.path)
+        if previous is not None and (
+            previous.type != entry.DIRECTORY or entry.type != entry.DIRECTORY
+        ):
+            self._remove(entry.path)
+        self._entries[entry.path] = entry
+        self._children[parent].add(entry.path)
+        if entry.type == entry.DIRECTORY:
+            self._children.setdefault(entry.path, set())
+
+    def _remove(self, path):
+        if path not in self._entries or path == "/":
+            return
+        for child in list(self._children.get(path, ())):
+            self._remove(child)
+        self._children.pop(path, None)
+        del self._entries[path]
+        self._children[posixpath.dirname(path)].discard(path)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        """all the entries (FileEntry), in no particular order"""
+        return iter(list(self._entries.values()))
+
+    def __contains__(self, path):
+        return self.lookup(path) is not None
+
+    def list_dir(self, path):
+        """
+        Get the names in the directory.
+
+        :param path: str
+        :return: list of str
+        """
+        entry = self.lookup(path)
+        if entry is None or entry.type != FileEntry.DIRECTORY:
+            raise NotADirectoryError(f"{path} is not a directory")
+        return sorted(posixpath.basename(p) for p in self._children[entry.path])
+
+    def lookup(self, path, follow_symlinks=True):
+        """
+        Find the entry for the path, symlinks are resolved inside the image.
+
+        :param path: str
+        :param follow_symlinks: bool, resolve the last component as well
+        :return: FileEntry or None
+        """
+        components = [c for c in normalize_path(path).split("/") if c]
+        current = "/"
+        hops = 0
+        while components:
+            name = components.pop(0)
+            if name == "..":
+                current = posixpath.dirname(current)
+                continue
+            candidate = posixpath.join(current, name)
+            entry = self._entries.get(candidate)
+            if entry is None:
+                return None
+            if entry.type == FileEntry.SYMLINK and (components or follow_symlinks):
+                hops += 1
+                if hops > MAX_SYMLINK_HOPS:
+                    return None
+                link = entry.linkname or ""
+                if link.startswith("/"):
+                    current = "/"
+                components = [c for c in link.split("/") if c and c != "."] + components
+                continue
+            if components and entry.type != FileEntry.DIRECTORY:
+                return None
+            current = candidate
+        return self._entries[current]
+
+    def stat(self, path):
+        """
+        stat-like information about the file (symlinks are followed)
+
+        :param path: str
+        :return: os.stat_result
+        """
+        entry = self.lookup(path)
+        if entry is None:
+            raise FileNotFoundError(f"{path} not found in the image")
+        return entry.stat()
+
+    def file_is_present(self, path):
+        """
+        Check if the file is present, raises IOError if the path is not a file.
+
+        :param path: str
+        :return: True if file exists, False if file does not exist
+        """
+        entry = self.lookup(path)
+        if entry is None:
+            return False
+        if entry.type != FileEntry.FILE:
+            raise OSError(f"{path} is not a file")
+        return True
+
+
+class DigestReader:
+    """Compute the digest of the stream while it is being read."""
+
+    def __init__(self, fileobj, digest):
+        """
+        :param fileobj: file object to read from
+        :param digest: str, expected digest, e.g. sha256:abc...
+        """
+        match = DIGEST_REGEX.match(digest or "")
+        if not match:
+            raise ColinException(f"Invalid digest '{digest}'.")
+        self.fileobj = fileobj
+        self.expected = digest
+        self._hash = hashlib.new(match.group("algorithm"))
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self._hash.update(data)
+        return data
+
+    def verify(self):
+        """read the rest of the stream and raise ColinException on digest mismatch"""
+        while self.read(64 * 1024):
+            pass
+        algorithm = self.expected.split(":", 1)[0]
+        actual = f"{algorithm}:{self._hash.hexdigest()}"
+        if actual != self.expected:
+            raise ColinException(
+                f"Digest mismatch: expected {self.expected}, got {actual}."
+            )
+
+
+def extract_layer(fileobj, dest, path_filter=None):
+    """
+    Extract the layer tarball into the directory, without applying whiteouts:
+    the whiteout files are kept so the layer can be applied later (see apply_layer).
+
+    The files keep the exact modes (setuid, setgid and sticky bits included),
+    the directories get rwx for the owner till the whole image is unpacked,
+    their exact modes and owners are returned (see set_directory_attributes).
+    The owners are kept only when running as root, otherwise the owners
+    are in the tar headers (see FilesystemIndex). Devices and fifos are not extracted,
+    the parent directories replace the symlinks on the way (see _prepare_parent).
+
+    Hardlinks to the files of the lower layers cannot be created in the layer
+    directory, they are returned and need to be passed to apply_layer.
+
+    :param fileobj: file object with the uncompressed layer tarball
+    :param dest: str, existing directory
+    :param path_filter: PathFilter, extract only the matching paths
+                        (whiteouts and symlinks are always extracted)
+    :return: (int, list, dict), size of the extracted regular files,
+             list of (path, target) hardlinks to the lower layers
+             and the directories (path -> (mode, uid, gid))
+    """
+    size = 0
+    lower_hardlinks = []
+    directories = {}
+    with tarfile.open(fileobj=fileobj, mode="r|") as tar:
+        for tarinfo in tar:
+            relative_path = normalize_path(tarinfo.name).lstrip("/")
+            if not relative_path:
+                continue
+            name = os.path.basename(relative_path)
+            if (
+                name.startswith(WHITEOUT_PREFIX)
+                and name != OPAQUE_WHITEOUT
+                and whiteout_target(name) is None
+            ):
+                logger.debug("Skipping invalid whiteout %s.", relative_path)
+                continue
+            if (
+                path_filter is not None
+                and not tarinfo.issym()
+                and not os.path.basename(relative_path).startswith(WHITEOUT_PREFIX)
+                and not path_filter.matches("/" + relative_path)
+            ):
+                continue
+            path = os.path.join(dest, relative_path)
+            _prepare_parent(dest, relative_path)
+            if tarinfo.isdir():
+                if not os.path.isdir(path) or os.path.islink(path):
+                    _remove_path(path)
+                    os.mkdir(path)
+                os.chmod(path, stat.S_IMODE(tarinfo.mode) | stat.S_IRWXU)
+                directories[relative_path] = (
+                    stat.S_IMODE(tarinfo.mode),
+                    tarinfo.uid,
+                    tarinfo.gid,
+                )
+                continue
+            _remove_path(path)
+            if tarinfo.isreg():
+                with open(path, "wb") as fd:
+                    shutil.copyfileobj(tar.extractfile(tarinfo), fd)
+                # chown clears the setuid bits
+                _set_owner(path, tarinfo.uid, tarinfo.gid)
+                os.chmod(path, stat.S_IMODE(tarinfo.mode))
+                os.utime(path, (tarinfo.mtime, tarinfo.mtime))
+                size += tarinfo.size
+            elif tarinfo.issym():
+                os.symlink(tarinfo.linkname, path)
+                _set_owner(path, tarinfo.uid, tarinfo.gid)
+            elif tarinfo.islnk():
+                link_name = normalize_path(tarinfo.linkname).lstrip("/")
+                link_target = _file_in_root(dest, link_name)
+                if link_target is not None:
+                    os.link(link_target, path, follow_symlinks=False)
+                else:
+                    lower_hardlinks.append((relative_path, link_name))
+            else:
+                logger.debug("Skipping special file %s.", path)
+    return size, lower_hardlinks, directories
+
+
+def apply_layer(layer_dir, rootfs, lower_hardlinks=(), hardlink=True):
+    """
+    Apply the extracted layer on top of the root filesystem (whiteouts included).
+    The directories stay writable for the owner, call set_directory_attributes
+    when all the layers are applied.
+
+    :param layer_dir: str, directory with the layer extracted by extract_layer
+    :param rootfs: str, directory with the lower layers already applied
+    :param lower_hardlinks: list of (path, target) hardlinks returned by extract_layer
+    :param hardlink: bool, hardlink the files instead of copying (falls back to copy)
+    """
+    for root, dirs, files in os.walk(layer_dir):
+        relative_dir = os.path.relpath(root, layer_dir)
+        if relative_dir == ".":
+            target_dir = rootfs
+        else:
+            _prepare_parent(rootfs, os.path.join(relative_dir, "."))
+            target_dir = os.path.join(rootfs, relative_dir)
+
+        if OPAQUE_WHITEOUT in files:
+            for name in os.listdir(target_dir):
+                _remove_path(os.path.join(target_dir, name))
+        for name in files:
+            hidden = whiteout_target(name)
+            if hidden is None:
+                continue
+            hidden_path = os.path.join(target_dir, hidden)
+            if _is_inside(rootfs, hidden_path):
+                _remove_path(hidden_path)
+
+        for name in dirs + files:
+            if name.startswith(WHITEOUT_PREFIX):
+                continue
+            source = os.path.join(root, name)
+            destination = os.path.join(target_dir, name)
+            source_stat = os.lstat(source)
+            if stat.S_ISDIR(source_stat.st_mode):
+                if not os.path.isdir(destination) or os.path.islink(destination):
+                    _remove_path(destination)
+                    os.mkdir(destination)
+                    os.chmod(destination, stat.S_IMODE(source_stat.st_mode))
+                continue
+            _remove_path(destination)
+            if stat.S_ISLNK(source_stat.st_mode):
+                os.symlink(os.readlink(source), destination)
+                _set_owner(destination, source_stat.st_uid, source_stat.st_gid)
+            elif hardlink:
+                try:
+                    os.link(source, destination)
+                except OSError:
+                    _copy_file(source, destination, source_stat)
+            else:
+                _copy_file(source, destination, source_stat)
+
+    for path, link_target in lower_hardlinks:
+        source = _file_in_root(rootfs, link_target)
+        if source is None:
+            logger.debug("Target of the hardlink %s not found.", path)
+            continue
+        destination = os.path.join(rootfs, path)
+        _prepare_parent(rootfs, path)
+        _remove_path(destination)
+        os.link(source, destination, follow_symlinks=False)
+
+
+def set_directory_attributes(rootfs, directories):
+    """
+    Set the exact modes and owners of the directories when all the layers are applied.
+
+    :param rootfs: str, directory with the layers applied
+    :param directories: dict, path -> (mode, uid, gid) returned by extract_layer
+                        (merged from the lower layers to the upper ones)
+    """
+    # the subdirectories first, their parents can lose the permissions
+    for relative_path in sorted(directories, key=lambda p: p.count("/"), reverse=True):
+        path = _directory_in_root(rootfs, relative_path)
+        if path is not None:
+            mode, uid, gid = directories[relative_path]
+            _set_owner(path, uid, gid)
+            os.chmod(path, mode)
+
+
+def remove_tree(path):
+    """
+    Remove the directory with the unpacked image (shutil.rmtree),
+    also the directories the owner cannot write to (see set_directory_attributes).
+
+    :param path: str
+    """
+    if os.geteuid() != 0:
+        for root, dirs, _ in os.walk(path):
+            for name in dirs:
+                dir_path = os.path.join(root, name)
+                dir_stat = os.lstat(dir_path)
+                if stat.S_ISDIR(dir_stat.st_mode) and (
+                    dir_stat.st_mode & stat.S_IRWXU != stat.S_IRWXU
+                ):
+                    os.chmod(dir_path, stat.S_IMODE(dir_stat.st_mode) | stat.S_IRWXU)
+    shutil.rmtree(path)
+
+
+class PathFilter:
+    """
+    Paths of the image filesystem: files, directories (with all their content,
+    given with the trailing slash) and glob patterns (fnmatch, * matches /).
+    """
+
+    def __init__(self, paths=()):
+        """
+        :param paths: iterable of str
+        """
+        self.files = set()
+        self.directories = set()
+        self.patterns = set()
+        self.add(*paths)
+
+    def add(self, *paths):
+        """
+        :param paths: str, file, directory ending with "/" or glob pattern
+        """
+        for path in paths:
+            if any(c in path for c in "*?["):
+                self.patterns.add(posixpath.join("/", path))
+            elif path.endswith("/"):
+                self.directories.add(normalize_path(path))
+            else:
+                self.files.add(normalize_path(path))
+
+    def matches(self, path):
+        """
+        :param path: str, absolute and normalized path
+        :return: bool
+        """
+        if path in self.files or path in self.directories:
+            return True
+        parent = posixpath.dirname(path)
+        while parent != "/":
+            if parent in self.directories:
+                return True
+            parent = posixpath.dirname(parent)
+        if "/" in self.directories:
+            return True
+        return any(fnmatch.fnmatchcase(path, p) for p in self.patterns)
+
+    def resolve(self, fs_index):
+        """
+        Add what the paths point to in the image: targets of the symlinks
+        on the way and of the hardlinks.
+
+        :param fs_index: FilesystemIndex of the image
+        :return: PathFilter
+        """
+        resolved = PathFilter()
+        resolved.files = set(self.files)
+        resolved.directories = set(self.directories)
+        resolved.patterns = set(self.patterns)
+        for path in self.files | self.directories:
+            entry = fs_index.lookup(path)
+            if entry is None:
+                continue
+            if entry.type == FileEntry.DIRECTORY:
+                resolved.directories.add(entry.path)
+            else:
+                resolved.files.add(entry.path)
+        for entry in fs_index:
+            if (
+                entry.type == FileEntry.FILE
+                and entry.linkname
+                and resolved.matches(entry.path)
+            ):
+                resolved.files.add(normalize_path(entry.linkname))
+        return resolved
+
+    def __repr__(self):
+        return (
+            f"PathFilter(files={sorted(self.files)}, "
+            f"directories={sorted(self.directories)}, patterns={sorted(self.patterns)})"
+        )
+
+
+def unpack_image(oci_image, rootfs, path_filter=None, jobs=None, scratch_size=None):
+    """
+    Unpack the image filesystem in the process: the layers are decompressed and
+    extracted into staging directories next to rootfs by the pool of processes
+    (shared by the unpacks of this process), then applied in order.
+
+    The files keep their modes, the owners are kept when running as root,
+    see extract_layer.
+
+    :param oci_image: OciImage
+    :param rootfs: str, directory to create
+    :param path_filter: PathFilter, unpack only the matching paths
+    :param jobs: int, number of layers extracted at once (default is get_unpack_jobs())
+    :param scratch_size: int, disk space for the layers extracted but not applied yet
+                         (default is get_unpack_scratch_size())
+    """
+    diff_ids = oci_image.diff_ids
+    if len(diff_ids) != len(oci_image.layers):
+        raise ColinException("Number of layers does not match the number of diffIDs.")
+    os.makedirs(rootfs, exist_ok=True)
+    scratch_dir = os.path.dirname(rootfs)
+    blobs = [oci_image.blob_path(d["digest"]) for d in oci_image.layers]
+    jobs = min(jobs or get_unpack_jobs(), len(blobs))
+    directories = {}
+    if jobs <= 1:
+        for blob, diff_id in zip(blobs, diff_ids):
+            staging = tempfile.mkdtemp(prefix="layer-", dir=scratch_dir)
+            try:
+                lower_hardlinks, layer_directories = _extract_blob(
+                    blob, diff_id, staging, path_filter
+                )
+                apply_layer(staging, rootfs, lower_hardlinks)
+                directories.update(layer_directories)
+            finally:
+                shutil.rmtree(staging)
+        set_directory_attributes(rootfs, directories)
+        return
+
+    if scratch_size is None:
+        scratch_size = get_unpack_scratch_size(scratch_dir)
+    sizes = [uncompressed_size(blob) for blob in blobs]
+    logger.debug(
+        "Unpacking %d layers, %d at once (scratch space %d B).",
+        len(blobs),
+        jobs,
+        scratch_size,
+    )
+    pool = _get_unpack_pool(jobs)
+    stagings = []
+    futures = []
+    try:
+        scratch_used = 0
+        for index in range(len(blobs)):
+            # extract ahead while the unapplied layers fit in the scratch space
+            while len(futures) < len(blobs) and (
+                len(futures) == index
+                or (
+                    len(futures) - index < jobs
+                    and scratch_used + sizes[len(futures)] <= scratch_size
+                )
+            ):
+                submitted = len(futures)
+                staging = tempfile.mkdtemp(prefix="layer-", dir=scratch_dir)
+                stagings.append(staging)
+                futures.append(
+                    pool.submit(
+                        _extract_blob,
+                        blobs[submitted],
+                        diff_ids[submitted],
+                        staging,
+                        path_filter,
+                    )
+                )
+                scratch_used += sizes[submitted]
+            lower_hardlinks, layer_directories = futures[index].result()
+            apply_layer(stagings[index], rootfs, lower_hardlinks)
+            directories.update(layer_directories)
+            shutil.rmtree(stagings[index])
+            scratch_used -= sizes[index]
+        set_directory_attributes(rootfs, directories)
+    except BrokenProcessPool as ex:
+        _discard_unpack_pool(pool)
+        raise ColinException(f"The process unpacking the layers failed: {ex!r}")
+    finally:
+        for future in futures:
+            future.cancel()
+        # the running extractions write into the staging directories
+        wait(futures)
+        for staging in stagings:
+            shutil.rmtree(staging, ignore_errors=True)
+
+
+def _extract_blob(blob, diff_id, staging, path_filter):
+    """extract the layer blob (run in the worker processes of unpack_image)"""
+    logger.debug("Extracting layer %s.", blob)
+    with open_layer_blob(blob) as fd:
+        reader = DigestReader(fd, diff_id)
+        _, lower_hardlinks, directories = extract_layer(reader, staging, path_filter)
+        reader.verify()
+    return lower_hardlinks, directories
+
+
+_UNPACK_POOL = None
+_UNPACK_POOL_LOCK = threading.Lock()
+
+
+def _get_unpack_pool(jobs):
+    """
+    :param jobs: int, number of the worker processes needed
+    :return: ProcessPoolExecutor shared by the unpacks of this process
+             (created with get_unpack_jobs() processes, at least jobs)
+    """
+    global _UNPACK_POOL
+    with _UNPACK_POOL_LOCK:
+        # a forked process cannot use the pool of its parent
+        if _UNPACK_POOL is not None and _UNPACK_POOL[1] == os.getpid():
+            return _UNPACK_POOL[0]
+        # the pool is started from the threads running the checks,
+        # forking a multi-threaded process is not safe
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+        else:
+            context = multiprocessing.get_context("spawn")
+        pool = ProcessPoolExecutor(
+            max_workers=max(jobs, get_unpack_jobs()), mp_context=context
+        )
+        _UNPACK_POOL = (pool, os.getpid())
+        return pool
+
+
+def _discard_unpack_pool(pool):
+    """the broken pool is replaced by a new one on the next unpack"""
+    global _UNPACK_POOL
+    with _UNPACK_POOL_LOCK:
+        if _UNPACK_POOL is not None and _UNPACK_POOL[0] is pool:
+            _UNPACK_POOL = None
+    pool.shutdown(wait=False)
+
+
+def get_unpack_jobs():
+    """
+    Number of layers extracted at once: a process per CPU, but at most
+    $COLIN_UNPACK_MEMORY / UNPACK_WORKER_MEMORY of them. The memory is a heuristic
+    for the number of processes, the memory used by a process is not limited.
+
+    :return: int
+    """
+    memory = int(os.environ.get(UNPACK_MEMORY_ENV, UNPACK_MEMORY))
+    return max(1, min(os.cpu_count() or 1, memory // UNPACK_WORKER_MEMORY))
+
+
+def get_unpack_scratch_size(path):
+    """
+    :param path: str, directory of the staging directories
+    :return: int, bytes: $COLIN_UNPACK_SCRATCH_SIZE or half of the free space
+             of the filesystem, at most UNPACK_SCRATCH_SIZE
+    """
+    if os.environ.get(UNPACK_SCRATCH_SIZE_ENV):
+        return int(os.environ[UNPACK_SCRATCH_SIZE_ENV])
+    return min(shutil.disk_usage(path).free // 2, UNPACK_SCRATCH_SIZE)
+
+
+def _prepare_parent(root, relative_path):
+    """
+    Make sure all the parents of the path inside root are real directories;
+    symlinks or files in the way are replaced (nothing is written outside root).
+    """
+    current = root
+    for component in os.path.dirname(relative_path).split(os.sep):
+        if not component or component == ".":
+            continue
+        current = os.path.join(current, component)
+        if os.path.islink(current) or (
+            os.path.lexists(current) and not os.path.isdir(current)
+        ):
+            os.unlink(current)
+        if not os.path.lexists(current):
+            os.mkdir(current)
+
+
+def _file_in_root(root, relative_path):
+    """
+    Find the regular file in the directory as if it was the root directory:
+    the symlinks on the way are resolved inside root, ".." stops at root.
+
+    :param root: str, directory
+    :param relative_path: str, path of the file inside root
+    :return: str, real path of the file, None if there is no such file in root
+    """
+    components = [c for c in relative_path.split("/") if c and c != "."]
+    current = []
+    hops = 0
+    while components:
+        name = components.pop(0)
+        if name == "..":
+            current = current[:-1]
+            continue
+        try:
+            st = os.lstat(os.path.join(root, *current, name))
+        except OSError:
+            return None
+        if stat.S_ISLNK(st.st_mode) and components:
+            hops += 1
+            if hops > MAX_SYMLINK_HOPS:
+                return None
+            link = os.readlink(os.path.join(root, *current, name))
+            if link.startswith("/"):
+                current = []
+            components = [c for c in link.split("/") if c and c != "."] + components
+            continue
+        if components and not stat.S_ISDIR(st.st_mode):
+            return None
+        current.append(name)
+    if not current:
+        return None
+    # all the parents are real directories now, lstat does not leave root
+    path = os.path.join(root, *current)
+    if not stat.S_ISREG(os.lstat(path).st_mode):
+        return None
+    real_root = os.path.realpath(root)
+    if os.path.commonpath([os.path.realpath(path), real_root]) != real_root:
+        return None
+    return path
+
+
+def _directory_in_root(root, relative_path):
+    """
+    :param root: str, directory
+    :param relative_path: str, normalized path inside root
+    :return: str, path of the directory, None if it is not a real directory
+             (no symlinks on the way)
+    """
+    components = relative_path.split("/")
+    if any(c in ("", ".", "..") for c in components):
+        return None
+    path = root
+    for component in components:
+        path = os.path.join(path, component)
+        try:
+            if not stat.S_ISDIR(os.lstat(path).st_mode):
+                return None
+        except OSError:
+            return None
+    return path
+
+
+def _set_owner(path, uid, gid):
+    """keep the owner of the file (only root can change the owners)"""
+    if os.geteuid() != 0:
+        return
+    try:
+        os.lchown(path, uid, gid)
+    except OSError as ex:
+        # e.g. the ID is not mapped in the user namespace
+        logger.debug("Cannot change the owner of %s: %r", path, ex)
+
+
+def _copy_file(source, destination, source_stat):
+    """copy the file with its mode and owner (also when the owner cannot read it)"""
+    mode = stat.S_IMODE(source_stat.st_mode)
+    if mode & stat.S_IRUSR or os.geteuid() == 0:
+        shutil.copy2(source, destination)
+    else:
+        os.chmod(source, mode | stat.S_IRUSR)
+        try:
+            shutil.copy2(source, destination)
+        finally:
+            os.chmod(source, mode)
+    _set_owner(destination, source_stat.st_uid, source_stat.st_gid)
+    os.chmod(destination, mode)
+
+
+def _is_inside(root, path):
+    """the path (not resolved) is in the root directory, not the root itself"""
+    root = os.path.normpath(root)
+    path = os.path.normpath(path)
+    return path != root and os.path.commonpath([root, path]) == root
+
+
+def _remove_path(path):
+    if os.path.islink(path) or (os.path.lexists(path) and not os.path.isdir(path)):
+        os.unlink(path)
+    elif os.path.isdir(path):
+        shutil.rmtree(path)
@@ -0,0 +1,315 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Access to the podman images: the podman CLI or the libpod REST API.
+
+The API (`podman system service unix:///path/to/podman.sock`) saves starting
+a podman process (and locking the storage) for every operation; the connections
+to the service are kept open and reused.
+"""
+
+import http.client
+import json
+import logging
+import os
+import subprocess
+import threading
+import urllib.parse
+
+from .cmd_tools import run_cmd
+from .containers_storage import ContainersStorage
+from .image_mounts import ImageMounts
+from .metrics import count_bytes_read, count_tool_call
+from .tracing import span
+from .unix_http import ConnectionPool
+from ..core.constant import (
+    CONTAINERS_STORAGE_ENV,
+    CONTAINERS_STORAGE_PREFIX,
+    IMAGE_MOUNT_IDLE_TIMEOUT,
+    PODMAN_API_VERSION,
+    PODMAN_SOCKET_ENV,
+)
+from ..core.exceptions import ColinException
+
+logger = logging.getLogger(__name__)
+
+
+class PodmanCli:
+    """podman operations done by the podman command"""
+
+    def __init__(self, mount_idle_timeout=IMAGE_MOUNT_IDLE_TIMEOUT):
+        """
+        :param mount_idle_timeout: float, seconds an unused image stays mounted
+        """
+        self.image_mounts = ImageMounts(self, idle_timeout=mount_idle_timeout)
+
+    def find_image(self, name):
+        """
+        :param name: str, name of the image
+        :return: str, ID of the image or None if there is no such image
+        """
+        cmd = ["podman", "images", "--quiet", name]
+        result = run_cmd(cmd, check=False, stderr=subprocess.PIPE)
+        if result.returncode == 0:
+            return result.stdout.decode().rstrip()
+        if "unable to find" not in result.stderr.decode():
+            raise ColinException(f"Podman error: {result.stderr}")
+        return None
+
+    def pull(self, name, insecure=False):
+        """
+        :param name: str, name of the image
+        :param insecure: bool, pull from an insecure registry (HTTP/invalid TLS)
+        :return: str, ID of the pulled image
+        """
+        cmd = ["podman", "pull", "--quiet", name]
+        result = run_cmd(cmd, check=False, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            raise ColinException(f"Cannot pull an image: '{name}'.")
+        return result.stdout.decode().rstrip()
+
+    def inspect(self, name):
+        """
+        :param name: str, name of the image
+        :return: dict, metadata of the image (as in `podman inspect`)
+        """
+        loaded_config = json.loads(run_cmd(["podman", "inspect", name]).stdout)
+        if loaded_config and isinstance(loaded_config, list):
+            # FIXME: Better validation.
+            return loaded_config[0]
+        raise ColinException("Cannot load config for the image.")
+
+    def image_view(self, image_id):
+        """
+        :param image_id: str, ID of the image
+        :return: None, the files are accessible only when the image is mounted
+        """
+        return None
+
+    def mount_image(self, image_id):
+        """
+        :param image_id: str, ID of the image
+        :return: str, path to the (read-only) filesystem of the image
+        """
+        return run_cmd(["podman", "image", "mount", image_id]).stdout.decode().rstrip()
+
+    def unmount_image(self, image_id):
+        run_cmd(["podman", "image", "unmount", image_id], stdout=subprocess.DEVNULL)
+
+
+class PodmanApi:
+    """
+    podman operations done by the libpod REST API on the Unix socket
+
+    The API cannot mount an image, so the image is mounted by a container
+    created for it (the container is removed when the image is unmounted).
+    """
+
+    def __init__(
+        self,
+        socket_path,
+        pool_size=8,
+        timeout=None,
+        mount_idle_timeout=IMAGE_MOUNT_IDLE_TIMEOUT,
+    ):
+        """
+        :param socket_path: str, socket of `podman system service`
+        :param pool_size: int, number of idle connections kept open
+        :param timeout: float, timeout of the socket operations (in seconds)
+        :param mount_idle_timeout: float, seconds an unused image stays mounted
+        """
+        self.socket_path = socket_path
+        self._pool = ConnectionPool(socket_path, size=pool_size, timeout=timeout)
+        self._containers = {}
+        self.image_mounts = ImageMounts(self, idle_timeout=mount_idle_timeout)
+
+    def _request(self, method, path, query=None, body=None):
+        """
+        :return: tuple (int: status, bytes: body of the response)
+        """
+        url = f"/{PODMAN_API_VERSION}/libpod{path}"
+        if query:
+            url += "?" + urllib.parse.urlencode(query)
+        headers = {}
+        if body is not None:
+            body = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        count_tool_call()
+        with span(f"podman-api {method} {path}", "api") as api_span:
+            while True:
+                connection, reused = self._pool.get()
+                try:
+                    connection.request(method, url, body=body, headers=headers)
+                    response = connection.getresponse()
+                    data = response.read()
+                except (http.client.RemoteDisconnected, ConnectionError) as ex:
+                    connection.close()
+                    if reused:
+                        # closed by the service while idle
+                        logger.debug("Reconnecting to the podman API: %r", ex)
+                        continue
+                    raise ColinException(
+                        f"Cannot connect to the podman API {self.socket_path}: {ex}"
+                    )
+                except (OSError, http.client.HTTPException) as ex:
+                    connection.close()
+                    raise ColinException(
+                        f"Cannot connect to the podman API {self.socket_path}: {ex}"
+                    )
+                break
+            api_span.set("status", response.status)
+        if response.will_close:
+            connection.close()
+        else:
+            self._pool.put(connection)
+        count_bytes_read(len(data))
+        return response.status, data
+
+    @staticmethod
+    def _error(data):
+        try:
+            return json.loads(data)["message"]
+        except (ValueError, KeyError, TypeError):
+            return data.decode(errors="replace")
+
+    @staticmethod
+    def _quote(name):
+        return urllib.parse.quote(name, safe="/:@")
+
+    def find_image(self, name):
+        status, data = self._request("GET", f"/images/{self._quote(name)}/json")
+        if status == 404:
+            return None
+        if status != 200:
+            raise ColinException(f"Podman error: {self._error(data)}")
+        return json.loads(data)["Id"]
+
+    def pull(self, name, insecure=False):
+        query = {"reference": name, "quiet": "true"}
+        if insecure:
+            query["tlsVerify"] = "false"
+        status, data = self._request("POST", "/images/pull", query=query)
+        image_id = None
+        if status == 200:
+            # stream of json objects, the last one has the ID (or the error)
+            for line in data.decode().splitlines():
+                if not line.strip():
+                    continue
+                report = json.loads(line)
+                if report.get("error"):
+                    logger.debug("Pull error: %s", report["error"])
+                    image_id = None
+                    break
+                image_id = report.get("id") or image_id
+        if not image_id:
+            raise ColinException(f"Cannot pull an image: '{name}'.")
+        return image_id
+
+    def inspect(self, name):
+        status, data = self._request("GET", f"/images/{self._quote(name)}/json")
+        if status != 200:
+            raise ColinException(
+                f"Cannot load config for the image: {self._error(data)}"
+            )
+        return json.loads(data)
+
+    def create(self, name):
+        status, data = self._request(
+            "POST", "/containers/create", body={"image": name, "command": ["some-cmd"]}
+        )
+        if status not in (200, 201):
+            raise ColinException(f"Cannot create a container: {self._error(data)}")
+        return json.loads(data)["Id"]
+
+    def mount(self, container_id):
+        status, data = self._request("POST", f"/containers/{container_id}/mount")
+        if status != 200:
+            raise ColinException(f"Cannot mount the container: {self._error(data)}")
+        return json.loads(data)
+
+    def unmount(self, container_id):
+        status, data = self._request("POST", f"/containers/{container_id}/unmount")
+        if status not in (200, 204):
+            raise ColinException(f"Cannot unmount the container: {self._error(data)}")
+
+    def remove(self, container_id):
+        status, data = self._request("DELETE", f"/containers/{container_id}")
+        if status not in (200, 204):
+            raise ColinException(f"Cannot remove the container: {self._error(data)}")
+
+    def image_view(self, image_id):
+        return None
+
+    def mount_image(self, image_id):
+        container_id = self.create(image_id)
+        self._containers[image_id] = container_id
+        try:
+            return self.mount(container_id)
+        except Exception:
+            try:
+                self.unmount_image(image_id)
+            except Exception as ex:
+                # the error of the mount is the one to report
+                logger.warning("Cannot remove the container %s: %r", container_id, ex)
+            raise
+
+    def unmount_image(self, image_id):
+        container_id = self._containers.pop(image_id, None)
+        if container_id:
+            try:
+                self.unmount(container_id)
+            finally:
+                self.remove(container_id)
+
+
+_CLI = None
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def get_podman(podman=None):
+    """
+    Get the access to the podman images.
+
+    :param podman: PodmanCli/PodmanApi/ContainersStorage instance,
+                   path to the socket of the podman API service
+                   or "containers-storage:<graph root>" to read the storage directly
+                   (default is $COLIN_CONTAINERS_STORAGE, then $COLIN_PODMAN_SOCKET,
+                   the podman CLI if none is set)
+    :return: PodmanCli, PodmanApi or ContainersStorage (one instance per process
+             and socket/storage, the connections and the mounted images are shared)
+    """
+    global _CLI
+    if isinstance(podman, (PodmanCli, PodmanApi, ContainersStorage)):
+        return podman
+    if not podman and os.environ.get(CONTAINERS_STORAGE_ENV):
+        podman = CONTAINERS_STORAGE_PREFIX + os.environ[CONTAINERS_STORAGE_ENV]
+    podman = podman or os.environ.get(PODMAN_SOCKET_ENV)
+    with _CLIENTS_LOCK:
+        if not podman:
+            if _CLI is None:
+                _CLI = PodmanCli()
+            return _CLI
+        if podman.startswith("unix://"):
+            podman = podman.split("://", 1)[1]
+        if podman not in _CLIENTS:
+            if podman.startswith(CONTAINERS_STORAGE_PREFIX):
+                root = podman.split(":", 1)[1]
+                logger.debug("Reading the images from the storage %s.", root)
+                _CLIENTS[podman] = ContainersStorage(root)
+            else:
+                logger.debug("Using the podman API on %s.", podman)
+                _CLIENTS[podman] = PodmanApi(podman)
+        return _CLIENTS[podman]
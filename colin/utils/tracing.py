@@ -0,0 +1,191 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Timeline of the run in the trace-event format (Perfetto, chrome://tracing).
+
+The spans (external commands, checks, phases of the run) are recorded only
+while the tracing is started; otherwise span() returns a shared no-op context.
+"""
+
+import json
+import os
+import threading
+import time
+
+_TRACER = None
+
+
+class Span:
+    """One recorded piece of work; arguments can be added while it runs."""
+
+    __slots__ = ("args",)
+
+    def __init__(self, args=None):
+        self.args = dict(args) if args else {}
+
+    def set(self, key, value):
+        self.args[key] = value
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def set(self, key, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _SpanContext:
+    __slots__ = ("tracer", "name", "category", "span", "start")
+
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.span = Span(args)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self.span
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_val is not None:
+            self.span.set("error", repr(exc_val))
+        self.tracer.add(self.name, self.category, self.start, self.span.args)
+        return False
+
+
+class Tracer:
+    """Collects the spans of all the threads."""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self._start = time.perf_counter()
+        self._events = []
+        self._threads = {}
+
+    def span(self, name, category, args=None):
+        """
+        :param name: str, name of the span
+        :param category: str, e.g. "cmd", "check" or "phase"
+        :param args: dict, arguments shown with the span
+        :return: context manager providing Span
+        """
+        return _SpanContext(self, name, category, args)
+
+    def add(self, name, category, start, args=None):
+        """
+        Record the span which started at `start` (time.perf_counter) and ends now.
+        """
+        end = time.perf_counter()
+        tid = threading.get_ident()
+        if tid not in self._threads:
+            self._threads[tid] = threading.current_thread().name
+        # list.append is atomic, no lock needed
+        self._events.append(
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": round((start - self._start) * 1e6, 3),
+                "dur": round((end - start) * 1e6, 3),
+                "pid": self.pid,
+                "tid": tid,
+                "args": args or {},
+            }
+        )
+
+    @property
+    def events(self):
+        """
+        :return: list of trace events (including the names of the threads)
+        """
+        metadata = [
+            {
+                "name": "process_name",
+                "ph": "M",
+                "pid": self.pid,
+                "tid": 0,
+                "args": {"name": "colin"},
+            }
+        ]
+        for tid, name in list(self._threads.items()):
+            metadata.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": self.pid,
+                    "tid": tid,
+                    "args": {"name": name},
+                }
+            )
+        return metadata + list(self._events)
+
+    def save(self, file):
+        """
+        Write the trace-event JSON.
+
+        :param file: file object to write to
+        """
+        json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, file)
+
+
+def start_tracing():
+    """
+    Record the spans from now on.
+
+    :return: Tracer
+    """
+    global _TRACER
+    _TRACER = Tracer()
+    return _TRACER
+
+
+def stop_tracing():
+    """
+    Stop recording the spans.
+
+    :return: Tracer with the recorded spans (None if the tracing was not started)
+    """
+    global _TRACER
+    tracer, _TRACER = _TRACER, None
+    return tracer
+
+
+def span(name, category, args=None):
+    """
+    Record the block as a span (when the tracing is started).
+
+        with span("podman inspect", "cmd", {"cmd": cmd}) as s:
+            ...
+            s.set("exit_code", 0)
+
+    :param name: str, name of the span
+    :param category: str, e.g. "cmd", "check" or "phase"
+    :param args: dict, arguments shown with the span
+    :return: context manager providing Span
+    """
+    tracer = _TRACER
+    if tracer is None:
+        return _NO_SPAN
+    return tracer.span(name, category, args)
@@ -0,0 +1,76 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+HTTP over Unix sockets (colin server, podman API).
+"""
+
+import http.client
+import queue
+import socket
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path, timeout=None):
+        """
+        :param socket_path: str, path to the Unix socket
+        :param timeout: float, timeout of the socket operations (in seconds)
+        """
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class ConnectionPool:
+    """Idle keep-alive connections to one Unix socket, shared by the threads."""
+
+    def __init__(self, socket_path, size=8, timeout=None):
+        """
+        :param socket_path: str, path to the Unix socket
+        :param size: int, maximum number of idle connections kept open
+        :param timeout: float, timeout of the socket operations (in seconds)
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def get(self):
+        """
+        :return: tuple (UnixHTTPConnection, bool: the connection was used before)
+        """
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            return UnixHTTPConnection(self.socket_path, timeout=self.timeout), False
+
+    def put(self, connection):
+        """
+        Return the connection (with the response read completely) to the pool.
+        """
+        try:
+            self._idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
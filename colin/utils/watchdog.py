@@ -0,0 +1,243 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+"""
+Timeouts for checks (and anything else) watched by a single scheduler thread.
+
+The watchdog keeps a heap of deadlines. When a deadline expires:
+- the subprocesses registered with the deadline are killed,
+- the thread doing the work is interrupted
+  (main thread via interrupt_main, other threads via an asynchronous TimeoutError),
+- code polling the deadline (Deadline.check) stops cooperatively.
+"""
+
+import ctypes
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import thread
+except ImportError:
+    import _thread as thread  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class ScheduledCall:
+    """Callback scheduled on the watchdog thread; can be cancelled."""
+
+    def __init__(self, when, callback):
+        self.when = when
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Deadline:
+    """
+    Deadline of a single piece of work (usually one check).
+
+    Use Watchdog.deadline() to create it.
+    """
+
+    def __init__(self, timeout, thread_ident):
+        self.timeout = timeout
+        self.thread_ident = thread_ident
+        self.expired = False
+        self._finished = False
+        self._processes = set()
+        self._lock = threading.Lock()
+        self._scheduled = None
+
+    @property
+    def remaining(self):
+        """seconds till the deadline (0 when expired)"""
+        if self.expired:
+            return 0
+        return max(self._scheduled.when - time.monotonic(), 0)
+
+    def check(self):
+        """raise TimeoutError if the deadline expired -- for cooperative cancellation"""
+        if self.expired:
+            raise TimeoutError(f"Deadline of {self.timeout}s expired.")
+
+    def register_process(self, process):
+        """
+        Kill the process (subprocess.Popen) when the deadline expires.
+
+        :param process: subprocess.Popen instance
+        """
+        with self._lock:
+            if self.expired:
+                _kill(process)
+            else:
+                self._processes.add(process)
+
+    def unregister_process(self, process):
+        with self._lock:
+            self._processes.discard(process)
+
+    def finish(self):
+        """the work is done, the deadline cannot expire anymore"""
+        with self._lock:
+            self._finished = True
+            if self._scheduled is not None:
+                self._scheduled.cancel()
+            expired = self.expired
+        if expired and self.thread_ident != threading.main_thread().ident:
+            # the work ended before the asynchronous exception was delivered
+            _set_async_exc(self.thread_ident, None)
+
+    def _expire(self):
+        with self._lock:
+            if self._finished:
+                return
+            self.expired = True
+            processes = list(self._processes)
+        logger.debug("Deadline of %ss expired.", self.timeout)
+        for process in processes:
+            _kill(process)
+        if self.thread_ident == threading.main_thread().ident:
+            thread.interrupt_main()
+        else:
+            _set_async_exc(self.thread_ident, TimeoutError)
+
+
+class Watchdog:
+    """
+    One thread with a heap of scheduled calls.
+
+    Used for the check timeouts, but any callback can be scheduled.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def schedule(self, delay, callback):
+        """
+        Call the callback on the watchdog thread after the delay.
+
+        :param delay: float, seconds
+        :param callback: function without arguments
+        :return: ScheduledCall (use its cancel method to cancel the call)
+        """
+        scheduled = ScheduledCall(when=time.monotonic() + delay, callback=callback)
+        with self._condition:
+            heapq.heappush(self._heap, (scheduled.when, next(self._counter), scheduled))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="colin-watchdog", daemon=True
+                )
+                self._thread.start()
+            self._condition.notify()
+        return scheduled
+
+    @contextmanager
+    def deadline(self, timeout):
+        """
+        Watch the work done in the with-block for the current thread.
+
+        :param timeout: float, seconds
+        :return: Deadline instance
+        """
+        deadline = Deadline(timeout=timeout, thread_ident=threading.get_ident())
+        deadline._scheduled = self.schedule(timeout, deadline._expire)
+        stack = _deadline_stack()
+        stack.append(deadline)
+        try:
+            yield deadline
+        finally:
+            deadline.finish()
+            stack.remove(deadline)
+
+    def _reset_after_fork(self):
+        """
+        The watchdog thread does not exist in the forked child and the condition
+        may have been held by it: start again with no scheduled calls.
+        """
+        self._heap = []
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    while self._heap and self._heap[0][2].cancelled:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._condition.wait()
+                        continue
+                    delay = self._heap[0][0] - time.monotonic()
+                    if delay <= 0:
+                        scheduled = heapq.heappop(self._heap)[2]
+                        break
+                    self._condition.wait(timeout=delay)
+            if scheduled.cancelled:
+                continue
+            try:
+                scheduled.callback()
+            except Exception as ex:
+                logger.warning("Scheduled call failed: %r", ex)
+
+
+_WATCHDOG = Watchdog()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_WATCHDOG._reset_after_fork)
+
+
+def get_watchdog():
+    """the process-wide watchdog"""
+    return _WATCHDOG
+
+
+def current_deadline():
+    """
+    Get the innermost deadline watched for the current thread.
+
+    :return: Deadline or None
+    """
+    stack = _deadline_stack()
+    return stack[-1] if stack else None
+
+
+def _deadline_stack():
+    if not hasattr(_local, "deadlines"):
+        _local.deadlines = []
+    return _local.deadlines
+
+
+def _kill(process):
+    try:
+        process.kill()
+    except OSError as ex:
+        logger.debug("Cannot kill process %s: %r", process.pid, ex)
+
+
+def _set_async_exc(thread_ident, exc):
+    ctypes.pythonapi.PyThreadState_SetAsyncExc(
+        ctypes.c_ulong(thread_ident), ctypes.py_object(exc) if exc else None
+    )
@@ -36,6 +36,7 @@ setup(
     long_description_content_type="text/markdown",
     packages=find_packages(exclude=["examples", "tests"]),
     install_requires=["Click", "six", "dockerfile_parse", "fmf", "PyYAML"],
+    extras_require={"zstd": ["zstandard"]},
     entry_points="""
         [console_scripts]
         colin=colin.cli.colin:cli
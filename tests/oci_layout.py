@@ -0,0 +1,147 @@
+"""
+Build small synthetic OCI image layouts for the tests.
+"""
+import gzip
+import hashlib
+import io
+import json
+import os
+import tarfile
+
+# two layers exercising whiteouts, opaque directories, symlinks and hardlinks
+LAYERS = [
+    [
+        ("etc/", None),
+        ("etc/os-release", b"ID=fedora\n"),
+        ("usr/share/doc/a/README", b"a"),
+        ("usr/share/doc/b/README", b"b"),
+        ("help.1", b"help"),
+        ("old-file", b"old"),
+        ("lib", ("symlink", "usr/lib")),
+        ("usr/lib/libc.so", b"libc"),
+    ],
+    [
+        ("etc/.wh.os-release", b""),
+        ("usr/share/doc/.wh..wh..opq", b""),
+        ("usr/share/doc/c/README", b"c"),
+        ("README.md", ("hardlink", "help.1")),
+        (".wh.old-file", b""),
+        ("etc/motd", ("symlink", "/help.1")),
+        ("etc/loop", ("symlink", "loop")),
+    ],
+]
+
+
+def _write_blob(layout_path, data):
+    digest = hashlib.sha256(data).hexdigest()
+    blob_dir = os.path.join(layout_path, "blobs", "sha256")
+    os.makedirs(blob_dir, exist_ok=True)
+    with open(os.path.join(blob_dir, digest), "wb") as fd:
+        fd.write(data)
+    return f"sha256:{digest}", len(data)
+
+
+def make_layer(entries):
+    """
+    Create an uncompressed layer tarball.
+
+    :param entries: list of (path, content) or (path, content, header) tuples;
+                    content is bytes (regular file), None (directory),
+                    ("symlink", target) or ("hardlink", target),
+                    header is a dict of TarInfo attributes, e.g. {"mode": 0o600}
+    :return: bytes
+    """
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as tar:
+        for path, content, *header in entries:
+            info = tarfile.TarInfo(path)
+            info.mode = 0o644 if content is not None else 0o755
+            for name, value in (header[0] if header else {}).items():
+                setattr(info, name, value)
+            if content is None:
+                info.type = tarfile.DIRTYPE
+                tar.addfile(info)
+            elif isinstance(content, tuple):
+                info.type = (
+                    tarfile.SYMTYPE if content[0] == "symlink" else tarfile.LNKTYPE
+                )
+                info.linkname = content[1]
+                tar.addfile(info)
+            else:
+                info.size = len(content)
+                tar.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+def make_oci_layout(
+    layout_path, ref_name="image", layers=(), config=None, compression="gzip"
+):
+    """
+    Write an OCI image layout with one image.
+
+    :param layers: list of layers, see make_layer
+    :param config: dict, the "config" part of the image configuration
+    :return: str, digest of the manifest
+    """
+    os.makedirs(layout_path, exist_ok=True)
+    with open(os.path.join(layout_path, "oci-layout"), "w") as fd:
+        json.dump({"imageLayoutVersion": "1.0.0"}, fd)
+
+    layer_descriptors = []
+    diff_ids = []
+    for entries in layers:
+        layer = make_layer(entries)
+        diff_ids.append("sha256:" + hashlib.sha256(layer).hexdigest())
+        if compression == "gzip":
+            media_type = "application/vnd.oci.image.layer.v1.tar+gzip"
+            layer = gzip.compress(layer)
+        elif compression == "zstd":
+            import zstandard
+
+            media_type = "application/vnd.oci.image.layer.v1.tar+zstd"
+            layer = zstandard.ZstdCompressor().compress(layer)
+        else:
+            media_type = "application/vnd.oci.image.layer.v1.tar"
+        digest, size = _write_blob(layout_path, layer)
+        layer_descriptors.append(
+            {"mediaType": media_type, "digest": digest, "size": size}
+        )
+
+    image_config = {
+        "created": "2020-01-01T00:00:00Z",
+        "architecture": "amd64",
+        "os": "linux",
+        "config": config or {},
+        "rootfs": {"type": "layers", "diff_ids": diff_ids},
+        "history": [{"created_by": "test"} for _ in layers],
+    }
+    config_digest, config_size = _write_blob(
+        layout_path, json.dumps(image_config).encode()
+    )
+    manifest = {
+        "schemaVersion": 2,
+        "mediaType": "application/vnd.oci.image.manifest.v1+json",
+        "config": {
+            "mediaType": "application/vnd.oci.image.config.v1+json",
+            "digest": config_digest,
+            "size": config_size,
+        },
+        "layers": layer_descriptors,
+    }
+    manifest_digest, manifest_size = _write_blob(
+        layout_path, json.dumps(manifest).encode()
+    )
+    index = {
+        "schemaVersion": 2,
+        "manifests": [
+            {
+                "mediaType": "application/vnd.oci.image.manifest.v1+json",
+                "digest": manifest_digest,
+                "size": manifest_size,
+                "annotations": {"org.opencontainers.image.ref.name": ref_name},
+            }
+        ],
+    }
+    with open(os.path.join(layout_path, "index.json"), "w") as fd:
+        json.dump(index, fd)
+    return manifest_digest
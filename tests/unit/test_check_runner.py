@@ -0,0 +1,181 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import random
+import threading
+import time
+
+import pytest
+
+from colin.core.check_runner import CheckPlan, go_through_checks
+from colin.core.checks.abstract_check import ImageAbstractCheck
+from colin.core.constant import (
+    ERROR,
+    FACET_CONFIG,
+    FACET_FILESYSTEM,
+    FACET_LABELS,
+    PASSED,
+)
+from colin.core.result import CheckResult
+from colin.core.target import Target
+from colin.utils.cmd_tools import run_cmd
+
+
+class FakeTarget(Target):
+    def __init__(self):
+        super().__init__()
+        self.cleaned = False
+        self.prepared = []
+        self.checked = []
+
+    def prepare(self, facets):
+        self.prepared.append(set(facets))
+
+    def clean_up(self):
+        self.cleaned = True
+
+
+class SleepyCheck(ImageAbstractCheck):
+    def __init__(self, name, sleep=0.0, fail=False, facets=()):
+        super().__init__(
+            message="message", description="description", reference_url="", tags=[]
+        )
+        self.name = name
+        self.sleep = sleep
+        self.fail = fail
+        self.facets = facets
+        self.thread = None
+
+    def check(self, target):
+        self.thread = threading.current_thread()
+        if isinstance(target, FakeTarget):
+            target.checked.append(self.name)
+        time.sleep(self.sleep)
+        if self.fail:
+            raise RuntimeError("check broke")
+        return CheckResult(
+            ok=True,
+            description=self.description,
+            message=self.message,
+            reference_url=self.reference_url,
+            check_name=self.name,
+            logs=[],
+        )
+
+
+@pytest.mark.parametrize("jobs", [None, 1, 4])
+def test_results_in_ruleset_order(jobs):
+    facets = [(FACET_FILESYSTEM,), (), (FACET_LABELS,), (FACET_CONFIG,)]
+    checks = [
+        SleepyCheck(f"check-{i}", sleep=random.random() / 20, facets=facets[i % 4])
+        for i in range(12)
+    ]
+    target = FakeTarget()
+    results = go_through_checks(target=target, checks=checks, jobs=jobs)
+    assert [r.check_name for r in results.results] == [c.name for c in checks]
+    assert target.cleaned
+
+
+def test_parallel_checks_use_worker_threads():
+    checks = [SleepyCheck(f"check-{i}", sleep=0.2) for i in range(4)]
+    start = time.monotonic()
+    results = go_through_checks(target=FakeTarget(), checks=checks, jobs=4)
+    assert all(r.status == PASSED for r in results.results)
+    assert time.monotonic() - start < 0.7
+    assert all(c.thread is not threading.main_thread() for c in checks)
+
+
+def test_parallel_check_error():
+    checks = [SleepyCheck("good"), SleepyCheck("bad", fail=True)]
+    results = go_through_checks(target=FakeTarget(), checks=checks, jobs=2)
+    statuses = {r.check_name: r for r in results.results}
+    assert statuses["good"].status == PASSED
+    assert statuses["bad"].status == ERROR
+    assert statuses["bad"].logs == ["check broke"]
+
+
+def test_parallel_check_timeout():
+    checks = [SleepyCheck("slow", sleep=2), SleepyCheck("fast")]
+    results = go_through_checks(target=FakeTarget(), checks=checks, timeout=1, jobs=2)
+    statuses = {r.check_name: r.status for r in results.results}
+    assert statuses == {"slow": ERROR, "fast": PASSED}
+
+
+@pytest.mark.parametrize("jobs", [None, 3])
+def test_cheap_facets_first(jobs):
+    checks = [
+        SleepyCheck("fs", facets=(FACET_FILESYSTEM,)),
+        SleepyCheck("unknown"),
+        SleepyCheck("label-1", facets=(FACET_LABELS,)),
+        SleepyCheck("config", facets=(FACET_CONFIG, FACET_LABELS)),
+        SleepyCheck("label-2", facets=(FACET_LABELS,)),
+    ]
+    plan = CheckPlan(checks)
+    assert plan.facets == {FACET_LABELS, FACET_CONFIG, FACET_FILESYSTEM}
+    target = FakeTarget()
+    results = go_through_checks(target=target, checks=plan, jobs=jobs)
+    # reported in the ruleset order
+    assert [r.check_name for r in results.results] == [c.name for c in checks]
+    # run from the cheapest stage
+    assert set(target.checked[:2]) == {"label-1", "label-2"}
+    assert target.checked[2:] == ["config", "fs", "unknown"]
+    assert target.prepared == [
+        {FACET_LABELS},
+        {FACET_CONFIG, FACET_LABELS},
+        {FACET_FILESYSTEM},
+    ]
+
+
+def test_labels_only_run_prepares_only_labels():
+    checks = [SleepyCheck(f"label-{i}", facets=(FACET_LABELS,)) for i in range(3)]
+    target = FakeTarget()
+    list(go_through_checks(target=target, checks=checks).results)
+    assert target.prepared == [{FACET_LABELS}]
+
+
+class ToolCheck(SleepyCheck):
+    def check(self, target):
+        run_cmd(["echo", "hello"])
+        run_cmd(["true"])
+        return super().check(target)
+
+
+@pytest.mark.parametrize("jobs", [None, 4])
+def test_check_metrics_and_phases(jobs):
+    checks = [
+        ToolCheck("tools", facets=(FACET_FILESYSTEM,)),
+        SleepyCheck("sleepy", sleep=0.05, facets=(FACET_LABELS,)),
+    ]
+    results = go_through_checks(target=FakeTarget(), checks=checks, jobs=jobs)
+    metrics = {r.check_name: r.metrics for r in results.results}
+
+    assert metrics["tools"].tool_calls == 2
+    assert metrics["tools"].bytes_read == len(b"hello\n")
+    assert metrics["sleepy"].tool_calls == 0
+    assert metrics["sleepy"].wall_time >= 0.05
+    assert metrics["sleepy"].cpu_time < metrics["sleepy"].wall_time
+
+    phases = results.phases_dict
+    assert list(phases) == [
+        "prepare:labels",
+        "checks:labels",
+        "prepare:filesystem",
+        "checks:filesystem",
+        "clean_up",
+    ]
+    assert phases["checks:labels"] >= 0.05
+    assert "slowest checks: sleepy" in results.get_pretty_string(
+        stat=True, verbose=False
+    )
@@ -12,7 +12,11 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 #
+import json
+import subprocess
+import sys
 
+import pytest
 from click.testing import CliRunner
 
 from colin.cli.colin import check, info, list_checks, list_rulesets
@@ -140,3 +144,34 @@ def test_info():
 def test_env():
     result = _call_colin(info, envs={"COLIN_HELP": "1"})
     assert "Usage" in result.output
+
+
+# generous: the import takes ~0.1s, the heavy dependencies add ~0.3s more
+IMPORT_TIME_BUDGET = 1.0
+HEAVY_MODULES = [
+    "fmf",
+    "yaml",
+    "dockerfile_parse",
+    "xml.dom.minidom",
+    "colin.core.colin",
+]
+
+
+@pytest.mark.parametrize("args", [["--version"], ["list-rulesets"], ["--help"]])
+def test_cli_import_time(args):
+    script = f"""
+import json, sys, time
+start = time.perf_counter()
+from colin.cli.colin import cli
+try:
+    cli({args!r}, standalone_mode=False)
+except SystemExit:
+    pass
+elapsed = time.perf_counter() - start
+heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+print(json.dumps({{"elapsed": elapsed, "heavy": heavy}}))
+"""
+    output = subprocess.check_output([sys.executable, "-c", script])
+    result = json.loads(output.decode().strip().splitlines()[-1])
+    assert result["heavy"] == []
+    assert result["elapsed"] < IMPORT_TIME_BUDGET
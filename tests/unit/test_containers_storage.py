@@ -0,0 +1,184 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import json
+import os
+import stat
+
+import pytest
+
+from colin.core.colin import run
+from colin.core.exceptions import ColinException
+from colin.core.target import ImageTarget
+from colin.utils.containers_storage import (
+    ContainersStorage,
+    OverlayView,
+    big_data_file_name,
+)
+from colin.utils.podman import get_podman
+
+IMAGE_ID = "a" * 64
+BASE_LAYER = "1" * 64
+TOP_LAYER = "2" * 64
+
+
+def _write(root, path, content=""):
+    path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as fd:
+        fd.write(content)
+
+
+def _whiteout(layer, path):
+    """overlayfs whiteout (character device 0/0), .wh. file if mknod is not allowed"""
+    full_path = os.path.join(layer, path)
+    try:
+        os.mknod(full_path, stat.S_IFCHR | 0o600, os.makedev(0, 0))
+    except PermissionError:
+        directory, name = os.path.split(full_path)
+        _write(directory, ".wh." + name)
+
+
+@pytest.fixture()
+def storage(tmpdir):
+    root = str(tmpdir)
+    base = os.path.join(root, "overlay", BASE_LAYER, "diff")
+    _write(base, "etc/os-release", "base")
+    _write(base, "etc/removed")
+    _write(base, "usr/lib/a")
+    _write(base, "usr/lib/b")
+    _write(base, "usr/bin/sh")
+    _write(base, "opt/old/file")
+    _write(base, "opt/kept/file")
+    os.symlink("usr/bin", os.path.join(base, "bin"))
+
+    top = os.path.join(root, "overlay", TOP_LAYER, "diff")
+    _write(top, "etc/os-release", "top")
+    _write(top, "etc/.wh.removed")
+    _write(top, "usr/lib/.wh..wh..opq")
+    _write(top, "usr/lib/c")
+    _write(top, "README.md", "readme")
+    os.makedirs(os.path.join(top, "opt"))
+    _whiteout(top, "opt/old")
+
+    _write(
+        root,
+        "overlay-images/images.json",
+        json.dumps(
+            [
+                {
+                    "id": IMAGE_ID,
+                    "digest": "sha256:" + "d" * 64,
+                    "names": ["quay.io/example/app:1"],
+                    "layer": TOP_LAYER,
+                }
+            ]
+        ),
+    )
+    _write(
+        root,
+        os.path.join(
+            "overlay-images", IMAGE_ID, big_data_file_name(f"sha256:{IMAGE_ID}")
+        ),
+        json.dumps({"config": {"Labels": {"name": "app"}, "User": "app"}}),
+    )
+    _write(
+        root,
+        "overlay-layers/layers.json",
+        json.dumps([{"id": BASE_LAYER}, {"id": TOP_LAYER, "parent": BASE_LAYER}]),
+    )
+    return ContainersStorage(root, mount_idle_timeout=0)
+
+
+def test_find_image(storage):
+    assert storage.find_image("quay.io/example/app:1") == IMAGE_ID
+    assert storage.find_image("app:1") == IMAGE_ID
+    assert storage.find_image("aaaaaaaaaaaa") == IMAGE_ID
+    assert storage.find_image("app:2") is None
+    digest = "sha256:" + "d" * 64
+    assert storage.find_image(f"example/app@{digest}") == IMAGE_ID
+    assert storage.find_image(f"pp@{digest}") is None
+    assert storage.inspect("app:1")["Labels"] == {"name": "app"}
+    with pytest.raises(ColinException, match="read-only"):
+        storage.pull("app:2")
+
+
+def test_find_ambiguous_short_name(storage):
+    images_json = os.path.join(storage.root, "overlay-images", "images.json")
+    with open(images_json) as fd:
+        images = json.load(fd)
+    images.append({"id": "b" * 64, "names": ["docker.io/example/app:1"]})
+    with open(images_json, "w") as fd:
+        json.dump(images, fd)
+    with pytest.raises(ColinException, match="matches more images"):
+        storage.find_image("app:1")
+    assert storage.find_image("docker.io/example/app:1") == "b" * 64
+
+    images.append({"id": "c" * 64, "names": ["localhost/app:1"]})
+    with open(images_json, "w") as fd:
+        json.dump(images, fd)
+    assert storage.find_image("app:1") == "c" * 64
+
+
+def test_overlay_view(storage):
+    view = storage.image_view(IMAGE_ID)
+    assert isinstance(view, OverlayView)
+    assert storage.image_view(IMAGE_ID) is view
+
+    with open(view.real_path("/etc/os-release")) as fd:
+        assert fd.read() == "top"
+    assert view.file_is_present("/usr/lib/c")
+    # opaque directory, whiteouts
+    assert not view.file_is_present("/usr/lib/a")
+    assert not view.file_is_present("/etc/removed")
+    assert not view.file_is_present("/opt/old/file")
+    assert view.file_is_present("/opt/kept/file")
+    # symlinks resolved in the image
+    assert view.file_is_present("/bin/sh")
+    assert view.file_is_present("/usr/lib/../bin/sh")
+    with pytest.raises(OSError):
+        view.file_is_present("/usr")
+    assert stat.S_ISDIR(view.stat("/bin").st_mode)
+    with pytest.raises(IsADirectoryError):
+        view.real_path("/usr/lib")
+
+    assert view.list_dir("/") == ["README.md", "bin", "etc", "opt", "usr"]
+    assert view.list_dir("/usr/lib") == ["c"]
+    assert view.list_dir("/opt") == ["kept"]
+    assert view.list_dir("/etc") == ["os-release"]
+
+
+def test_image_target_from_storage(storage, tmpdir):
+    target = ImageTarget("quay.io/example/app:1", pull=False, podman=storage)
+    assert target.image_id == IMAGE_ID
+    assert target.labels == {"name": "app"}
+    assert target.file_is_present("/README.md")
+    assert target.read_file("/etc/os-release") == "top"
+    with pytest.raises(ColinException):
+        target.read_file("/etc/removed")
+    target.clean_up()
+    # nothing was mounted
+    assert storage.image_mounts.mounted == {}
+
+    results = run(
+        "app:1",
+        "image",
+        ruleset={
+            "version": "1",
+            "checks": [{"name": "name_label"}, {"name": "help_file_or_readme"}],
+        },
+        podman=f"containers-storage:{tmpdir}",
+    )
+    assert [r.status for r in results.results] == ["PASS", "PASS"]
+    assert isinstance(get_podman(f"containers-storage:{tmpdir}"), ContainersStorage)
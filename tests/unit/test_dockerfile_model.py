@@ -0,0 +1,74 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import pytest
+import six
+
+from colin.checks.dockerfile import FromTagNotLatestCheck, MaintainerDeprecatedCheck
+from colin.core.target import DockerfileTarget
+
+DOCKERFILE = """\
+FROM golang:1.20 AS builder
+ARG VERSION=1
+RUN go build ./...
+RUN go test ./...
+
+FROM --platform=linux/amd64 registry.fedoraproject.org/fedora:38
+ENV NAME=colin
+LABEL name="${NAME}" version="1"
+COPY --from=builder /app /app
+RUN dnf -y install git
+CMD ["/app"]
+"""
+
+
+@pytest.fixture()
+def target():
+    return DockerfileTarget(target=six.StringIO(DOCKERFILE))
+
+
+def test_model_is_parsed_once(target):
+    assert target.model is target.model
+    assert target.labels is target.model.labels
+
+
+def test_model_index(target):
+    model = target.model
+    assert [i["value"] for i in model.get_instructions("RUN")] == [
+        "go build ./...",
+        "go test ./...",
+        "dnf -y install git",
+    ]
+    assert model.get_instructions("MAINTAINER") == ()
+    assert dict(model.labels) == {"name": "colin", "version": "1"}
+    assert model.baseimage == "registry.fedoraproject.org/fedora:38"
+    with pytest.raises(TypeError):
+        model.labels["name"] = "other"
+
+
+def test_model_stages(target):
+    builder, final = target.model.stages
+    assert builder.name == "builder"
+    assert builder.baseimage == "golang:1.20"
+    assert len(builder.get_instructions("RUN")) == 2
+    assert final.name is None
+    assert final.baseimage == "registry.fedoraproject.org/fedora:38"
+    assert len(final.get_instructions("RUN")) == 1
+    assert target.model.final_stage is final
+
+
+def test_checks_use_model(target):
+    assert FromTagNotLatestCheck().check(target).ok
+    assert MaintainerDeprecatedCheck().check(target).ok
@@ -0,0 +1,141 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import threading
+import time
+
+import pytest
+
+from colin.core.exceptions import ColinException
+from colin.utils.image_mounts import ImageMounts, release_all_mounts
+from colin.utils.watchdog import get_watchdog
+
+
+class FakePodman:
+    def __init__(self):
+        self.calls = []
+        self.fail = False
+
+    def mount_image(self, image_id):
+        self.calls.append(("mount", image_id))
+        if self.fail:
+            raise ColinException("Cannot mount.")
+        time.sleep(0.01)
+        return f"/mnt/{image_id}"
+
+    def unmount_image(self, image_id):
+        self.calls.append(("unmount", image_id))
+
+
+def test_shared_mount():
+    podman = FakePodman()
+    mounts = ImageMounts(podman, idle_timeout=0)
+
+    paths = []
+    threads = [
+        threading.Thread(target=lambda: paths.append(mounts.acquire("a")))
+        for _ in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert paths == ["/mnt/a"] * 4
+    assert mounts.mounted == {"a": 4}
+
+    for _ in range(3):
+        mounts.release("a")
+    assert podman.calls == [("mount", "a")]
+    mounts.release("a")
+    assert podman.calls == [("mount", "a"), ("unmount", "a")]
+    assert mounts.mounted == {}
+
+
+def test_acquire_while_unmounting():
+    podman = FakePodman()
+    unmounting = threading.Event()
+    unmount_image = podman.unmount_image
+
+    def slow_unmount(image_id):
+        unmounting.set()
+        time.sleep(0.2)
+        unmount_image(image_id)
+
+    podman.unmount_image = slow_unmount
+    mounts = ImageMounts(podman, idle_timeout=0)
+    mounts.acquire("a")
+    release = threading.Thread(target=mounts.release, args=("a",))
+    release.start()
+    unmounting.wait()
+    # waits for the unmount and mounts the image again
+    assert mounts.acquire("a") == "/mnt/a"
+    release.join()
+    assert podman.calls == [("mount", "a"), ("unmount", "a"), ("mount", "a")]
+    assert mounts.mounted == {"a": 1}
+    mounts.release("a")
+    assert mounts.mounted == {}
+
+
+def test_idle_timeout():
+    podman = FakePodman()
+    mounts = ImageMounts(podman, idle_timeout=0.2)
+    mounts.acquire("a")
+    mounts.release("a")
+    # reused while idle
+    assert mounts.acquire("a") == "/mnt/a"
+    mounts.release("a")
+    assert podman.calls == [("mount", "a")]
+
+    time.sleep(0.5)
+    assert podman.calls == [("mount", "a"), ("unmount", "a")]
+    assert mounts.mounted == {}
+
+
+def test_idle_unmount_does_not_block_watchdog():
+    podman = FakePodman()
+    unmount_image = podman.unmount_image
+
+    def slow_unmount(image_id):
+        time.sleep(0.5)
+        unmount_image(image_id)
+
+    podman.unmount_image = slow_unmount
+    mounts = ImageMounts(podman, idle_timeout=0.05)
+    mounts.acquire("a")
+    mounts.release("a")
+    called = threading.Event()
+    start = time.monotonic()
+    get_watchdog().schedule(0.1, called.set)
+    assert called.wait(timeout=2)
+    assert time.monotonic() - start < 0.4
+    time.sleep(0.7)
+    assert podman.calls == [("mount", "a"), ("unmount", "a")]
+    assert mounts.mounted == {}
+
+
+def test_failed_mount_and_release_all():
+    podman = FakePodman()
+    mounts = ImageMounts(podman, idle_timeout=60)
+    podman.fail = True
+    with pytest.raises(ColinException):
+        mounts.acquire("a")
+    assert mounts.mounted == {}
+
+    podman.fail = False
+    mounts.acquire("a")
+    mounts.acquire("b")
+    mounts.release("b")
+    release_all_mounts()
+    assert sorted(podman.calls[-2:]) == [("unmount", "a"), ("unmount", "b")]
+    assert mounts.mounted == {}
@@ -0,0 +1,119 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+
+import pytest
+
+import colin.checks
+from colin.core.check_runner import go_through_checks
+from colin.core.checks.dockerfile import DockerfileLabelAbstractCheck
+from colin.core.checks.labels import DeprecatedLabelAbstractCheck, LabelAbstractCheck
+from colin.core.label_evaluator import LabelEvaluator
+from colin.core.loader import CheckLoader
+from colin.core.result import FailedCheckResult
+from colin.core.target import Target
+
+LABEL_CHECK_CLASSES = (
+    LabelAbstractCheck,
+    DeprecatedLabelAbstractCheck,
+    DockerfileLabelAbstractCheck,
+)
+
+
+class LabelsTarget(Target):
+    def __init__(self, labels):
+        super().__init__()
+        self._labels = labels
+        self.label_reads = 0
+
+    @property
+    def labels(self):
+        self.label_reads += 1
+        if isinstance(self._labels, Exception):
+            raise self._labels
+        return self._labels
+
+
+def _upstream_label_checks():
+    checks_dir = os.path.dirname(colin.checks.__file__)
+    classes = CheckLoader([checks_dir]).check_classes
+    checks = [c() for c in classes if issubclass(c, LABEL_CHECK_CLASSES)]
+    custom = DockerfileLabelAbstractCheck(
+        message="m",
+        description="d",
+        reference_url="",
+        tags=[],
+        label=["a", "b"],
+        required=True,
+        value_regex="^x",
+    )
+    custom.name = "custom_dockerfile_label"
+    return sorted(checks, key=lambda c: c.name) + [custom]
+
+
+def _as_tuples(results):
+    return [(r.check_name, r.status, r.message, r.logs) for r in results]
+
+
+@pytest.mark.parametrize(
+    "labels",
+    [
+        None,
+        {},
+        {"maintainer": "me", "name": "foo", "Name": "foo", "a": "xyz", "b": "yz"},
+        {
+            "com.redhat.component": "foo-container",
+            "summary": "",
+            "version": "1",
+            "release": "2",
+            "Architecture": "x86_64",
+            "a": None,
+        },
+        RuntimeError("podman inspect failed"),
+    ],
+)
+def test_same_results_as_the_checks(labels):
+    checks = _upstream_label_checks()
+    expected = []
+    for check in checks:
+        try:
+            expected.append(check.check(LabelsTarget(labels)))
+        except Exception as ex:
+            expected.append(FailedCheckResult(check, logs=[str(ex)]))
+
+    evaluator = LabelEvaluator(checks)
+    assert len(evaluator) == len(checks)
+    target = LabelsTarget(labels)
+    results = go_through_checks(target=target, checks=checks)
+    assert _as_tuples(results.results) == _as_tuples(expected)
+    if not isinstance(labels, Exception):
+        assert target.label_reads == 1
+
+
+def test_overridden_and_invalid_checks_run_as_usual():
+    class OwnCheck(LabelAbstractCheck):
+        def check(self, target):
+            return super().check(target)
+
+    own = OwnCheck("m", "d", "", [], labels=["a"], required=True)
+    invalid = LabelAbstractCheck(
+        "m", "d", "", [], labels=["a"], required=True, value_regex="("
+    )
+    plain = LabelAbstractCheck("m", "d", "", [], labels=["a"], required=True)
+    evaluator = LabelEvaluator([own, invalid, plain])
+    assert own not in evaluator
+    assert invalid not in evaluator
+    assert plain in evaluator
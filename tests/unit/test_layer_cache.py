@@ -0,0 +1,150 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import threading
+
+import pytest
+from click.testing import CliRunner
+
+from colin.cli.colin import cli
+from colin.core.exceptions import ColinException
+from colin.core.target import OciTarget
+from colin.utils.layer_cache import LayerCache
+from colin.utils import layer_cache
+from colin.utils.oci import OciImage
+from tests.oci_layout import LAYERS, make_oci_layout
+
+
+@pytest.fixture()
+def oci_layout(tmpdir):
+    path = str(tmpdir.join("oci"))
+    make_oci_layout(path, ref_name="colin", layers=LAYERS)
+    return path
+
+
+def test_checkout(tmpdir, oci_layout):
+    cache = LayerCache(path=str(tmpdir.join("cache")))
+    rootfs = str(tmpdir.join("rootfs"))
+    cache.checkout(OciImage(oci_layout, "colin"), rootfs)
+
+    with open(os.path.join(rootfs, "help.1")) as fd:
+        assert fd.read() == "help"
+    assert os.path.samefile(
+        os.path.join(rootfs, "help.1"), os.path.join(rootfs, "README.md")
+    )
+    assert not os.path.lexists(os.path.join(rootfs, "etc/os-release"))
+    assert not os.path.lexists(os.path.join(rootfs, "old-file"))
+    assert os.listdir(os.path.join(rootfs, "usr/share/doc")) == ["c"]
+    assert os.readlink(os.path.join(rootfs, "lib")) == "usr/lib"
+    assert os.readlink(os.path.join(rootfs, "etc/motd")) == "/help.1"
+    assert not any(
+        name.startswith(".wh.") for _, _, files in os.walk(rootfs) for name in files
+    )
+    assert cache.stats()["layers"] == 2
+
+
+def test_layers_shared_across_targets(tmpdir, oci_layout):
+    cache = LayerCache(path=str(tmpdir.join("cache")))
+    mount_points = []
+    for _ in range(2):
+        target = OciTarget(target=f"oci:{oci_layout}:colin", layer_cache=cache)
+        mount_points.append(target.mount_point)
+        assert target.file_is_present("/help.1")
+    assert cache.stats()["layers"] == 2
+    # both checkouts are hardlinked from the same cached file
+    assert os.path.samefile(
+        os.path.join(mount_points[0], "usr/lib/libc.so"),
+        os.path.join(mount_points[1], "usr/lib/libc.so"),
+    )
+
+
+def test_prune_lru(tmpdir, oci_layout):
+    cache = LayerCache(path=str(tmpdir.join("cache")))
+    image = OciImage(oci_layout, "colin")
+    cache.checkout(image, str(tmpdir.join("rootfs")))
+    base, top = image.diff_ids
+    os.utime(os.path.join(cache._entry_path(base), "metadata.json"), (1, 1))
+
+    assert cache.prune(max_size=cache.stats()["size"] - 1) == [base]
+    assert cache.get(base) is None
+    assert cache.get(top) is not None
+    assert cache.prune(max_size=0, keep=[top]) == []
+    assert cache.prune(max_size=0) == [top]
+
+
+def test_no_eviction_during_other_checkout(tmpdir, oci_layout, monkeypatch):
+    other_layout = str(tmpdir.join("other"))
+    make_oci_layout(other_layout, ref_name="other", layers=[[("other", b"other")]])
+    cache = LayerCache(path=str(tmpdir.join("cache")), max_size=0)
+
+    applying = threading.Event()
+    other_done = threading.Event()
+    apply_layer = layer_cache.apply_layer
+
+    def slow_apply(layer_path, rootfs, *args):
+        if rootfs.endswith("first"):
+            applying.set()
+            other_done.wait(5)
+        # the layer being applied is still in the cache
+        assert os.path.isdir(layer_path)
+        apply_layer(layer_path, rootfs, *args)
+
+    monkeypatch.setattr(layer_cache, "apply_layer", slow_apply)
+    errors = []
+
+    def first():
+        try:
+            cache.checkout(OciImage(oci_layout, "colin"), str(tmpdir.join("first")))
+        except Exception as ex:
+            errors.append(ex)
+
+    thread = threading.Thread(target=first)
+    thread.start()
+    applying.wait(5)
+    cache.checkout(OciImage(other_layout, "other"), str(tmpdir.join("second")))
+    # the other checkout is running, nothing was evicted
+    assert cache.stats()["layers"] == 2
+    other_done.set()
+    thread.join()
+    assert errors == []
+    # pruned by the last checkout, its own layers are kept
+    assert sorted(layer.diff_id for layer in cache.entries()) == sorted(
+        OciImage(oci_layout, "colin").diff_ids
+    )
+    assert cache.prune() == OciImage(oci_layout, "colin").diff_ids
+
+
+def test_digest_mismatch(tmpdir, oci_layout):
+    cache = LayerCache(path=str(tmpdir.join("cache")))
+    image = OciImage(oci_layout, "colin")
+    with pytest.raises(ColinException):
+        cache.add(image, image.layers[0], "sha256:" + "0" * 64)
+    assert cache.stats()["layers"] == 0
+    assert os.listdir(cache.path) == []
+
+
+def test_cache_cli(tmpdir, oci_layout):
+    envs = {"COLIN_CACHE_DIR": str(tmpdir.join("colin-cache"))}
+    LayerCache(path=str(tmpdir.join("colin-cache", "layers"))).checkout(
+        OciImage(oci_layout, "colin"), str(tmpdir.join("rootfs"))
+    )
+    result = CliRunner().invoke(cli, ["cache", "stats"], env=envs)
+    assert result.exit_code == 0
+    assert "layers: 2" in result.output
+
+    result = CliRunner().invoke(cli, ["cache", "prune", "--all"], env=envs)
+    assert result.exit_code == 0
+    assert "2 layer(s) removed." in result.output
@@ -17,7 +17,7 @@ import os
 import shutil
 
 import colin.checks
-from colin.core.loader import CheckLoader
+from colin.core.loader import CheckLoader, invalidate_check_registry
 
 
 def test_upstream_checks_can_be_loaded():
@@ -79,3 +79,62 @@ def test_import_class():
     check_name = "ArchitectureLabelCheck"
     imported_class = check_loader.import_class(f"colin.checks.labels.{check_name}")
     assert imported_class.name == "architecture_label"
+
+
+def test_registry_reuses_loaded_classes(tmpdir):
+    tests_dir = os.path.dirname(os.path.dirname(__file__))
+    a_check_dir = os.path.join(tests_dir, "data", "a_check")
+    shutil.copytree(a_check_dir, str(tmpdir.join("a_check")))
+
+    first = CheckLoader([str(tmpdir)]).mapping["a-peter-file-check"]
+    second = CheckLoader([str(tmpdir)]).mapping["a-peter-file-check"]
+    assert first is second
+
+
+def test_registry_reloads_changed_files(tmpdir):
+    tests_dir = os.path.dirname(os.path.dirname(__file__))
+    a_check_dir = os.path.join(tests_dir, "data", "a_check")
+    shutil.copytree(a_check_dir, str(tmpdir.join("a_check")))
+    check_file = str(tmpdir.join("a_check", "another_checks.py"))
+
+    first = CheckLoader([str(tmpdir)]).mapping["a-peter-file-check"]
+    st = os.stat(check_file)
+    os.utime(check_file, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    second = CheckLoader([str(tmpdir)]).mapping["a-peter-file-check"]
+    assert first is not second
+
+    invalidate_check_registry(str(tmpdir))
+    third = CheckLoader([str(tmpdir)]).mapping["a-peter-file-check"]
+    assert third is not second
+    assert CheckLoader([str(tmpdir)]).mapping["a-peter-file-check"] is third
+
+
+def test_fmf_tree_parsed_once_per_directory(tmpdir, monkeypatch):
+    from colin.core.checks import fmf_check
+
+    colin_checks_dir = os.path.dirname(colin.checks.__file__)
+    shutil.copytree(colin_checks_dir, str(tmpdir.join("checks")))
+    checks_dir = str(tmpdir.join("checks"))
+
+    parsed = []
+    original_init = fmf_check.FMFMetadataIndex.__init__
+
+    def counting_init(self, path):
+        parsed.append(path)
+        original_init(self, path)
+
+    monkeypatch.setattr(fmf_check.FMFMetadataIndex, "__init__", counting_init)
+    mapping = CheckLoader([checks_dir]).mapping
+    assert len(parsed) == 1
+    assert mapping["maintainer_label"].metadata.name.endswith("/maintainer_label")
+    assert mapping["bzcomponent_deprecated"].metadata.name.endswith(
+        "/bzcomponent_deprecated"
+    )
+
+    node = fmf_check.receive_fmf_metadata("maintainer_label", checks_dir)
+    assert node.name.endswith("/maintainer_label")
+    assert len(parsed) == 1
+
+    invalidate_check_registry(checks_dir)
+    fmf_check.receive_fmf_metadata("maintainer_label", checks_dir)
+    assert len(parsed) == 2
@@ -0,0 +1,427 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import io
+import os
+import shutil
+import stat
+import sys
+
+import pytest
+
+from colin.checks.best_practices import CmdOrEntrypointCheck, NoRootCheck
+from colin.core.check_runner import CheckPlan, go_through_checks
+from colin.core.checks.abstract_check import ImageAbstractCheck
+from colin.core.checks.filesystem import FileCheck
+from colin.core.constant import FACET_CONFIG, FACET_FILESYSTEM, UNPACK_SCRATCH_SIZE
+from colin.core.exceptions import ColinException
+from colin.core.result import CheckResult
+from colin.core.target import OciTarget
+from colin.utils.oci import (
+    FilesystemIndex,
+    _get_unpack_pool,
+    apply_layer,
+    extract_layer,
+    get_unpack_scratch_size,
+    OciImage,
+    PathFilter,
+    open_layer_blob,
+    remove_tree,
+    uncompressed_size,
+    unpack_image,
+)
+from colin.utils.layer_cache import LayerCache
+from tests.oci_layout import LAYERS, make_layer, make_oci_layout
+
+CONFIG = {
+    "User": "1001",
+    "Env": ["PATH=/usr/bin", "NAME=colin"],
+    "Cmd": ["/bin/sh"],
+    "Labels": {"name": "colin", "maintainer": "me"},
+}
+
+
+@pytest.fixture()
+def oci_layout(tmpdir):
+    path = str(tmpdir.join("oci"))
+    make_oci_layout(path, ref_name="colin", layers=[[("etc/", None)]], config=CONFIG)
+    return path
+
+
+def test_oci_image(oci_layout):
+    image = OciImage(layout_path=oci_layout, ref_name="colin")
+    assert image.labels == CONFIG["Labels"]
+    assert image.config["os"] == "linux"
+    assert len(image.layers) == 1
+    assert len(image.diff_ids) == 1
+    metadata = image.config_metadata
+    assert metadata["User"] == "1001"
+    assert metadata["Env"] == CONFIG["Env"]
+    assert metadata["Config"]["Cmd"] == ["/bin/sh"]
+    assert metadata["Digest"] == image.manifest_digest
+
+
+def test_oci_image_not_found(oci_layout):
+    with pytest.raises(ColinException):
+        OciImage(layout_path=oci_layout, ref_name="nope").config
+
+
+def test_oci_invalid_digest(oci_layout):
+    with pytest.raises(ColinException):
+        OciImage(layout_path=oci_layout, ref_name="colin").blob_path("../../etc")
+
+
+def test_oci_target_metadata(oci_layout):
+    target = OciTarget(target=f"oci:{oci_layout}:colin")
+    assert target.labels == CONFIG["Labels"]
+    assert CmdOrEntrypointCheck().check(target).ok
+    assert NoRootCheck().check(target).ok
+
+
+@pytest.fixture()
+def layered_oci_layout(tmpdir):
+    path = str(tmpdir.join("oci"))
+    make_oci_layout(path, ref_name="colin", layers=LAYERS, config=CONFIG)
+    return path
+
+
+@pytest.mark.parametrize("compression", ["gzip", None])
+def test_filesystem_index(tmpdir, compression):
+    path = str(tmpdir.join("oci"))
+    make_oci_layout(path, ref_name="colin", layers=LAYERS, compression=compression)
+    index = FilesystemIndex.from_image(OciImage(layout_path=path, ref_name="colin"))
+
+    assert index.file_is_present("/help.1")
+    assert index.file_is_present("README.md")
+    assert index.stat("/README.md").st_size == len(b"help")
+    assert not index.file_is_present("/etc/os-release")
+    assert not index.file_is_present("/old-file")
+    assert index.list_dir("/usr/share/doc") == ["c"]
+    assert index.file_is_present("/usr/share/doc/c/README")
+    assert not index.file_is_present("/usr/share/doc/a/README")
+    assert index.file_is_present("/lib/libc.so")
+    assert index.file_is_present("/etc/motd")
+    assert "/etc/loop" not in index
+    assert stat.S_ISDIR(index.stat("/usr").st_mode)
+    with pytest.raises(OSError):
+        index.file_is_present("/etc")
+    with pytest.raises(FileNotFoundError):
+        index.stat("/nope")
+
+
+def test_oci_target_files_without_unpack(layered_oci_layout):
+    target = OciTarget(target=f"oci:{layered_oci_layout}:colin")
+    assert target.file_is_present("/help.1")
+    assert not target.file_is_present("/etc/os-release")
+    assert stat.S_ISREG(target.stat("/README.md").st_mode)
+    # nothing was unpacked
+    assert target._mount_point is None
+    assert target._tmpdir is None
+
+    check = FileCheck(
+        message="",
+        description="",
+        reference_url="",
+        tags=[],
+        files=["/help.1", "/README.md"],
+        all_must_be_present=True,
+    )
+    check.name = "help"
+    assert check.check(target).ok
+
+
+def test_path_filter():
+    path_filter = PathFilter(["/etc/os-release", "usr/share/doc/", "/usr/lib/*.so"])
+    assert path_filter.matches("/etc/os-release")
+    assert not path_filter.matches("/etc/motd")
+    assert path_filter.matches("/usr/share/doc")
+    assert path_filter.matches("/usr/share/doc/a/README")
+    assert not path_filter.matches("/usr/share/docs")
+    assert path_filter.matches("/usr/lib/libc.so")
+    assert not path_filter.matches("/usr/lib/libc.so.6")
+
+
+def test_unpack_image_selected_paths(tmpdir, layered_oci_layout):
+    image = OciImage(layout_path=layered_oci_layout, ref_name="colin")
+    path_filter = PathFilter(["/README.md", "/usr/share/doc/", "/lib/libc.so"])
+    path_filter = path_filter.resolve(FilesystemIndex.from_image(image))
+    # hardlink and symlink targets
+    assert {"/help.1", "/usr/lib/libc.so"} <= path_filter.files
+
+    rootfs = str(tmpdir.join("rootfs"))
+    unpack_image(image, rootfs, path_filter)
+    with open(os.path.join(rootfs, "README.md")) as fd:
+        assert fd.read() == "help"
+    with open(os.path.join(rootfs, "lib/libc.so")) as fd:
+        assert fd.read() == "libc"
+    assert os.listdir(os.path.join(rootfs, "usr/share/doc")) == ["c"]
+    assert not os.path.lexists(os.path.join(rootfs, "etc/os-release"))
+    assert not os.path.lexists(os.path.join(rootfs, "old-file"))
+    assert not any(
+        name.startswith(".wh.") for _, _, files in os.walk(rootfs) for name in files
+    )
+
+
+@pytest.fixture()
+def host_file(tmpdir):
+    host = tmpdir.mkdir("host")
+    host.join("secret").write("secret")
+    return str(host)
+
+
+def test_extract_layer_hardlink_stays_inside(tmpdir, host_file):
+    layer = make_layer(
+        [
+            ("a", ("symlink", host_file)),
+            ("b", ("symlink", "/usr")),
+            ("usr/", None),
+            ("usr/file", b"file"),
+            ("x", ("hardlink", "a/secret")),
+            ("y", ("hardlink", "b/file")),
+        ]
+    )
+    dest = str(tmpdir.mkdir("layer"))
+    _, lower_hardlinks, _ = extract_layer(io.BytesIO(layer), dest)
+    assert not os.path.lexists(os.path.join(dest, "x"))
+    # symlinks are resolved inside the layer
+    assert os.path.samefile(os.path.join(dest, "y"), os.path.join(dest, "usr/file"))
+    assert lower_hardlinks == [("x", "a/secret")]
+
+    rootfs = str(tmpdir.mkdir("rootfs"))
+    apply_layer(dest, rootfs, lower_hardlinks)
+    assert not os.path.lexists(os.path.join(rootfs, "x"))
+    assert os.stat(os.path.join(host_file, "secret")).st_nlink == 1
+
+
+def test_apply_layer_hardlink_stays_inside(tmpdir, host_file):
+    rootfs = tmpdir.mkdir("rootfs")
+    rootfs.join("a").mksymlinkto(host_file)
+    rootfs.join("b").mksymlinkto("../../..")
+    rootfs.mkdir("usr").join("file").write("file")
+    layer_dir = str(tmpdir.mkdir("layer"))
+
+    apply_layer(
+        layer_dir,
+        str(rootfs),
+        [("x", "a/secret"), ("y", "b/usr/file"), ("z", "b/host/secret")],
+    )
+    assert not rootfs.join("x").check(exists=True)
+    assert not rootfs.join("z").check(exists=True)
+    # ".." stops at the root
+    assert os.path.samefile(str(rootfs.join("y")), str(rootfs.join("usr/file")))
+    assert os.stat(os.path.join(host_file, "secret")).st_nlink == 1
+
+
+def test_invalid_whiteouts_stay_inside(tmpdir):
+    layers = [
+        [("dir/", None), ("dir/file", b"file")],
+        [
+            ("dir/", None),
+            ("dir/.wh...", b""),
+            ("dir/.wh..", b""),
+            (".wh...", b""),
+            (".wh.", b""),
+        ],
+    ]
+    path = str(tmpdir.join("oci"))
+    make_oci_layout(path, ref_name="colin", layers=layers)
+    image = OciImage(layout_path=path, ref_name="colin")
+    checkout = tmpdir.mkdir("checkout")
+    checkout.join("sibling").write("sibling")
+    rootfs = str(checkout.join("rootfs"))
+
+    unpack_image(image, rootfs, jobs=1)
+    assert checkout.join("sibling").read() == "sibling"
+    with open(os.path.join(rootfs, "dir/file")) as fd:
+        assert fd.read() == "file"
+    assert os.listdir(rootfs) == ["dir"]
+    assert FilesystemIndex.from_image(image).file_is_present("/dir/file")
+
+
+MODES_LAYERS = [
+    [
+        ("bin/", None, {}),
+        ("bin/su", b"su", {"mode": 0o4755}),
+        ("tmp/", None, {"mode": 0o1777}),
+        ("root/", None, {"mode": 0o550, "uid": 0, "gid": 0}),
+        ("root/.bashrc", b"rc", {"mode": 0o600}),
+        ("home/user/", None, {"mode": 0o700, "uid": 1000, "gid": 1000}),
+        ("home/user/key", b"key", {"mode": 0o400, "uid": 1000, "gid": 1000}),
+        ("etc/shadow", b"", {"mode": 0o000}),
+    ],
+    [
+        # written to the directories of the lower layer the owner cannot write to
+        ("root/.profile", b"profile", {"mode": 0o640, "uid": 0, "gid": 10}),
+        ("home/user/bin", ("symlink", "/bin"), {"uid": 1000, "gid": 1000}),
+    ],
+]
+
+
+@pytest.mark.parametrize("unpack", ["sequential", "parallel", "layer_cache"])
+def test_unpack_image_keeps_modes(tmpdir, unpack):
+    path = str(tmpdir.join("oci"))
+    make_oci_layout(path, ref_name="colin", layers=MODES_LAYERS)
+    image = OciImage(layout_path=path, ref_name="colin")
+    rootfs = str(tmpdir.join("checkout", "rootfs"))
+    if unpack == "layer_cache":
+        LayerCache(path=str(tmpdir.join("cache"))).checkout(image, rootfs)
+    else:
+        unpack_image(image, rootfs, jobs=1 if unpack == "sequential" else 2)
+
+    # the tar headers of the layers
+    for entry_path, content, header in (e for layer in MODES_LAYERS for e in layer):
+        actual = os.lstat(os.path.join(rootfs, entry_path.rstrip("/")))
+        if content is None:
+            assert stat.S_ISDIR(actual.st_mode)
+            expected_mode = header.get("mode", 0o755)
+        elif isinstance(content, tuple):
+            assert stat.S_ISLNK(actual.st_mode)
+            expected_mode = stat.S_IMODE(actual.st_mode)
+        else:
+            assert stat.S_ISREG(actual.st_mode)
+            expected_mode = header.get("mode", 0o644)
+        assert oct(stat.S_IMODE(actual.st_mode)) == oct(expected_mode), entry_path
+        if os.geteuid() == 0:
+            assert (actual.st_uid, actual.st_gid) == (
+                header.get("uid", 0),
+                header.get("gid", 0),
+            ), entry_path
+
+    remove_tree(str(tmpdir.join("checkout")))
+    assert not tmpdir.join("checkout").check(exists=True)
+
+
+def test_oci_target_unpacks_whole_image(tmpdir):
+    path = str(tmpdir.join("oci"))
+    make_oci_layout(path, ref_name="colin", layers=MODES_LAYERS)
+    target = OciTarget(target=f"oci:{path}:colin")
+    su = os.path.join(target.mount_point, "bin/su")
+    # unpacked without umoci
+    assert stat.S_IMODE(os.stat(su).st_mode) == 0o4755
+    assert stat.S_IMODE(os.stat(os.path.dirname(su)).st_mode) == 0o755
+    tmpdir_path = target.tmpdir
+    target.clean_up()
+    assert not os.path.exists(tmpdir_path)
+
+
+def _tree(root):
+    tree = {}
+    for dir_path, dirs, files in os.walk(root):
+        for name in dirs + files:
+            path = os.path.join(dir_path, name)
+            if os.path.islink(path):
+                tree[os.path.relpath(path, root)] = os.readlink(path)
+            elif os.path.isfile(path):
+                with open(path, "rb") as fd:
+                    tree[os.path.relpath(path, root)] = fd.read()
+            else:
+                tree[os.path.relpath(path, root)] = None
+    return tree
+
+
+@pytest.mark.parametrize("compression", ["gzip", "zstd", None])
+def test_unpack_image_parallel(tmpdir, compression):
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    path = str(tmpdir.join("oci"))
+    make_oci_layout(path, ref_name="colin", layers=LAYERS, compression=compression)
+    image = OciImage(layout_path=path, ref_name="colin")
+    for digest in image.layers:
+        assert uncompressed_size(image.blob_path(digest["digest"])) > 0
+
+    unpack_image(image, str(tmpdir.join("sequential", "rootfs")), jobs=1)
+    # a scratch space for a single layer: the layers are extracted one by one
+    for jobs, scratch_size in ((2, None), (2, 1)):
+        rootfs = str(tmpdir.join(f"parallel-{scratch_size}", "rootfs"))
+        unpack_image(image, rootfs, jobs=jobs, scratch_size=scratch_size)
+        assert _tree(rootfs) == _tree(str(tmpdir.join("sequential", "rootfs")))
+        # staging directories are removed
+        assert os.listdir(os.path.dirname(rootfs)) == ["rootfs"]
+    assert not os.path.lexists(os.path.join(rootfs, "etc/os-release"))
+    assert os.listdir(os.path.join(rootfs, "usr/share/doc")) == ["c"]
+    # one pool of processes for all the unpacks
+    assert _get_unpack_pool(2) is _get_unpack_pool(2)
+
+
+def test_unpack_scratch_size_bounded(tmpdir, monkeypatch):
+    monkeypatch.delenv("COLIN_UNPACK_SCRATCH_SIZE", raising=False)
+    free = shutil.disk_usage(str(tmpdir)).free
+    assert get_unpack_scratch_size(str(tmpdir)) == min(free // 2, UNPACK_SCRATCH_SIZE)
+    monkeypatch.setenv("COLIN_UNPACK_SCRATCH_SIZE", "1024")
+    assert get_unpack_scratch_size(str(tmpdir)) == 1024
+
+
+def test_zstd_without_zstandard(tmpdir, monkeypatch):
+    blob = tmpdir.join("blob")
+    blob.write_binary(b"\x28\xb5\x2f\xfd" + b"\0" * 16)
+    monkeypatch.setitem(sys.modules, "zstandard", None)
+    with pytest.raises(ColinException, match="zstandard"):
+        open_layer_blob(str(blob))
+
+
+class ReadmeCheck(ImageAbstractCheck):
+    name = "readme_content"
+    facets = (FACET_FILESYSTEM,)
+    paths = ("/README.md",)
+
+    def __init__(self):
+        super().__init__(message="", description="", reference_url="", tags=[])
+
+    def check(self, target):
+        return CheckResult(
+            ok=target.read_file("/README.md") == "help",
+            description=self.description,
+            message=self.message,
+            reference_url=self.reference_url,
+            check_name=self.name,
+            logs=[],
+        )
+
+
+def test_oci_target_unpacks_paths_of_checks(layered_oci_layout):
+    target = OciTarget(target=f"oci:{layered_oci_layout}:colin")
+    file_check = FileCheck(
+        message="",
+        description="",
+        reference_url="",
+        tags=[],
+        files=["/help.1"],
+        all_must_be_present=True,
+    )
+    file_check.name = "help"
+    results = go_through_checks(target, [ReadmeCheck(), NoRootCheck(), file_check])
+    assert [r.status for r in results.results] == ["PASS", "PASS", "PASS"]
+    assert target.path_filter.files == {"/README.md", "/help.1"}
+
+    check = ReadmeCheck()
+    check.paths = ()
+    assert CheckPlan([check]).path_filter is None
+
+
+class ConfigCheck(ImageAbstractCheck):
+    """declares a facet only, the paths it reads are not known"""
+
+    name = "config_check"
+    facets = (FACET_CONFIG,)
+
+    def __init__(self):
+        super().__init__(message="", description="", reference_url="", tags=[])
+
+
+def test_path_filter_needs_all_checks_to_opt_in():
+    assert CheckPlan([ReadmeCheck(), ConfigCheck()]).path_filter is None
+    assert CheckPlan([ReadmeCheck(), NoRootCheck()]).path_filter is not None
+    # none of the checks reads the filesystem
+    assert CheckPlan([NoRootCheck()]).path_filter is None
@@ -0,0 +1,215 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import json
+import socketserver
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+from colin.core.colin import run
+from colin.core.exceptions import ColinException
+from colin.core.target import ImageTarget
+from colin.utils.podman import PodmanApi, PodmanCli, get_podman
+
+IMAGE_ID = "f" * 64
+IMAGE_NAME = "quay.io/example/app:1"
+
+
+class _StubPodmanHandler(BaseHTTPRequestHandler):
+    """the part of the libpod API used by colin, for one image"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, data=None):
+        body = json.dumps(data).encode() if data is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self):
+        stub = self.server
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else None
+        url = urllib.parse.urlsplit(self.path)
+        prefix = "/v4.0.0/libpod"
+        assert url.path.startswith(prefix)
+        path = urllib.parse.unquote(url.path.replace(prefix, "", 1))
+        stub.requests.append((self.command, path))
+        query = dict(urllib.parse.parse_qsl(url.query))
+
+        if self.command == "GET" and path == f"/images/{IMAGE_NAME}/json":
+            if not stub.present:
+                return self._reply(404, {"message": "image not known"})
+            return self._reply(
+                200, {"Id": IMAGE_ID, "Labels": {"name": "app"}, "User": "app"}
+            )
+        if self.command == "GET" and path.endswith("/json"):
+            return self._reply(404, {"message": "image not known"})
+        if self.command == "POST" and path == "/images/pull":
+            if query["reference"] != IMAGE_NAME:
+                return self._reply(200, {"error": "manifest unknown"})
+            stub.present = True
+            return self._reply(200, {"id": IMAGE_ID, "images": [IMAGE_ID]})
+        if self.command == "POST" and path == "/containers/create":
+            assert body["image"] == IMAGE_ID
+            stub.containers.add("c1")
+            return self._reply(201, {"Id": "c1", "Warnings": []})
+        if self.command == "POST" and path == "/containers/c1/mount":
+            return self._reply(200, stub.root)
+        if self.command == "POST" and path == "/containers/c1/unmount":
+            return self._reply(204)
+        if self.command == "DELETE" and path == "/containers/c1":
+            stub.containers.discard("c1")
+            return self._reply(200, [{"Id": "c1"}])
+        return self._reply(404, {"message": f"no such path {path}"})
+
+    do_GET = do_POST = do_DELETE = _route
+
+
+class _StubPodmanServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, root):
+        super().__init__(socket_path, _StubPodmanHandler)
+        self.root = root
+        self.present = True
+        self.requests = []
+        self.containers = set()
+        self.connections = 0
+
+    def process_request(self, request, client_address):
+        self.connections += 1
+        super().process_request(request, client_address)
+
+
+@pytest.fixture()
+def podman_service(tmpdir):
+    root = tmpdir.mkdir("rootfs")
+    root.mkdir("usr")
+    root.join("README.md").write("readme")
+    server = _StubPodmanServer(str(tmpdir.join("podman.sock")), str(root))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_get_podman(podman_service, monkeypatch):
+    monkeypatch.delenv("COLIN_PODMAN_SOCKET", raising=False)
+    assert isinstance(get_podman(), PodmanCli)
+
+    socket_path = podman_service.server_address
+    api = get_podman(socket_path)
+    assert isinstance(api, PodmanApi)
+    assert get_podman(f"unix://{socket_path}") is api
+    assert get_podman(api) is api
+
+    monkeypatch.setenv("COLIN_PODMAN_SOCKET", socket_path)
+    assert get_podman() is api
+
+
+def test_image_target_by_api(podman_service):
+    api = PodmanApi(podman_service.server_address, mount_idle_timeout=0)
+    target = ImageTarget(IMAGE_NAME, pull=False, podman=api)
+    assert target.image_id == IMAGE_ID
+    assert target.labels == {"name": "app"}
+    assert target.file_is_present("/README.md")
+    assert podman_service.containers == {"c1"}
+
+    # the mount of the image is shared
+    other = ImageTarget(IMAGE_NAME, pull=False, podman=api)
+    assert other.mount_point == target.mount_point
+    assert api.image_mounts.mounted == {IMAGE_ID: 2}
+    target.clean_up()
+    assert podman_service.containers == {"c1"}
+
+    other.clean_up()
+    assert podman_service.containers == set()
+    assert ("POST", "/containers/c1/unmount") in podman_service.requests
+    # the keep-alive connection is reused
+    assert podman_service.connections == 1
+
+
+def test_image_target_pull(podman_service):
+    podman_service.present = False
+    api = PodmanApi(podman_service.server_address)
+    with pytest.raises(ColinException, match="not found"):
+        ImageTarget(IMAGE_NAME, pull=False, podman=api)
+
+    target = ImageTarget(IMAGE_NAME, pull=True, podman=api)
+    assert target.image_id == IMAGE_ID
+
+    with pytest.raises(ColinException, match="Cannot pull an image"):
+        ImageTarget("quay.io/example/missing:1", pull=True, podman=api)
+
+
+def test_run_by_api(podman_service):
+    ruleset = {
+        "version": "1",
+        "checks": [
+            {"name": "name_label"},
+            {"name": "no_root"},
+            {"name": "help_file_or_readme"},
+        ],
+    }
+    results = run(
+        IMAGE_NAME,
+        "image",
+        ruleset=ruleset,
+        podman=podman_service.server_address,
+    )
+    assert {r.check_name: r.status for r in results.results} == {
+        "name_label": "PASS",
+        "no_root": "PASS",
+        "help_file_or_readme": "PASS",
+    }
+    # kept mounted for the next target of the image
+    api = get_podman(podman_service.server_address)
+    assert api.image_mounts.mounted == {IMAGE_ID: 0}
+    api.image_mounts.release_all()
+    assert podman_service.containers == set()
+
+
+def test_api_not_running(tmpdir):
+    api = PodmanApi(str(tmpdir.join("missing.sock")))
+    with pytest.raises(ColinException, match="Cannot connect to the podman API"):
+        api.find_image(IMAGE_NAME)
+
+
+def test_api_mount_error_kept(tmpdir, monkeypatch):
+    api = PodmanApi(str(tmpdir.join("missing.sock")))
+    monkeypatch.setattr(api, "create", lambda image_id: "c1")
+
+    def fail(error):
+        def call(*_):
+            raise ColinException(error)
+
+        return call
+
+    monkeypatch.setattr(api, "mount", fail("Cannot mount."))
+    monkeypatch.setattr(api, "unmount", fail("Cannot unmount."))
+    monkeypatch.setattr(api, "remove", fail("Cannot remove."))
+    with pytest.raises(ColinException, match="Cannot mount."):
+        api.mount_image(IMAGE_ID)
+    assert api._containers == {}
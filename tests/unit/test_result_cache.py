@@ -0,0 +1,120 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import io
+
+from colin.core.check_runner import go_through_checks
+from colin.core.checks.abstract_check import ImageAbstractCheck
+from colin.core.constant import ERROR, FACET_FILESYSTEM, PASSED
+from colin.core.result import CheckResult
+from colin.core.result_cache import ResultCache, check_fingerprint
+from colin.core.target import DockerfileTarget, Target
+
+
+class IdentifiedTarget(Target):
+    def __init__(self, identity):
+        super().__init__()
+        self._identity = identity
+        self.prepared = []
+
+    def _own_identity(self):
+        return self._identity
+
+    def prepare(self, facets):
+        self.prepared.append(set(facets))
+
+
+class CountingCheck(ImageAbstractCheck):
+    facets = (FACET_FILESYSTEM,)
+
+    def __init__(self, name, fail=False):
+        super().__init__(
+            message="message", description="description", reference_url="", tags=[]
+        )
+        self.name = name
+        self.fail = fail
+        # not an attribute of the check (it would change the fingerprint)
+        self._calls = 0
+
+    @property
+    def calls(self):
+        return self._calls
+
+    def check(self, target):
+        self._calls += 1
+        if self.fail:
+            raise RuntimeError("broken")
+        return CheckResult(
+            ok=True,
+            description=self.description,
+            message=self.message,
+            reference_url=self.reference_url,
+            check_name=self.name,
+            logs=["log"],
+        )
+
+
+def _statuses(results):
+    return [(r.check_name, r.status, r.logs) for r in results.results]
+
+
+def test_cached_results_do_not_touch_the_target(tmpdir):
+    cache = ResultCache(str(tmpdir))
+    checks = [CountingCheck("good"), CountingCheck("bad", fail=True)]
+
+    first = go_through_checks(IdentifiedTarget("t1"), checks, result_cache=cache)
+    assert _statuses(first) == [("good", PASSED, ["log"]), ("bad", ERROR, ["broken"])]
+
+    target = IdentifiedTarget("t1")
+    second = go_through_checks(target, checks, result_cache=cache)
+    assert _statuses(second) == _statuses(first)
+    # errors are not cached
+    assert [c.calls for c in checks] == [1, 2]
+
+    checks[1].fail = False
+    list(go_through_checks(IdentifiedTarget("t1"), checks, result_cache=cache).results)
+    target = IdentifiedTarget("t1")
+    list(go_through_checks(target, checks, result_cache=cache).results)
+    assert [c.calls for c in checks] == [1, 3]
+    assert target.prepared == []
+
+
+def test_changed_check_or_target_is_run_again(tmpdir):
+    cache = ResultCache(str(tmpdir))
+    check = CountingCheck("good")
+    list(go_through_checks(IdentifiedTarget("t1"), [check], result_cache=cache).results)
+    list(go_through_checks(IdentifiedTarget("t2"), [check], result_cache=cache).results)
+    assert check.calls == 2
+
+    fingerprint = check_fingerprint(check)
+    check.message = "other message"
+    assert check_fingerprint(check) != fingerprint
+    list(go_through_checks(IdentifiedTarget("t1"), [check], result_cache=cache).results)
+    assert check.calls == 3
+
+
+def test_unidentified_target_is_not_cached(tmpdir):
+    cache = ResultCache(str(tmpdir))
+    check = CountingCheck("good")
+    for _ in range(2):
+        list(go_through_checks(Target(), [check], result_cache=cache).results)
+    assert check.calls == 2
+
+
+def test_dockerfile_identity():
+    first = DockerfileTarget(io.StringIO("FROM fedora\n"))
+    second = DockerfileTarget(io.StringIO("FROM fedora\n"))
+    third = DockerfileTarget(io.StringIO("FROM centos\n"))
+    assert first.identity == second.identity != third.identity
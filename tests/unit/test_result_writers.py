@@ -0,0 +1,119 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import io
+import json
+from xml.dom import minidom
+from xml.etree.ElementTree import Element, SubElement, tostring
+
+from click.testing import CliRunner
+
+from colin.cli.colin import check
+from colin.core.result import CheckResult, CheckResults
+from colin.core.result_writers import JsonLinesWriter, XunitWriter
+
+RESULTS = [
+    CheckResult(True, "description", "message", 'url&"', "first", []),
+    CheckResult(False, "d", "m", "", "sécond", ["log <a> & 'b' \"c\"\nd", "e"]),
+]
+
+
+def _minidom_xunit(testsuites):
+    top = Element("testsuites")
+    for name, results in testsuites:
+        testsuite = SubElement(top, "testsuite", {"name": name} if name else {})
+        for r in results:
+            testcase = SubElement(
+                testsuite,
+                "testcase",
+                {
+                    "name": r.check_name,
+                    "status": "PASSED" if r.ok else "FAILED",
+                    "url": r.reference_url,
+                },
+            )
+            if r.logs:
+                logs = SubElement(testcase, "logs")
+                for log in r.logs:
+                    SubElement(
+                        logs,
+                        "log",
+                        {
+                            "message": log,
+                            "result": "INFO",
+                            "waiver_authorization": "Not Waivable",
+                        },
+                    )
+    return minidom.parseString(tostring(top, "utf-8")).toprettyxml(indent="  ")
+
+
+def test_xunit_same_as_minidom():
+    assert CheckResults(RESULTS).xunit == _minidom_xunit([(None, RESULTS)])
+    assert CheckResults([]).xunit == _minidom_xunit([(None, [])])
+
+    output = io.StringIO()
+    with XunitWriter(output) as writer:
+        writer.add_testsuite(RESULTS, name="a&b")
+        writer.add_testsuite([], name="d")
+    assert output.getvalue() == _minidom_xunit([("a&b", RESULTS), ("d", [])])
+
+
+def test_results_streamed_as_they_come():
+    jsonl = io.StringIO()
+    xunit = io.StringIO()
+
+    def results():
+        yield RESULTS[0]
+        # the first result is already written
+        assert json.loads(jsonl.getvalue())["name"] == "first"
+        assert 'name="first"' in xunit.getvalue()
+        yield RESULTS[1]
+
+    check_results = CheckResults(results())
+    check_results.add_listener(JsonLinesWriter(jsonl).add)
+    with XunitWriter(xunit) as writer:
+        writer.start_testsuite()
+        check_results.add_listener(writer.add)
+        list(check_results.results)
+
+    records = [json.loads(line) for line in jsonl.getvalue().splitlines()]
+    assert records == json.loads(check_results.json)["checks"]
+    assert xunit.getvalue() == check_results.xunit
+
+
+def test_cli_jsonl_to_stdout(tmpdir):
+    dockerfile = tmpdir.join("Dockerfile")
+    dockerfile.write("FROM fedora:latest\n")
+    xunit_file = tmpdir.join("out.xml")
+    result = CliRunner().invoke(
+        check,
+        [
+            str(dockerfile),
+            "--target-type",
+            "dockerfile",
+            "--tag",
+            "from",
+            "--jsonl",
+            "-",
+            "--xunit",
+            str(xunit_file),
+        ],
+    )
+    assert result.exit_code == 3, result.output
+    *records, phases = [json.loads(line) for line in result.output.splitlines()]
+    assert {r["name"] for r in records} == {"from_tag_not_latest"}
+    assert records[0]["status"] == "FAIL"
+    assert records[0]["metrics"]["wall_time"] >= 0
+    assert {"target", "ruleset", "clean_up"} <= set(phases["phases"])
+    assert 'name="from_tag_not_latest" status="FAILED"' in xunit_file.read()
@@ -17,7 +17,11 @@ import os
 
 import pytest
 
+from colin.core.checks import fmf_check
 from colin.core.exceptions import ColinRulesetException
+from colin.core.loader import invalidate_check_registry
+from colin.core.ruleset import loader
+from colin.core.ruleset.cache import CompiledCache
 from colin.core.ruleset.ruleset import Ruleset
 
 
@@ -105,3 +109,64 @@ def test_ruleset_override():
     assert len(checks) == 1
     assert checks[0].message == m
     assert checks[0].just == "testing"
+
+
+def test_compiled_cache_skips_parsing(tmpdir, monkeypatch):
+    tests_dir = os.path.dirname(os.path.dirname(__file__))
+    lol_ruleset_path = os.path.join(tests_dir, "data", "lol-ruleset.yaml")
+    cache = CompiledCache(str(tmpdir))
+
+    with open(lol_ruleset_path) as fd:
+        cold = Ruleset(ruleset_file=fd, compiled_cache=cache).get_checks(None)
+
+    invalidate_check_registry()
+
+    def fail(*_, **__):
+        raise AssertionError("parsed again")
+
+    monkeypatch.setattr(loader.yaml, "safe_load", fail)
+    monkeypatch.setattr(fmf_check, "ExtendedTree", fail)
+    with open(lol_ruleset_path) as fd:
+        warm = Ruleset(ruleset_file=fd, compiled_cache=cache).get_checks(None)
+
+    assert [c.json for c in warm] == [c.json for c in cold]
+
+
+def test_compiled_cache_rebuilds_on_change(tmpdir):
+    cache = CompiledCache(str(tmpdir.join("cache")))
+    ruleset_path = tmpdir.join("ruleset.yaml")
+    ruleset_path.write('version: "1"\nchecks:\n  - name: name_label\n')
+    with open(str(ruleset_path)) as fd:
+        checks = Ruleset(ruleset_file=fd, compiled_cache=cache).get_checks(None)
+    assert [c.name for c in checks] == ["name_label"]
+
+    ruleset_path.write('version: "1"\nchecks:\n  - name: maintainer_label\n')
+    with open(str(ruleset_path)) as fd:
+        checks = Ruleset(ruleset_file=fd, compiled_cache=cache).get_checks(None)
+    assert [c.name for c in checks] == ["maintainer_label"]
+
+
+def test_ruleset_compile_reuses_plan():
+    r = Ruleset(ruleset={"version": "1", "checks": [{"name": "name_label"}]})
+    plan = r.compile(None, tags=["name"])
+    assert [c.name for c in plan] == ["name_label"]
+    assert r.compile(None, tags=["name"]) is plan
+    assert r.compile(None) is not plan
+    assert r.compile(None, tags=["label"], skips=["name_label"]) is not plan
+    assert len(r.compile(None, tags=["label"], skips=["name_label"])) == 0
+
+
+def test_ruleset_compile_precompiles_regex():
+    r = {
+        "version": "1",
+        "checks": [{"name": "name_label", "value_regex": "^fed"}],
+    }
+    check = Ruleset(ruleset=r).compile(None).checks[0]
+    assert check.get_pattern("^fed") is check.get_pattern("^fed")
+    assert check.get_pattern("^fed").search("fedora")
+
+
+def test_ruleset_invalid_regex():
+    r = {"version": "1", "checks": [{"name": "name_label", "value_regex": "(fed"}]}
+    with pytest.raises(ColinRulesetException):
+        Ruleset(ruleset=r).compile(None)
@@ -0,0 +1,130 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import json
+import time
+
+from click.testing import CliRunner
+
+from colin.cli.colin import check
+from colin.core.colin import run_many
+from colin.core.target import DockerfileTarget
+
+RULESET = {
+    "version": "1",
+    "checks": [{"name": "from_tag_not_latest"}, {"name": "maintainer_label"}],
+}
+
+
+def _dockerfiles(tmpdir):
+    paths = []
+    for name, content in [
+        ("a", "FROM fedora:35\nLABEL maintainer=me\n"),
+        ("b", "FROM fedora:latest\n"),
+        ("c", "FROM fedora:35\nLABEL maintainer=me\n"),
+    ]:
+        path = tmpdir.join(name)
+        path.write(content)
+        paths.append(str(path))
+    return paths
+
+
+def test_run_many(tmpdir):
+    a, b, c = _dockerfiles(tmpdir)
+    missing = str(tmpdir.join("missing"))
+    results = list(
+        run_many(
+            targets=[a, b, c, missing, a],
+            target_type="dockerfile",
+            ruleset=RULESET,
+            target_jobs=2,
+        )
+    )
+    assert [r.target for r in results] == [a, b, c, missing, a]
+
+    assert results[0].ok and not results[0].fail
+    assert results[1].ok and results[1].fail
+    assert results[2].duplicate_of == a
+    assert results[2].results is results[0].results
+    assert results[3].error is not None and not results[3].ok
+    assert results[4].results is results[0].results
+
+    statuses = {r.check_name: r.status for r in results[1].results.results}
+    assert statuses == {"from_tag_not_latest": "FAIL", "maintainer_label": "FAIL"}
+
+
+def test_first_of_same_targets_is_original(tmpdir, monkeypatch):
+    a, b, c = _dockerfiles(tmpdir)
+    own_identity = DockerfileTarget._own_identity
+
+    def slow_identity(target):
+        # c is identified before a
+        if target.target_name == a:
+            time.sleep(0.3)
+        return own_identity(target)
+
+    monkeypatch.setattr(DockerfileTarget, "_own_identity", slow_identity)
+    results = list(
+        run_many(
+            targets=[a, c, a],
+            target_type="dockerfile",
+            ruleset=RULESET,
+            target_jobs=2,
+        )
+    )
+    assert [(r.target, r.duplicate_of) for r in results] == [
+        (a, None),
+        (c, a),
+        (a, a),
+    ]
+    assert results[0].ok
+    assert results[1].results is results[0].results
+    assert results[2].results is results[0].results
+
+
+def test_check_more_targets(tmpdir):
+    a, b, c = _dockerfiles(tmpdir)
+    targets_file = tmpdir.join("targets")
+    targets_file.write(f"# dockerfiles\n{b}\n\n{c}\n")
+    ruleset_file = tmpdir.join("ruleset.json")
+    ruleset_file.write(json.dumps(RULESET))
+    json_file = tmpdir.join("out.json")
+    jsonl_file = tmpdir.join("out.jsonl")
+
+    result = CliRunner().invoke(
+        check,
+        [
+            a,
+            "--targets-from",
+            str(targets_file),
+            "--target-type",
+            "dockerfile",
+            "-f",
+            str(ruleset_file),
+            "--json",
+            str(json_file),
+            "--jsonl",
+            str(jsonl_file),
+        ],
+    )
+    assert result.exit_code == 3, result.output
+    assert f"{a}:" in result.output
+    assert f"(same as {a})" in result.output
+    output = json.loads(json_file.read())
+    assert [t["target"] for t in output["targets"]] == [a, b, c]
+    assert [len(t["checks"]) for t in output["targets"]] == [2, 2, 2]
+    records = [json.loads(line) for line in jsonl_file.read().splitlines()]
+    assert [r["target"] for r in records if "name" in r] == [a, a, b, b, c, c]
+    assert [r["target"] for r in records if "phases" in r] == [a, b, c]
@@ -0,0 +1,237 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+from click.testing import CliRunner
+
+from colin.cli.colin import check
+from colin.core import server as server_module
+from colin.core.exceptions import ColinException
+from colin.core.server import (
+    ColinService,
+    _get_connection,
+    check_many_on_server,
+    check_on_server,
+    create_server,
+)
+
+
+@pytest.fixture()
+def server(tmpdir):
+    service = ColinService(jobs=1, queue_size=1)
+    socket_path = str(tmpdir.join("colin.sock"))
+    server = create_server(service, socket_path=socket_path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+@pytest.fixture()
+def dockerfile(tmpdir):
+    dockerfile = tmpdir.join("Dockerfile")
+    dockerfile.write("FROM fedora:latest\nLABEL maintainer=me\n")
+    return str(dockerfile)
+
+
+def _get(server, path):
+    connection = _get_connection(server.server_address)
+    connection.request("GET", path)
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def test_check_on_server(server, dockerfile):
+    results = check_on_server(
+        server.server_address, dockerfile, target_type="dockerfile", tags=["from"]
+    )
+    assert [(r.check_name, r.status) for r in results.results] == [
+        ("from_tag_not_latest", "FAIL")
+    ]
+    assert results.fail and results.ok
+    assert {"target", "ruleset", "clean_up"} <= set(results.phases_dict)
+
+    status, health = _get(server, "/health")
+    assert status == 200
+    assert (health["running"], health["queued"]) == (0, 0)
+
+
+def test_check_many_on_server(server, dockerfile, tmpdir):
+    missing = str(tmpdir.join("missing"))
+    results = list(
+        check_many_on_server(
+            server.server_address, [dockerfile, missing], target_type="dockerfile"
+        )
+    )
+    assert [r.target for r in results] == [dockerfile, missing]
+    assert len(list(results[0].results.results)) == 3
+    assert "No such file" in str(results[1].error)
+
+
+def test_server_rejects(server, dockerfile):
+    with pytest.raises(ColinException, match="Unknown keys"):
+        check_on_server(server.server_address, dockerfile, colour="red")
+
+    # one request running and one waiting
+    assert server.service.admit() and server.service.admit()
+    try:
+        with pytest.raises(ColinException, match="Too many requests"):
+            check_on_server(server.server_address, dockerfile)
+    finally:
+        server.service.release()
+        server.service.release()
+
+    assert _get(server, "/nothing")[0] == 404
+
+
+def _post(server, body, content_type="application/json"):
+    connection = _get_connection(server.server_address)
+    connection.request(
+        "POST", "/check", body=body, headers={"Content-Type": content_type}
+    )
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def test_server_rejects_unsafe_requests(server, dockerfile):
+    ruleset = {
+        "version": "1",
+        "checks": [{"name": "evil", "import_name": "os.system"}],
+    }
+    status, body = _post(server, json.dumps({"target": dockerfile, "ruleset": ruleset}))
+    assert status == 400
+    assert "import_name" in body["error"]
+    with pytest.raises(ColinException, match="import_name"):
+        check_on_server(server.server_address, dockerfile, ruleset=ruleset)
+
+    status, _ = _post(server, json.dumps({"target": dockerfile}), "text/plain")
+    assert status == 415
+
+
+@pytest.mark.parametrize(
+    "request_options, error",
+    [
+        ({"jobs": 0}, "'jobs' has to be at least 1"),
+        ({"timeout": 0}, "'timeout' has to be between 1"),
+        ({"timeout": -5}, "'timeout' has to be between 1"),
+        ({"timeout": 10**9}, "'timeout' has to be between 1"),
+    ],
+)
+def test_server_rejects_limits(server, dockerfile, request_options, error):
+    status, body = _post(server, json.dumps({"target": dockerfile, **request_options}))
+    assert status == 400
+    assert error in body["error"]
+
+
+def test_request_jobs_limited(monkeypatch, dockerfile):
+    used_jobs = []
+    original = server_module.go_through_checks
+
+    def go_through_checks(**kwargs):
+        used_jobs.append(kwargs["jobs"])
+        return original(**kwargs)
+
+    monkeypatch.setattr(server_module, "go_through_checks", go_through_checks)
+    service = ColinService(jobs=2)
+    for jobs in (None, 1, 64):
+        request = {"target": dockerfile, "target_type": "dockerfile", "jobs": jobs}
+        list(service.check(request))
+    assert used_jobs == [1, 1, 2]
+
+
+def test_loaded_rulesets_bounded(monkeypatch):
+    monkeypatch.setattr("colin.core.server.SERVER_RULESETS", 2)
+    service = ColinService()
+    rulesets = [
+        {"version": "1", "checks": [{"name": name}]}
+        for name in ("name_label", "maintainer_label", "from_tag_not_latest")
+    ]
+    first = service.get_ruleset(ruleset=rulesets[0])
+    service.get_ruleset(ruleset=rulesets[1])
+    # the first one is used again, the second one is dropped
+    assert service.get_ruleset(ruleset=rulesets[0]) is first
+    service.get_ruleset(ruleset=rulesets[2])
+    assert len(service._rulesets) == 2
+    assert service.get_ruleset(ruleset=rulesets[0]) is first
+
+
+def test_cli_check_on_server_rejects_local_options(server, dockerfile):
+    result = CliRunner().invoke(
+        check, [dockerfile, "--server", server.server_address, "--layer-cache"]
+    )
+    assert result.exit_code == 2
+    assert "--layer-cache cannot be used with '--server'" in result.output
+
+
+def test_cli_check_on_server(server, dockerfile):
+    result = CliRunner().invoke(
+        check,
+        [
+            dockerfile,
+            "--server",
+            server.server_address,
+            "--target-type",
+            "dockerfile",
+            "--jsonl",
+            "-",
+        ],
+    )
+    assert result.exit_code == 3, result.output
+    *records, phases = [json.loads(line) for line in result.output.splitlines()]
+    assert {r["name"] for r in records} == {
+        "from_tag_not_latest",
+        "maintainer_label",
+        "maintainer_deprecated",
+    }
+    assert "phases" in phases
+
+
+def test_prefork_workers_recycled(tmpdir, dockerfile):
+    socket_path = str(tmpdir.join("colin.sock"))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "colin.cli.colin", "serve", "--socket", socket_path]
+        + ["--workers", "2", "--max-requests", "1"],
+        stdout=subprocess.PIPE,
+    )
+    try:
+        assert b"Listening" in server.stdout.readline()
+        for _ in range(4):
+            results = check_on_server(socket_path, dockerfile, target_type="dockerfile")
+            assert len(list(results.results)) == 3
+            # 2 workers served 4 requests: they are replaced after each one
+            assert json.loads(_get_health(socket_path))["served"] <= 1
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    assert not os.path.exists(socket_path)
+
+
+def _get_health(socket_path):
+    for _ in range(50):
+        try:
+            connection = _get_connection(socket_path)
+            connection.request("GET", "/health")
+            return connection.getresponse().read()
+        except OSError:
+            time.sleep(0.1)
+    raise AssertionError("The server does not respond.")
@@ -0,0 +1,60 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+import json
+
+from click.testing import CliRunner
+
+from colin.cli.colin import check
+from colin.utils.cmd_tools import run_cmd
+from colin.utils.tracing import span, start_tracing, stop_tracing
+
+
+def test_no_spans_without_tracing():
+    assert stop_tracing() is None
+    with span("nothing", "cmd") as s:
+        s.set("exit_code", 0)
+
+
+def test_command_spans():
+    tracer = start_tracing()
+    try:
+        run_cmd(["echo", "hello"])
+        run_cmd(["false"], check=False)
+    finally:
+        assert stop_tracing() is tracer
+
+    spans = [e for e in tracer.events if e["ph"] == "X"]
+    assert [s["name"] for s in spans] == ["echo hello", "false"]
+    assert [s["args"]["exit_code"] for s in spans] == [0, 1]
+    assert spans[0]["args"]["cmd"] == ["echo", "hello"]
+    assert spans[0]["ts"] + spans[0]["dur"] <= spans[1]["ts"]
+    assert any(e["name"] == "thread_name" for e in tracer.events)
+
+
+def test_cli_trace(tmpdir):
+    dockerfile = tmpdir.join("Dockerfile")
+    dockerfile.write("FROM fedora:latest\n")
+    trace_file = tmpdir.join("trace.json")
+    result = CliRunner().invoke(
+        check,
+        [str(dockerfile), "--target-type", "dockerfile", "--trace", str(trace_file)],
+    )
+    assert result.exit_code == 3, result.output
+
+    events = json.loads(trace_file.read())["traceEvents"]
+    checks = {e["name"]: e for e in events if e.get("cat") == "check"}
+    assert checks["from_tag_not_latest"]["args"]["status"] == "FAIL"
+    phases = {e["name"] for e in events if e.get("cat") == "phase"}
+    assert {"target", "ruleset", "clean_up"} <= phases
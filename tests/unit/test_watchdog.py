@@ -0,0 +1,115 @@
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from colin.utils.cmd_tools import exit_after, run_cmd
+from colin.utils.watchdog import Watchdog, current_deadline, get_watchdog
+
+
+def busy_loop(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+
+def test_timeout_in_worker_thread():
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(exit_after(0.5)(busy_loop), 5)
+        with pytest.raises(TimeoutError):
+            future.result(timeout=4)
+
+
+def test_parallel_timeouts():
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(exit_after(0.5)(busy_loop), 5) for _ in range(4)]
+        start = time.monotonic()
+        for future in futures:
+            with pytest.raises(TimeoutError):
+                future.result(timeout=4)
+    assert time.monotonic() - start < 4
+
+
+def test_no_timeout_in_worker_thread():
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(exit_after(5)(busy_loop), 0.1)
+        assert future.result() is None
+    # the cancelled deadline must not interrupt the thread later
+    time.sleep(0.2)
+
+
+def test_subprocess_is_killed():
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        exit_after(0.5)(run_cmd)(["sleep", "10"])
+    assert time.monotonic() - start < 5
+
+
+def test_single_watchdog_thread():
+    watchdog = Watchdog()
+    for _ in range(50):
+        with watchdog.deadline(60):
+            pass
+    names = [t.name for t in threading.enumerate()]
+    assert names.count("colin-watchdog") <= 2  # the global one + this one
+
+
+def test_scheduled_calls_order():
+    watchdog = Watchdog()
+    called = []
+    done = threading.Event()
+    watchdog.schedule(0.2, lambda: (called.append(2), done.set()))
+    watchdog.schedule(0.1, lambda: called.append(1))
+    cancelled = watchdog.schedule(0.05, lambda: called.append(0))
+    cancelled.cancel()
+    assert done.wait(2)
+    assert called == [1, 2]
+
+
+def test_cooperative_cancellation():
+    with get_watchdog().deadline(0.1) as deadline:
+        assert current_deadline() is deadline
+        assert deadline.remaining > 0
+        with pytest.raises(TimeoutError):
+            try:
+                busy_loop(0.3)
+            except KeyboardInterrupt:
+                pass
+            deadline.check()
+    assert current_deadline() is None
+
+
+@pytest.mark.skipif(not hasattr(os, "register_at_fork"), reason="no fork hooks")
+def test_watchdog_in_forked_child():
+    # the watchdog thread runs in the parent
+    with get_watchdog().deadline(10):
+        pass
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            try:
+                exit_after(0.2)(busy_loop)(5)
+            except TimeoutError:
+                code = 0
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    assert os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0